@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class CartsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'carts'
+
+    def ready(self):
+        from core.cache import invalidate_on_change
+        from .models import Cart, CartItem
+
+        def item_cart_parts(item):
+            try:
+                return item.cart.get_cache_parts()
+            except Cart.DoesNotExist:
+                return None
+
+        invalidate_on_change('carts', Cart, key=lambda cart: cart.get_cache_parts())
+        invalidate_on_change('carts', CartItem, key=item_cart_parts)
@@ -1,8 +1,18 @@
+from core.cache import cache_get_or_set
+from .models import cart_cache_parts
 from .views import get_or_create_cart
 
 def cart_items_count(request):
     """Contexto para mostrar el número de items en el carrito en todas las páginas"""
-    if request.user.is_authenticated or 'cart_id' in request.session:
-        cart = get_or_create_cart(request)
-        return {'cart_items_count': cart.get_total_items()}
-    return {'cart_items_count': 0}
\ No newline at end of file
+    if request.user.is_authenticated:
+        parts = cart_cache_parts(user_id=request.user.pk)
+    elif 'cart_id' in request.session:
+        parts = cart_cache_parts(session_id=request.session['cart_id'])
+    else:
+        return {'cart_items_count': 0}
+    
+    count = cache_get_or_set(
+        'carts', *parts,
+        default=lambda: get_or_create_cart(request).get_total_items()
+    )
+    return {'cart_items_count': count}
\ No newline at end of file
@@ -3,6 +3,14 @@ from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from products.models import Product
 
+
+def cart_cache_parts(user_id=None, session_id=None):
+    """Partes de la clave de caché del contador de items de un carrito"""
+    if user_id:
+        return ('items_count', 'user', user_id)
+    return ('items_count', 'session', session_id)
+
+
 class Cart(models.Model):
     """Modelo para el carrito de compras"""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name=_('usuario'), on_delete=models.CASCADE, null=True, blank=True)
@@ -21,6 +29,10 @@ class Cart(models.Model):
         """Calcula el subtotal del carrito"""
         return sum(item.get_total() for item in self.items.all())
     
+    def get_cache_parts(self):
+        """Partes de la clave de caché del contador de items"""
+        return cart_cache_parts(self.user_id, self.session_id)
+    
     def clear(self):
         """Elimina todos los items del carrito"""
         self.items.all().delete()
@@ -1,3 +1,71 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.auth.models import AnonymousUser
 
-# Create your tests here.
+from products.models import Category, Product
+from .context_processors import cart_items_count
+from .models import Cart, CartItem
+
+class CartItemsCountTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Cremas', slug='cremas')
+        self.product = Product.objects.create(
+            category=category, name='Crema', slug='crema', description='', price=10, stock=10
+        )
+        self.cart = Cart.objects.create(session_id='abc')
+
+    def _request(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        request.session['cart_id'] = 'abc'
+        return request
+
+    def test_count_is_cached_and_invalidated_on_item_change(self):
+        self.assertEqual(cart_items_count(self._request())['cart_items_count'], 0)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_items_count(self._request())['cart_items_count'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CartItem.objects.create(cart=self.cart, product=self.product, quantity=3)
+
+        self.assertEqual(cart_items_count(self._request())['cart_items_count'], 3)
+
+
+class AnonymousSessionQueriesTest(TestCase):
+    """Consultas a django_session en el flujo anónimo navegar + añadir al carrito"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Cremas', slug='cremas')
+        self.product = Product.objects.create(
+            category=category, name='Crema', slug='crema', description='', price=10, stock=10
+        )
+
+    def _session_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post('/carrito/agregar/', {'product_id': self.product.id, 'quantity': 1})
+            for _ in range(5):
+                self.client.get('/productos/')
+                self.client.get('/carrito/')
+        return [q['sql'] for q in ctx.captured_queries if 'django_session' in q['sql']]
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_db_sessions_query_on_every_page(self):
+        self.assertGreaterEqual(len(self._session_queries()), 10)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_cached_db_sessions_skip_reads(self):
+        queries = self._session_queries()
+        self.assertFalse([sql for sql in queries if sql.startswith('SELECT')][1:])
+        self.assertLessEqual(len(queries), 4)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions_do_not_touch_the_table(self):
+        self.assertEqual(self._session_queries(), [])
@@ -1,3 +1,18 @@
 from django.contrib import admin
+from django.utils import timezone
 
-# Register your models here.
+from .models import OutgoingEmail
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'to', 'from_email')
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry_now']
+    
+    @admin.action(description='Reintentar ahora')
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='enviado').update(status='pendiente', next_attempt_at=timezone.now())
+        self.message_user(request, f'{updated} correos se enviarán en el siguiente lote.')
@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+# Espacios de nombres por aplicación; cada uno tiene su propia versión
+NAMESPACES = ('products', 'carts', 'dashboard', 'orders', 'reorder', 'attributes')
+
+
+def _check_namespace(namespace):
+    if namespace not in NAMESPACES:
+        raise ValueError(f'Espacio de caché desconocido: {namespace}')
+
+
+def _version_key(namespace):
+    return f'{namespace}:version'
+
+
+def get_namespace_version(namespace):
+    """Versión actual del espacio de nombres (se crea en 1 si no existe)"""
+    _check_namespace(namespace)
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), 1, timeout=None)
+        version = cache.get(_version_key(namespace), 1)
+    return version
+
+
+def _join(namespace, version, parts):
+    return ':'.join([namespace, f'v{version}', *(str(part) for part in parts)])
+
+
+def make_key(namespace, *parts):
+    """Construye una clave versionada: '<namespace>:v<versión>:<partes>'"""
+    return _join(namespace, get_namespace_version(namespace), parts)
+
+
+def make_keys(namespace, parts_list):
+    """Como make_key para varias claves (una tupla de partes cada una), leyendo la versión una sola vez"""
+    version = get_namespace_version(namespace)
+    return [_join(namespace, version, parts) for parts in parts_list]
+
+
+def cache_get(namespace, *parts, default=None):
+    return cache.get(make_key(namespace, *parts), default)
+
+
+def cache_set(namespace, *parts, value, timeout=DEFAULT_TIMEOUT):
+    cache.set(make_key(namespace, *parts), value, timeout=timeout)
+
+
+def cache_delete(namespace, *parts):
+    cache.delete(make_key(namespace, *parts))
+
+
+def cache_get_or_set(namespace, *parts, default, timeout=DEFAULT_TIMEOUT):
+    """
+    Como cache.get_or_set; default puede ser un callable que se evalúa solo si
+    falta la clave. Sin timeout se usa el TIMEOUT de CACHES; timeout=None no expira.
+    """
+    return cache.get_or_set(make_key(namespace, *parts), default, timeout=timeout)
+
+
+def invalidate_namespace(namespace):
+    """Invalida todas las claves del espacio incrementando su versión"""
+    get_namespace_version(namespace)
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        # La clave expiró o fue desalojada entre la lectura y el incremento
+        cache.set(_version_key(namespace), 2, timeout=None)
+
+
+def invalidate_on_change(namespace, *models, key=None):
+    """
+    Conecta post_save/post_delete de los modelos para invalidar la caché una
+    vez confirmada la transacción. Sin `key` se invalida todo el espacio; con
+    `key(instance)` solo se borra la clave devuelta (una tupla de partes, o
+    None para no borrar nada).
+    """
+    _check_namespace(namespace)
+
+    def handler(sender, instance, using=None, **kwargs):
+        if key is None:
+            transaction.on_commit(lambda: invalidate_namespace(namespace), using=using)
+            return
+        parts = key(instance)
+        if parts is not None:
+            transaction.on_commit(lambda: cache_delete(namespace, *parts), using=using)
+
+    for model in models:
+        uid = f'core.cache:{namespace}:{model._meta.label_lower}'
+        post_save.connect(handler, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(handler, sender=model, weak=False, dispatch_uid=uid)
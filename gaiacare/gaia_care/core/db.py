@@ -0,0 +1,48 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+def apply_sqlite_pragmas(cursor, pragmas=None):
+    """Aplica los PRAGMA de ajuste (WAL, synchronous, caché, etc.) a una conexión SQLite"""
+    if pragmas is None:
+        pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Receptor de connection_created: ajusta cada nueva conexión SQLite"""
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_TUNING', False):
+        return
+    with connection.cursor() as cursor:
+        apply_sqlite_pragmas(cursor)
+
+
+@contextmanager
+def immediate_atomic(using=None):
+    """
+    Igual que transaction.atomic(), pero en SQLite abre la transacción con
+    BEGIN IMMEDIATE para tomar el bloqueo de escritura desde el inicio.
+    Así el checkout espera el busy timeout en lugar de fallar con
+    "database is locked" al pasar de lectura a escritura.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    connection = connections[using]
+
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    # transaction_mode se lee de OPTIONS al conectar; conectar antes de cambiarlo
+    connection.ensure_connection()
+    previous_mode = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = previous_mode
+            yield
+    finally:
+        connection.transaction_mode = previous_mode
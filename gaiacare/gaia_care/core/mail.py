@@ -0,0 +1,154 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import DEFAULT_DB_ALIAS, router
+from django.db.models import F
+from django.utils import timezone
+
+from .db import immediate_atomic
+from .models import OutgoingEmail
+
+# Correos que toma el worker en cada lote
+BATCH_SIZE = 50
+# Después de este número de intentos el correo queda como fallido
+MAX_ATTEMPTS = 6
+# Espera antes del primer reintento; se duplica en cada fallo hasta RETRY_MAX_DELAY
+RETRY_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=6)
+# Un lote tomado por un worker no se vuelve a tomar hasta pasado este tiempo
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def delivery_connection(**kwargs):
+    """Conexión del backend que entrega de verdad (SMTP en producción)"""
+    return get_connection(settings.OUTBOX_DELIVERY_BACKEND, **kwargs)
+
+
+def retry_delay(attempts):
+    """Espera exponencial tras `attempts` intentos fallidos"""
+    return min(RETRY_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def _to_row(message):
+    html = next((content for content, mimetype in getattr(message, 'alternatives', []) if mimetype == 'text/html'), '')
+    body = message.body
+    if message.content_subtype == 'html' and not html:
+        html, body = body, ''
+    return OutgoingEmail(
+        subject=message.subject,
+        body=body,
+        html_body=html,
+        from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(message.to),
+        cc=list(message.cc),
+        bcc=list(message.bcc),
+        reply_to=list(message.reply_to),
+        headers=dict(message.extra_headers),
+    )
+
+
+def _to_message(row, connection):
+    message = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body,
+        from_email=row.from_email,
+        to=row.to,
+        cc=row.cc,
+        bcc=row.bcc,
+        reply_to=row.reply_to,
+        headers=row.headers,
+        connection=connection,
+    )
+    if row.html_body:
+        if row.body:
+            message.attach_alternative(row.html_body, 'text/html')
+        else:
+            message.body = row.html_body
+            message.content_subtype = 'html'
+    return message
+
+
+class OutboxBackend(BaseEmailBackend):
+    """
+    Backend de correo que no envía: guarda los mensajes en OutgoingEmail
+    (dentro de la transacción en curso) y el comando send_queued_mail los
+    entrega después. Los mensajes con archivos adjuntos se entregan en el
+    momento con OUTBOX_DELIVERY_BACKEND, porque la cola no los guarda.
+    """
+
+    def send_messages(self, email_messages):
+        queued = [message for message in email_messages if message.recipients() and not message.attachments]
+        direct = [message for message in email_messages if message.recipients() and message.attachments]
+        if queued:
+            using = router.db_for_write(OutgoingEmail)
+            OutgoingEmail.objects.using(using).bulk_create([_to_row(message) for message in queued])
+        sent = len(queued)
+        if direct:
+            sent += delivery_connection(fail_silently=self.fail_silently).send_messages(direct) or 0
+        return sent
+
+
+def _claim(batch_size, using):
+    """Toma los correos vencidos más antiguos aplazando su próximo intento, para que otro worker no los repita"""
+    now = timezone.now()
+    with immediate_atomic(using=using):
+        ids = list(
+            OutgoingEmail.objects.using(using)
+            .filter(status='pendiente', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        OutgoingEmail.objects.using(using).filter(id__in=ids).update(next_attempt_at=now + CLAIM_TIMEOUT)
+    return list(OutgoingEmail.objects.using(using).filter(id__in=ids).order_by('id'))
+
+
+def _fail(row, error, now):
+    row.attempts += 1
+    row.last_error = error
+    if row.attempts >= MAX_ATTEMPTS:
+        row.status = 'fallido'
+    else:
+        row.next_attempt_at = now + retry_delay(row.attempts)
+
+
+def send_queued(batch_size=BATCH_SIZE, using=DEFAULT_DB_ALIAS):
+    """
+    Entrega un lote de la bandeja de salida por una sola conexión del backend
+    de entrega. Los que fallan se reintentan con espera exponencial. Devuelve
+    (enviados, fallidos).
+    """
+    rows = _claim(batch_size, using)
+    if not rows:
+        return 0, 0
+
+    sent, failed = [], []
+    connection = delivery_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as error:
+        now = timezone.now()
+        for row in rows:
+            _fail(row, f'No se pudo conectar: {error}', now)
+        failed = rows
+    else:
+        try:
+            for row in rows:
+                try:
+                    connection.send_messages([_to_message(row, connection)])
+                except Exception as error:
+                    _fail(row, str(error), timezone.now())
+                    failed.append(row)
+                else:
+                    sent.append(row.id)
+        finally:
+            connection.close()
+
+    OutgoingEmail.objects.using(using).filter(id__in=sent).update(
+        status='enviado', sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='',
+    )
+    OutgoingEmail.objects.using(using).bulk_update(
+        failed, ['attempts', 'last_error', 'status', 'next_attempt_at'], batch_size=batch_size,
+    )
+    return len(sent), len(failed)
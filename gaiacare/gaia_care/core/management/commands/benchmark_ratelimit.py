@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from core.ratelimit import RateLimiter
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide cuánto agrega el límite de solicitudes a cada petición con la caché '
+        'configurada (microsegundos por solicitud permitida y rechazada)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=5000,
+            help='Solicitudes a medir en cada caso (por defecto 5000)',
+        )
+        parser.add_argument(
+            '--cache', default=settings.RATE_LIMIT_CACHE,
+            help=f'Alias de caché a medir (por defecto {settings.RATE_LIMIT_CACHE})',
+        )
+
+    def _measure(self, label, limiter, requests):
+        start = time.perf_counter()
+        for request in requests:
+            limiter.check(request, 'products:search_suggestions')
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'{label:<12} {elapsed / len(requests) * 1e6:>8.1f} µs/solicitud')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        factory = RequestFactory()
+        path = '/productos/search-suggestions/'
+
+        def make_request(index, session_key=None):
+            request = factory.get(path, {'q': 'crema'}, REMOTE_ADDR=f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}')
+            request.session = SessionBase(session_key)
+            return request
+
+        # Permitidas: una IP y una sesión distintas por solicitud (cubetas nuevas)
+        limiter = RateLimiter({'products:search_suggestions': {'rate': '60/m', 'burst': 20}}, cache_alias=options['cache'])
+        self._measure('Permitida', limiter, [make_request(i, f'bench{i}') for i in range(iterations)])
+        # Rechazadas: la misma IP con la cubeta ya vacía
+        limiter = RateLimiter({'products:search_suggestions': {'rate': '1/h', 'burst': 1}}, cache_alias=options['cache'])
+        self._measure('Rechazada', limiter, [make_request(0) for _ in range(iterations)])
+        self.stdout.write(f'Caché: {settings.CACHES[options["cache"]]["BACKEND"]}')
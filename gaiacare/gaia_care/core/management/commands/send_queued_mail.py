@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.mail import BATCH_SIZE, send_queued
+
+
+class Command(BaseCommand):
+    help = 'Entrega los correos pendientes de la bandeja de salida en lotes, por una sola conexión'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'Correos por lote (por defecto {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Sigue revisando la bandeja en lugar de terminar cuando se vacía',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Segundos de espera entre revisiones con --loop (por defecto 5)',
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = send_queued(batch_size=options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if failed:
+                self.stdout.write(self.style.WARNING(f'{failed} correos fallaron; se reintentarán más tarde.'))
+            if sent + failed < options['batch_size']:
+                # Bandeja vacía (o solo con correos que aún no toca reintentar)
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total_sent} correos enviados, {total_failed} con error.'))
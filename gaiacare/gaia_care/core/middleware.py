@@ -0,0 +1,69 @@
+import math
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+from .ratelimit import RateLimiter
+from .routers import get_replicas, pinned_to_primary
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class PrimaryPinMiddleware:
+    """
+    Después de una escritura (carrito, checkout, referencia de pago) marca al
+    cliente con una cookie de corta duración para que sus siguientes lecturas
+    vayan a la primaria y vea sus propios cambios aunque la réplica vaya atrasada.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not get_replicas():
+            return self.get_response(request)
+
+        cookie_name = settings.REPLICA_PIN_COOKIE
+        writes = request.method not in SAFE_METHODS
+        with pinned_to_primary(writes or cookie_name in request.COOKIES):
+            response = self.get_response(request)
+
+        if writes:
+            response.set_cookie(
+                cookie_name, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class RateLimitMiddleware:
+    """
+    Aplica los límites de settings.RATE_LIMITS (por nombre de URL, con
+    cubetas por IP y por sesión) antes de ejecutar la vista. Al superarlos
+    responde 429 con Retry-After; en JSON si la petición es AJAX.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiter = RateLimiter()
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.RATE_LIMIT_ENABLED:
+            return None
+        match = request.resolver_match
+        wait = self.limiter.check(request, match.view_name if match else None)
+        if wait is None:
+            return None
+
+        message = 'Demasiadas solicitudes. Por favor, espera un momento e intenta nuevamente.'
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest' or 'json' in request.headers.get('accept', ''):
+            response = JsonResponse({'error': message}, status=429)
+        else:
+            response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=998, verbose_name='asunto')),
+                ('body', models.TextField(blank=True, verbose_name='cuerpo')),
+                ('html_body', models.TextField(blank=True, verbose_name='cuerpo HTML')),
+                ('from_email', models.CharField(max_length=254, verbose_name='remitente')),
+                ('to', models.JSONField(default=list, verbose_name='para')),
+                ('cc', models.JSONField(blank=True, default=list, verbose_name='cc')),
+                ('bcc', models.JSONField(blank=True, default=list, verbose_name='cco')),
+                ('reply_to', models.JSONField(blank=True, default=list, verbose_name='responder a')),
+                ('headers', models.JSONField(blank=True, default=dict, verbose_name='encabezados')),
+                ('status', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=10, verbose_name='estado')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='intentos')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='siguiente intento')),
+                ('last_error', models.TextField(blank=True, verbose_name='último error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='creado')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='enviado')),
+            ],
+            options={
+                'verbose_name': 'correo saliente',
+                'verbose_name_plural': 'correos salientes',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'pendiente')), fields=['next_attempt_at', 'id'], name='outbox_due_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,40 @@
 from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+class OutgoingEmail(models.Model):
+    """Correo en la bandeja de salida; core.mail.send_queued lo entrega fuera de la petición"""
+    STATUS_CHOICES = (
+        ('pendiente', _('Pendiente')),
+        ('enviado', _('Enviado')),
+        ('fallido', _('Fallido')),
+    )
+    
+    subject = models.CharField(_('asunto'), max_length=998)
+    body = models.TextField(_('cuerpo'), blank=True)
+    html_body = models.TextField(_('cuerpo HTML'), blank=True)
+    from_email = models.CharField(_('remitente'), max_length=254)
+    to = models.JSONField(_('para'), default=list)
+    cc = models.JSONField(_('cc'), default=list, blank=True)
+    bcc = models.JSONField(_('cco'), default=list, blank=True)
+    reply_to = models.JSONField(_('responder a'), default=list, blank=True)
+    headers = models.JSONField(_('encabezados'), default=dict, blank=True)
+    status = models.CharField(_('estado'), max_length=10, choices=STATUS_CHOICES, default='pendiente')
+    attempts = models.PositiveIntegerField(_('intentos'), default=0)
+    next_attempt_at = models.DateTimeField(_('siguiente intento'), default=timezone.now)
+    last_error = models.TextField(_('último error'), blank=True)
+    created_at = models.DateTimeField(_('creado'), auto_now_add=True)
+    sent_at = models.DateTimeField(_('enviado'), null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.subject} ({', '.join(self.to)})"
+    
+    class Meta:
+        verbose_name = _('correo saliente')
+        verbose_name_plural = _('correos salientes')
+        ordering = ['-created_at']
+        indexes = [
+            # Cola del worker: solo los pendientes, por fecha de intento
+            models.Index(fields=['next_attempt_at', 'id'], condition=models.Q(status='pendiente'), name='outbox_due_idx'),
+        ]
@@ -0,0 +1,89 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Segundos de cada unidad en las tasas tipo '30/m'
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'30/m' -> (30, 60): número de solicitudes y periodo en segundos"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class TokenBucket:
+    """
+    Cubeta de fichas: caben `burst` solicitudes seguidas y se recupera una
+    ficha cada periodo/count segundos. El estado (fichas, marca de tiempo)
+    vive en la caché con una expiración igual a lo que tarda en llenarse,
+    así que una cubeta llena no ocupa espacio.
+    """
+
+    def __init__(self, rate, burst=None):
+        count, period = parse_rate(rate)
+        self.refill = count / period
+        self.capacity = burst or count
+        self.timeout = max(1, int(self.capacity / self.refill) + 1)
+
+    def take(self, state, now):
+        """(permitido, nuevo estado, segundos para la siguiente ficha)"""
+        tokens, stamp = state or (self.capacity, now)
+        tokens = min(self.capacity, tokens + (now - stamp) * self.refill)
+        if tokens < 1:
+            return False, (tokens, now), (1 - tokens) / self.refill
+        return True, (tokens - 1, now), 0
+
+
+def client_ip(request):
+    """IP del cliente según RATE_LIMIT_IP_HEADER (REMOTE_ADDR o el encabezado del proxy de confianza)"""
+    value = request.META.get(settings.RATE_LIMIT_IP_HEADER) or request.META.get('REMOTE_ADDR', '')
+    return value.split(',')[0].strip()
+
+
+class RateLimiter:
+    """
+    Límites por nombre de URL (settings.RATE_LIMITS). Cada solicitud toma una
+    ficha de la cubeta de su IP y, si tiene sesión, de la de su sesión; se
+    rechaza si alguna está vacía. Lectura y escritura van en un get_many y un
+    set_many; entre workers el conteo es aproximado (no es atómico), lo que
+    basta para frenar abusos.
+    """
+
+    def __init__(self, limits=None, cache_alias=None):
+        limits = settings.RATE_LIMITS if limits is None else limits
+        self.cache = caches[cache_alias or settings.RATE_LIMIT_CACHE]
+        self.rules = {
+            name: (TokenBucket(rule['rate'], rule.get('burst')), tuple(rule.get('methods', ())))
+            for name, rule in limits.items()
+        }
+
+    def check(self, request, url_name):
+        """None si se permite; si no, los segundos que debe esperar el cliente"""
+        rule = self.rules.get(url_name)
+        if rule is None:
+            return None
+        bucket, methods = rule
+        if methods and request.method not in methods:
+            return None
+
+        keys = [f'ratelimit:{url_name}:ip:{client_ip(request)}']
+        session = getattr(request, 'session', None)
+        session_key = session.session_key if session is not None else None
+        if session_key:
+            keys.append(f'ratelimit:{url_name}:session:{session_key}')
+
+        now = time.time()
+        states = self.cache.get_many(keys)
+        updated, wait = {}, 0
+        for key in keys:
+            allowed, state, retry_after = bucket.take(states.get(key), now)
+            if not allowed:
+                wait = max(wait, retry_after)
+            updated[key] = state
+        if wait:
+            # Rechazada: no se gasta ninguna ficha
+            return wait
+        self.cache.set_many(updated, timeout=bucket.timeout)
+        return None
@@ -0,0 +1,89 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Lecturas marcadas como aptas para réplica (catálogo, búsqueda, analíticas)
+_replica_reads = ContextVar('replica_reads', default=False)
+# Peticiones de un usuario que acaba de escribir: todo va a la primaria
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+
+def get_replicas():
+    """Alias de las bases de datos réplica configuradas"""
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def replica_reads():
+    """Permite que las lecturas dentro del bloque usen una réplica"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def pinned_to_primary(pinned=True):
+    """Fuerza que todas las lecturas dentro del bloque usen la primaria"""
+    token = _pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+def read_replica(view_func):
+    """
+    Decorador para vistas de solo lectura. La respuesta se renderiza dentro
+    del bloque para que las consultas perezosas de las plantillas también
+    vayan a la réplica.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads():
+            response = view_func(request, *args, **kwargs)
+            if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                response.render()
+        return response
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """
+    Envía las lecturas de vistas marcadas con read_replica a una réplica y
+    todo lo demás (escrituras, lecturas en transacciones, usuarios que
+    acaban de escribir) a la base de datos primaria.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or _pinned_to_primary.get() or not _replica_reads.get():
+            return DEFAULT_DB_ALIAS
+        # Dentro de una transacción se lee lo que ella misma escribió, no una réplica atrasada
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Objetos relacionados con una instancia ya guardada se escriben en su misma base
+        instance = hints.get('instance')
+        db = getattr(getattr(instance, '_state', None), 'db', None)
+        if db and db not in get_replicas():
+            return db
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
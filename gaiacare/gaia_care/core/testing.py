@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, override_settings
+from django.test.runner import DiscoverRunner
+
+# Cachés de la suite de pruebas: en memoria, para no escribir en el
+# directorio de caché real ni heredar entradas de una ejecución anterior
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'TIMEOUT': 300},
+    'ratelimit': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'ratelimit'},
+}
+
+
+class TestRunner(DiscoverRunner):
+    """Ejecuta las pruebas con TEST_CACHES en lugar de las cachés configuradas"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_caches = override_settings(CACHES=TEST_CACHES)
+        self._test_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_caches.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+class FileSQLiteTestCase(SimpleTestCase):
+    """
+    Pruebas de concurrencia sobre un archivo SQLite temporal y migrado.
+    La base de pruebas en memoria no admite escritores en paralelo, así que
+    cada clase trabaja con su propio alias (`ALIAS`) y los hilos abren sus
+    propias conexiones a él.
+    """
+    ALIAS = 'concurrency'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        fd, cls.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        connections.settings[cls.ALIAS] = connections.configure_settings({
+            'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': cls.path, 'OPTIONS': {'timeout': 20}},
+        })['default']
+        # Se declara después de crear el alias para que el runner no intente prepararlo
+        cls.databases = {cls.ALIAS}
+        call_command('migrate', database=cls.ALIAS, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[cls.ALIAS].close()
+        del connections[cls.ALIAS]
+        del connections.settings[cls.ALIAS]
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(cls.path + suffix):
+                os.remove(cls.path + suffix)
+
+    def run_in_threads(self, target, count):
+        """Ejecuta `target` en `count` hilos que arrancan a la vez; devuelve las excepciones"""
+        barrier = threading.Barrier(count)
+        errors = []
+
+        def run():
+            try:
+                barrier.wait()
+                target()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections[self.ALIAS].close()
+
+        threads = [threading.Thread(target=run) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
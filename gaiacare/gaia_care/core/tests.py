@@ -1,3 +1,404 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.mail import EmailMultiAlternatives, send_mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from products.inventory import apply_movements
+from products.models import Category, Product
+from users.models import CustomUser
+from .cache import cache_get, cache_get_or_set, cache_set, invalidate_namespace, make_key, make_keys
+from .db import immediate_atomic
+from .mail import MAX_ATTEMPTS, retry_delay, send_queued
+from .middleware import PrimaryPinMiddleware
+from .models import OutgoingEmail
+from .ratelimit import TokenBucket
+from .routers import PrimaryReplicaRouter, read_replica, replica_reads
+from .testing import TEST_CACHES, FileSQLiteTestCase
+
+
+class SQLiteTuningStressTest(FileSQLiteTestCase):
+    """
+    Escritores concurrentes por conexiones de Django sobre un archivo SQLite,
+    con los ajustes de configure_sqlite e immediate_atomic y sin ellos. Sin
+    ajustes, dos transacciones que leen y luego escriben (como el checkout)
+    chocan al subir de lectura a escritura y SQLite responde "database is
+    locked" sin esperar el busy timeout.
+    """
+    ALIAS = 'sqlite_stress'
+    THREADS = 8
+    WRITES_PER_THREAD = 10
+
+    def setUp(self):
+        connections[self.ALIAS].close()
+        category = Category.objects.using(self.ALIAS).create(name='Cremas')
+        self.product = Product.objects.using(self.ALIAS).create(
+            category_id=category.id, name='Crema', description='', price=10, stock=0,
+        )
+        connections[self.ALIAS].close()
+
+    def _run_writers(self, write):
+        """Lanza los hilos escritores; devuelve los errores de bloqueo de cada escritura"""
+        locked = []
+
+        def writer():
+            for _ in range(self.WRITES_PER_THREAD):
+                try:
+                    write()
+                except OperationalError as e:
+                    locked.append(str(e))
+
+        self.assertEqual(self.run_in_threads(writer, self.THREADS), [])
+        return locked
+
+    def _read_then_write(self, atomic):
+        products = Product.objects.using(self.ALIAS).filter(id=self.product.id)
+        with atomic(using=self.ALIAS):
+            stock = products.values_list('stock', flat=True).get()
+            time.sleep(0.002)  # trabajo de la petición entre la lectura y la escritura
+            products.update(stock=stock + 1)
+
+    def _stock(self):
+        return Product.objects.using(self.ALIAS).get(id=self.product.id).stock
+
+    @override_settings(SQLITE_TUNING=True)
+    def test_tuned_writers_do_not_hit_locks(self):
+        locked = self._run_writers(lambda: self._read_then_write(immediate_atomic))
+        self.assertEqual(locked, [])
+        # BEGIN IMMEDIATE serializa las transacciones: ningún incremento se pierde
+        self.assertEqual(self._stock(), self.THREADS * self.WRITES_PER_THREAD)
+
+    @override_settings(SQLITE_TUNING=False)
+    def test_untuned_writers_hit_locks(self):
+        with connections[self.ALIAS].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=DELETE')
+        connections[self.ALIAS].close()
+
+        locked = self._run_writers(lambda: self._read_then_write(transaction.atomic))
+        self.assertTrue(locked)
+        self.assertEqual(set(locked), {'database is locked'})
+
+    @override_settings(SQLITE_TUNING=True)
+    def test_parallel_checkouts_do_not_hit_locks(self):
+        Product.objects.using(self.ALIAS).filter(id=self.product.id).update(stock=1000)
+        product = Product.objects.using(self.ALIAS).get(id=self.product.id)
+
+        def checkout():
+            # Igual que CheckoutView: lectura del carrito y descuento en BEGIN IMMEDIATE
+            with immediate_atomic(using=self.ALIAS):
+                Product.objects.using(self.ALIAS).filter(id=product.id).exists()
+                apply_movements([(product, -1)], 'venta', using=self.ALIAS)
+
+        self.assertEqual(self._run_writers(checkout), [])
+        self.assertEqual(self._stock(), 1000 - self.THREADS * self.WRITES_PER_THREAD)
+
+    @override_settings(SQLITE_TUNING=True)
+    def test_pragmas_are_applied(self):
+        connection = connections[self.ALIAS]
+        connection.close()
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal',
+            'synchronous': 1,  # NORMAL
+            'busy_timeout': settings.SQLITE_PRAGMAS['busy_timeout'],
+        })
+
+
+class ImmediateAtomicTest(TransactionTestCase):
+
+    def test_begins_immediate_transaction_on_sqlite(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Solo aplica a SQLite')
+        with CaptureQueriesContext(connection) as ctx:
+            with immediate_atomic():
+                pass
+        self.assertEqual(ctx.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+        self.assertIsNone(connection.transaction_mode)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=10, REPLICA_PIN_COOKIE='primary_pin')
+class PrimaryReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def _routed_view(self, seen):
+        @read_replica
+        def view(request):
+            seen.append(self.router.db_for_read(Product))
+            return HttpResponse()
+        return view
+
+    def test_reads_use_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_marked_reads_use_replica(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Product), 'replica1')
+        self.assertEqual(self.router.db_for_write(Product), 'default')
+
+    def test_reads_inside_transactions_use_primary(self):
+        with replica_reads():
+            with mock.patch.object(connections['default'], 'in_atomic_block', True):
+                self.assertEqual(self.router.db_for_read(Product), 'default')
+            self.assertEqual(self.router.db_for_read(Product), 'replica1')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_primary(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'products'))
+        self.assertIsNone(self.router.allow_migrate('default', 'products'))
+
+    def test_write_pins_following_reads_to_primary(self):
+        seen = []
+        middleware = PrimaryPinMiddleware(self._routed_view(seen))
+
+        response = middleware(self.factory.post('/carrito/agregar/'))
+        self.assertIn('primary_pin', response.cookies)
+        self.assertEqual(response.cookies['primary_pin']['max-age'], 10)
+
+        pinned_request = self.factory.get('/productos/')
+        pinned_request.COOKIES['primary_pin'] = '1'
+        middleware(pinned_request)
+        middleware(self.factory.get('/productos/'))
+
+        self.assertEqual(seen, ['default', 'default', 'replica1'])
+
+
+class NamespacedCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_keys_are_namespaced_and_versioned(self):
+        self.assertEqual(make_key('products', 'suggestions', 'abc'), 'products:v1:suggestions:abc')
+        invalidate_namespace('products')
+        self.assertEqual(make_key('products', 'suggestions', 'abc'), 'products:v2:suggestions:abc')
+        self.assertEqual(make_key('dashboard', 'home_stats'), 'dashboard:v1:home_stats')
+        self.assertEqual(
+            make_keys('products', [('row', 1), ('row', 2)]), ['products:v2:row:1', 'products:v2:row:2']
+        )
+
+    def test_suite_runs_on_memory_caches(self):
+        self.assertEqual(settings.CACHES, TEST_CACHES)
+
+    def test_unknown_namespace_is_rejected(self):
+        with self.assertRaises(ValueError):
+            make_key('nope', 'key')
+
+    def test_invalidating_one_namespace_keeps_the_others(self):
+        cache_set('products', 'a', value=1)
+        cache_set('dashboard', 'a', value=2)
+        invalidate_namespace('products')
+        self.assertIsNone(cache_get('products', 'a'))
+        self.assertEqual(cache_get('dashboard', 'a'), 2)
+
+    def test_model_changes_invalidate_on_commit(self):
+        category = Category.objects.create(name='Cremas', slug='cremas')
+        cache_set('products', 'listing', value='cached')
+        cache_set('dashboard', 'home_stats', value='cached')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(category=category, name='Crema', slug='crema', description='', price=10)
+
+        self.assertIsNone(cache_get('products', 'listing'))
+        self.assertIsNone(cache_get('dashboard', 'home_stats'))
+
+    def test_get_or_set_only_computes_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return 'value'
+
+        self.assertEqual(cache_get_or_set('carts', 'x', default=compute), 'value')
+        self.assertEqual(cache_get_or_set('carts', 'x', default=compute), 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_entries_use_the_configured_timeout_by_default(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set_call:
+            cache_set('carts', 'a', value=1)
+            cache_set('orders', 'b', value=2, timeout=None)
+        self.assertEqual([call.kwargs['timeout'] for call in cache_set_call.call_args_list], [DEFAULT_TIMEOUT, None])
+
+        with mock.patch.object(cache, 'get_or_set', wraps=cache.get_or_set) as get_or_set_call:
+            cache_get_or_set('products', 'suggestions', 'x', default=list)
+        self.assertIs(get_or_set_call.call_args.kwargs['timeout'], DEFAULT_TIMEOUT)
+
+
+class PurgeSessionsCommandTest(TestCase):
+
+    def test_deletes_only_expired_sessions_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'old{i}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+
+        out = StringIO()
+        call_command('purge_sessions', batch_size=2, stdout=out)
+
+        self.assertIn('5 sesiones', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+
+
+class CountingBackend(locmem.EmailBackend):
+    """Backend de entrega para las pruebas: cuenta conexiones y falla con los destinatarios 'falla@'"""
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        if any(address.startswith('falla@') for message in messages for address in message.to):
+            raise ConnectionError('SMTP no disponible')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='core.mail.OutboxBackend', OUTBOX_DELIVERY_BACKEND='core.tests.CountingBackend')
+class OutboxTest(TestCase):
+
+    def setUp(self):
+        CountingBackend.opened = 0
+        # Los límites de allauth (registro por IP) viven en la caché
+        cache.clear()
+
+    def test_send_mail_only_queues(self):
+        send_mail('Hola', 'Texto', 'tienda@example.com', ['cliente@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+        row = OutgoingEmail.objects.get()
+        self.assertEqual((row.status, row.to), ('pendiente', ['cliente@example.com']))
+
+    def test_contact_form_returns_without_sending(self):
+        response = self.client.post(reverse('core:contact'), {
+            'name': 'Ana', 'email': 'ana@example.com', 'subject': 'Duda',
+            'message': 'Hola', 'privacy': 'on',
+        })
+        self.assertRedirects(response, reverse('core:contact'))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().to, ['hola@gaiacare.mx'])
+
+    def test_worker_sends_a_batch_over_one_connection(self):
+        for i in range(3):
+            message = EmailMultiAlternatives(f'Correo {i}', 'Texto', 'tienda@example.com', [f'c{i}@example.com'])
+            message.attach_alternative('<p>Texto</p>', 'text/html')
+            message.send()
+
+        out = StringIO()
+        call_command('send_queued_mail', stdout=out)
+
+        self.assertIn('3 correos enviados', out.getvalue())
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(OutgoingEmail.objects.exclude(status='enviado').exists())
+
+    def test_failures_are_retried_with_backoff(self):
+        send_mail('Ok', 'Texto', 'tienda@example.com', ['ok@example.com'])
+        send_mail('Mal', 'Texto', 'tienda@example.com', ['falla@example.com'])
+
+        self.assertEqual(send_queued(), (1, 1))
+        failed = OutgoingEmail.objects.get(subject='Mal')
+        self.assertEqual((failed.status, failed.attempts), ('pendiente', 1))
+        self.assertIn('SMTP no disponible', failed.last_error)
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+        # No se reintenta antes de tiempo
+        self.assertEqual(send_queued(), (0, 0))
+
+        self.assertEqual(retry_delay(2), 2 * retry_delay(1))
+        OutgoingEmail.objects.filter(pk=failed.pk).update(attempts=MAX_ATTEMPTS - 1, next_attempt_at=timezone.now())
+        self.assertEqual(send_queued(), (0, 1))
+        self.assertEqual(OutgoingEmail.objects.get(pk=failed.pk).status, 'fallido')
+
+    def test_account_mail_is_queued(self):
+        response = self.client.post(reverse('account_signup'), {
+            'email': 'nueva@example.com', 'password1': 'Gaia-Care-2024', 'password2': 'Gaia-Care-2024',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().to, ['nueva@example.com'])
+        send_queued()
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(RATE_LIMITS={
+    'products:search_suggestions': {'rate': '60/m', 'burst': 2},
+    'core:contact': {'rate': '5/h', 'burst': 1, 'methods': ['POST']},
+})
+class RateLimitTest(TestCase):
+
+    def setUp(self):
+        caches['ratelimit'].clear()
+        self.url = reverse('products:search_suggestions')
+
+    def _search(self, ip='10.0.0.1', **headers):
+        return self.client.get(self.url, {'q': 'crema'}, REMOTE_ADDR=ip, **headers)
+
+    def test_bucket_allows_burst_then_rejects(self):
+        self.assertEqual([self._search().status_code for _ in range(2)], [200, 200])
+        response = self._search()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        # Cada IP tiene su propia cubeta
+        self.assertEqual(self._search(ip='10.0.0.2').status_code, 200)
+
+    def test_ajax_requests_get_json(self):
+        for _ in range(2):
+            self._search()
+        response = self._search(HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('error', response.json())
+
+    def test_session_bucket_applies_across_ips(self):
+        user = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='x')
+        self.client.force_login(user)
+        self._search(ip='10.0.0.1')
+        self._search(ip='10.0.0.2')
+        self.assertEqual(self._search(ip='10.0.0.3').status_code, 429)
+
+    def test_only_configured_methods_count(self):
+        contact = reverse('core:contact')
+        self.assertEqual([self.client.get(contact).status_code for _ in range(3)], [200, 200, 200])
+        self.assertEqual(self.client.post(contact).status_code, 200)
+        self.assertEqual(self.client.post(contact).status_code, 429)
+
+    def test_buckets_stay_out_of_the_default_cache(self):
+        self._search()
+        key = 'ratelimit:products:search_suggestions:ip:10.0.0.1'
+        self.assertIsNotNone(caches['ratelimit'].get(key))
+        self.assertIsNone(cache.get(key))
+
+    @override_settings(RATE_LIMIT_ENABLED=False)
+    def test_can_be_disabled(self):
+        self.assertEqual({self._search().status_code for _ in range(4)}, {200})
+
+    def test_tokens_refill_over_time(self):
+        bucket = TokenBucket('60/m', burst=1)
+        allowed, state, _ = bucket.take(None, now=100)
+        self.assertTrue(allowed)
+        allowed, _, wait = bucket.take(state, now=100.5)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 0.5)
+        self.assertTrue(bucket.take(state, now=101)[0])
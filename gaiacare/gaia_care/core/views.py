@@ -4,8 +4,11 @@ from django.views import View
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.conf import settings
+from django.utils.decorators import method_decorator
 from products.models import Product, Category
+from .routers import read_replica
 
+@method_decorator(read_replica, name='dispatch')
 class HomeView(TemplateView):
     """Vista para la página principal"""
     template_name = 'core/home.html'
@@ -61,7 +64,7 @@ Este mensaje fue enviado desde el formulario de contacto de GaiaCare.
         """
         
         try:
-            # Enviar correo
+            # Queda en la bandeja de salida (EMAIL_BACKEND); send_queued_mail lo entrega
             send_mail(
                 email_subject,
                 email_body,
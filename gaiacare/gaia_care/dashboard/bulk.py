@@ -0,0 +1,219 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from core.cache import invalidate_namespace
+from orders.models import Order, OrderEvent, PaymentInfo, ShippingInfo
+from products.models import Category
+from products.facets import refresh_facets
+from products.reorder import low_stock
+
+# Filas por sentencia al asignar guías de rastreo (límite de variables de SQLite)
+TRACKING_BATCH_SIZE = 200
+
+
+def filter_products(products, params):
+    """Aplica los filtros del listado de productos (categoría, estado y búsqueda)"""
+    category_id = params.get('category')
+    search_query = params.get('search')
+    status = params.get('status')
+
+    if category_id:
+        products = products.filter(category_id=category_id)
+
+    if search_query:
+        products = products.filter(
+            Q(name__icontains=search_query) |
+            Q(description__icontains=search_query)
+        )
+
+    if status == 'available':
+        products = products.filter(available=True)
+    elif status == 'unavailable':
+        products = products.filter(available=False)
+    elif status == 'featured':
+        products = products.filter(featured=True)
+    elif status == 'low_stock':
+        products = low_stock(products)
+
+    return products
+
+
+def _parse_decimal(value):
+    try:
+        value = Decimal(str(value))
+    except (InvalidOperation, TypeError):
+        raise ValueError(f'Valor numérico inválido: {value!r}')
+    if not value.is_finite():
+        raise ValueError(f'Valor numérico inválido: {value!r}')
+    return value
+
+
+def _category_update(value):
+    if not str(value).isdigit() or not Category.objects.filter(id=value).exists():
+        raise ValueError('Selecciona una categoría válida')
+    return {'category_id': int(value)}
+
+
+def _price_percent_update(value):
+    percent = _parse_decimal(value)
+    if percent <= -100:
+        raise ValueError('El porcentaje debe ser mayor a -100')
+    factor = 1 + percent / 100
+    return {'price': Round(F('price') * factor, 2)}
+
+
+def _price_set_update(value):
+    price = _parse_decimal(value)
+    if price < 0:
+        raise ValueError('El precio no puede ser negativo')
+    return {'price': price}
+
+
+# Acciones que cambian campos del índice de facetas (categoría o rango de precio)
+FACETED_ACTIONS = {'set_category', 'adjust_price', 'set_price'}
+
+# Acción -> (etiqueta, función que traduce el valor del formulario a los campos del UPDATE)
+PRODUCT_ACTIONS = {
+    'make_available': ('Marcar como disponibles', lambda value: {'available': True}),
+    'make_unavailable': ('Marcar como no disponibles', lambda value: {'available': False}),
+    'feature': ('Marcar como destacados', lambda value: {'featured': True}),
+    'unfeature': ('Quitar de destacados', lambda value: {'featured': False}),
+    'set_category': ('Cambiar categoría', _category_update),
+    'adjust_price': ('Ajustar precio (%)', _price_percent_update),
+    'set_price': ('Fijar precio', _price_set_update),
+}
+
+
+def apply_product_action(products, action, value=None):
+    """
+    Ejecuta una acción masiva como un único UPDATE ... WHERE sobre el queryset
+    y devuelve el número de productos afectados. Como update() no emite
+    señales, invalida aquí las cachés de catálogo y panel.
+    """
+    if action not in PRODUCT_ACTIONS:
+        raise ValueError(f'Acción desconocida: {action!r}')
+
+    _, build_update = PRODUCT_ACTIONS[action]
+    fields = build_update(value)
+    # update() ignora auto_now
+    fields['updated_at'] = timezone.now()
+
+    with transaction.atomic():
+        # Se leen los ids antes del UPDATE: cambiar la categoría puede sacarlos del filtro
+        ids = list(products.values_list('id', flat=True)) if action in FACETED_ACTIONS else None
+        updated = products.update(**fields)
+        if updated:
+            if ids:
+                refresh_facets(ids)
+            transaction.on_commit(lambda: invalidate_namespace('products'))
+            transaction.on_commit(lambda: invalidate_namespace('dashboard'))
+    return updated
+
+
+# Estados a los que se puede llevar un lote de pedidos
+FULFILLMENT_STATUSES = {
+    'pagado': 'Marcar como pagados',
+    'enviado': 'Marcar como enviados',
+    'entregado': 'Marcar como entregados',
+}
+# Estados desde los que se puede llegar a cada uno (sin retroceder); repetir el
+# mismo estado solo actualiza pago/envío y guías
+FULFILLMENT_SOURCES = {
+    'pagado': ('pendiente', 'pagado'),
+    'enviado': ('pendiente', 'pagado', 'enviado'),
+    'entregado': ('pendiente', 'pagado', 'enviado', 'entregado'),
+}
+
+
+def parse_tracking_list(text, default_carrier=''):
+    """
+    Lee una lista pegada de guías, una por línea, como
+    'pedido, transportista, guía' o 'pedido, guía' (usa el transportista por
+    defecto). Separa por comas, punto y coma o tabuladores y, si no hay
+    ninguno, por espacios. Devuelve {id de pedido: (transportista, guía)}.
+    """
+    tracking = {}
+    for line_number, line in enumerate((text or '').splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        separator = r'[,;\t]' if re.search(r'[,;\t]', line) else r'\s+'
+        parts = [part.strip() for part in re.split(separator, line)]
+        order_id = parts[0].lstrip('#')
+        if not order_id.isdigit() or len(parts) not in (2, 3) or not parts[-1]:
+            raise ValueError(f'Línea {line_number} inválida: {line!r}')
+        if len(parts) == 3:
+            carrier, tracking_number = parts[1] or default_carrier, parts[2]
+        else:
+            carrier, tracking_number = default_carrier, parts[1]
+        tracking[int(order_id)] = (carrier, tracking_number)
+    return tracking
+
+
+def _case_by_order(field, values):
+    """CASE order_id WHEN ... para asignar un valor distinto por pedido en un solo UPDATE"""
+    return Case(
+        *[When(order_id=order_id, then=Value(value)) for order_id, value in values.items() if value],
+        default=F(field),
+        output_field=models.CharField(),
+    )
+
+
+def apply_fulfillment(order_ids, status, carrier='', tracking=None):
+    """
+    Cambia el estado de un lote de pedidos en una transacción con sentencias
+    por conjunto: un UPDATE para los pedidos y otro para su pago ('pagado')
+    o su envío ('enviado'/'entregado'), rellenando payment_date, shipped_date
+    y delivered_date solo donde estén vacías, más uno por bloque de guías.
+    Solo se mueven pedidos hacia adelante (FULFILLMENT_SOURCES); los demás,
+    incluidos los cancelados, se omiten. Los que cambian de estado generan un
+    OrderEvent para avisar al cliente. Devuelve (número de pedidos
+    actualizados, ids omitidos).
+    """
+    if status not in FULFILLMENT_STATUSES:
+        raise ValueError(f'Estado no permitido: {status!r}')
+
+    tracking = tracking or {}
+    now = Value(timezone.now(), output_field=models.DateTimeField())
+
+    requested = set(order_ids) | set(tracking)
+    with transaction.atomic():
+        orders = Order.objects.filter(id__in=requested, status__in=FULFILLMENT_SOURCES[status])
+        current = dict(orders.values_list('id', 'status'))
+        ids = list(current)
+        skipped = sorted(requested - set(ids))
+        if not ids:
+            return 0, skipped
+
+        Order.objects.filter(id__in=ids).update(status=status, updated_at=now)
+        # Aviso al cliente solo para los pedidos que de verdad cambiaron de estado
+        OrderEvent.enqueue_many([order_id for order_id in ids if current[order_id] != status], 'estado', status)
+
+        if status == 'pagado':
+            PaymentInfo.objects.filter(order_id__in=ids).update(
+                status='completado', payment_date=Coalesce(F('payment_date'), now),
+            )
+        else:
+            shipping_fields = {'status': status, 'shipped_date': Coalesce(F('shipped_date'), now)}
+            if status == 'entregado':
+                shipping_fields['delivered_date'] = Coalesce(F('delivered_date'), now)
+            if carrier:
+                shipping_fields['carrier'] = carrier
+            ShippingInfo.objects.filter(order_id__in=ids).update(**shipping_fields)
+
+        # Las guías difieren por pedido: un CASE por bloque en lugar de un save() por fila
+        pending = [order_id for order_id in ids if order_id in tracking]
+        for start in range(0, len(pending), TRACKING_BATCH_SIZE):
+            chunk = {order_id: tracking[order_id] for order_id in pending[start:start + TRACKING_BATCH_SIZE]}
+            ShippingInfo.objects.filter(order_id__in=chunk).update(
+                carrier=_case_by_order('carrier', {order_id: c for order_id, (c, _) in chunk.items()}),
+                tracking_number=_case_by_order('tracking_number', {order_id: t for order_id, (_, t) in chunk.items()}),
+            )
+
+        transaction.on_commit(lambda: invalidate_namespace('dashboard'))
+    return len(ids), skipped
@@ -0,0 +1,81 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+ORDER_FIELDS = [
+    'id', 'created_at', 'status', 'payment_method', 'full_name', 'email', 'phone',
+    'address', 'city', 'state', 'postal_code', 'subtotal', 'shipping_cost', 'total',
+    'payment_reference',
+]
+ITEM_FIELDS = ['product_id', 'product_name', 'product_sku', 'price', 'quantity']
+
+EXPORT_CHUNK_SIZE = 500
+
+
+def filter_orders(orders, params):
+    """Aplica los filtros del listado de pedidos (estado, búsqueda y rango de fechas)"""
+    status = params.get('status')
+    search_query = params.get('search')
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+
+    if status:
+        orders = orders.filter(status=status)
+
+    if search_query:
+        orders = orders.filter(
+            Q(id__icontains=search_query) |
+            Q(full_name__icontains=search_query) |
+            Q(email__icontains=search_query)
+        )
+
+    if date_from:
+        orders = orders.filter(created_at__date__gte=date_from)
+
+    if date_to:
+        orders = orders.filter(created_at__date__lte=date_to)
+
+    return orders
+
+
+def iter_orders(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """Recorre los pedidos por bloques con sus items precargados, en memoria constante"""
+    return orders.prefetch_related('items').iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en lugar de guardarla"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """Genera el CSV línea por línea: una fila por item de pedido"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_FIELDS + [f'item_{field}' for field in ITEM_FIELDS])
+    for order in iter_orders(orders, chunk_size):
+        order_values = [getattr(order, field) for field in ORDER_FIELDS]
+        items = order.items.all()
+        if not items:
+            yield writer.writerow(order_values + [''] * len(ITEM_FIELDS))
+        for item in items:
+            yield writer.writerow(order_values + [getattr(item, field) for field in ITEM_FIELDS])
+
+
+def iter_jsonl(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    """Genera JSON Lines: un objeto por pedido con sus items"""
+    for order in iter_orders(orders, chunk_size):
+        data = {field: getattr(order, field) for field in ORDER_FIELDS}
+        data['items'] = [
+            {field: getattr(item, field) for field in ITEM_FIELDS}
+            for item in order.items.all()
+        ]
+        yield json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (iter_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.models import Order
+from dashboard.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, filter_orders
+
+
+class Command(BaseCommand):
+    help = 'Exporta pedidos con sus items en CSV o JSONL usando memoria constante'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv', help='Formato de salida')
+        parser.add_argument('--output', help='Archivo de salida (por defecto la salida estándar)')
+        parser.add_argument('--status', help='Filtrar por estado del pedido')
+        parser.add_argument('--search', help='Buscar por ID, nombre o email')
+        parser.add_argument('--date-from', help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--date-to', help='Fecha final (AAAA-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='Pedidos leídos por bloque')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser mayor que cero')
+
+        generator, _ = EXPORT_FORMATS[options['format']]
+        orders = filter_orders(Order.objects.all().order_by('-created_at'), options)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for line in generator(orders, options['chunk_size']):
+                    output.write(line)
+        else:
+            for line in generator(orders, options['chunk_size']):
+                self.stdout.write(line, ending='')
@@ -1,3 +1,291 @@
+import csv
+import io
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import StreamingHttpResponse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.cache import get_namespace_version
+
+from orders.models import Order, OrderEvent, OrderItem, PaymentInfo, ShippingInfo
+from orders.tests import create_order
+from products.models import Category, Product, ProductInventory, StockMovement
+from users.models import CustomUser
+from .bulk import apply_fulfillment, parse_tracking_list
+
+
+class DashboardTestCase(TestCase):
+    """Base con un administrador autenticado y un pequeño catálogo"""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(
+            username='admin', email='admin@example.com', password='x', is_staff=True
+        )
+        self.customer = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='x')
+        self.category = Category.objects.create(name='Cremas', slug='cremas')
+        self.product = Product.objects.create(
+            category=self.category, name='Crema', slug='crema', description='', price=50, stock=10
+        )
+        self.client.force_login(self.admin)
+
+
+class OrderExportTest(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.paid = create_order(self.customer, status='pagado')
+        OrderItem.objects.create(order=self.paid, product=self.product, price=50, quantity=2)
+        OrderItem.objects.create(order=self.paid, product=self.product, price=50, quantity=1)
+        self.pending = create_order(self.customer, full_name='Luis')
+        OrderItem.objects.create(order=self.pending, product=self.product, price=50, quantity=1)
+
+    def _content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_streams_one_row_per_item(self):
+        response = self.client.get(reverse('dashboard:order_export', args=['csv']))
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(io.StringIO(self._content(response))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row['item_product_name'] for row in rows}, {'Crema'})
+
+    def test_export_applies_order_list_filters(self):
+        response = self.client.get(reverse('dashboard:order_export', args=['jsonl']), {'status': 'pagado'})
+        lines = [json.loads(line) for line in self._content(response).splitlines()]
+        self.assertEqual([line['id'] for line in lines], [self.paid.id])
+        self.assertEqual([item['quantity'] for item in lines[0]['items']], [2, 1])
+
+    def test_unknown_format_is_not_found(self):
+        response = self.client.get(reverse('dashboard:order_export', args=['xml']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_requires_admin(self):
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('dashboard:order_export', args=['csv']))
+        self.assertEqual(response.status_code, 302)
+
+    def test_management_command_uses_chunks(self):
+        out = io.StringIO()
+        call_command('export_orders', format='jsonl', chunk_size=1, stdout=out)
+        ids = [json.loads(line)['id'] for line in out.getvalue().splitlines()]
+        self.assertEqual(sorted(ids), sorted(Order.objects.values_list('id', flat=True)))
+
+
+class ProductImportViewTest(DashboardTestCase):
+
+    def test_upload_reports_created_and_errors(self):
+        upload = io.BytesIO(
+            'name,category,price,stock,sku\nJabón,cremas,30,5,JB-1\nSin categoría,nada,30,5,JB-2\n'.encode()
+        )
+        upload.name = 'productos.csv'
+        response = self.client.post(reverse('dashboard:product_import'), {'file': upload})
+
+        self.assertEqual(response.status_code, 200)
+        result = response.context['result']
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors[0][0], 2)
+        self.assertTrue(Product.objects.filter(name='Jabón', inventory_detail__sku='JB-1').exists())
+
+
+class ProductBulkActionTest(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.other_category = Category.objects.create(name='Jabones', slug='jabones')
+        self.soap = Product.objects.create(
+            category=self.other_category, name='Jabón', slug='jabon', description='', price=20, stock=3
+        )
+        self.url = reverse('dashboard:product_bulk_action')
+
+    def _post(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, data)
+
+    def test_selected_products_are_updated_in_one_statement(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self._post({'action': 'make_unavailable', 'product_ids': [self.product.id]})
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(updates), 1)
+
+        self.product.refresh_from_db()
+        self.soap.refresh_from_db()
+        self.assertFalse(self.product.available)
+        self.assertTrue(self.soap.available)
+
+    def test_whole_filtered_set(self):
+        response = self._post({'action': 'adjust_price', 'value': '10', 'scope': 'filtered', 'category': self.category.id})
+        self.assertRedirects(response, reverse('dashboard:product_list') + f'?category={self.category.id}')
+
+        self.product.refresh_from_db()
+        self.soap.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('55.00'))
+        self.assertEqual(self.soap.price, Decimal('20.00'))
+
+    def test_set_category_validates_value(self):
+        self._post({'action': 'set_category', 'value': '999', 'product_ids': [self.product.id]})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.category, self.category)
+
+        self._post({'action': 'set_category', 'value': self.other_category.id, 'product_ids': [self.product.id]})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.category, self.other_category)
+
+    def test_update_invalidates_catalog_cache(self):
+        version = get_namespace_version('products')
+        self._post({'action': 'feature', 'scope': 'filtered'})
+        self.assertEqual(Product.objects.filter(featured=True).count(), 2)
+        self.assertEqual(get_namespace_version('products'), version + 1)
+
+    def test_list_offers_bulk_actions(self):
+        response = self.client.get(reverse('dashboard:product_list'), {'category': self.category.id})
+        self.assertContains(response, f'name="product_ids" value="{self.product.id}"')
+        self.assertNotContains(response, f'name="product_ids" value="{self.soap.id}"')
+
+
+class OrderBulkActionTest(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orders = [create_order(self.customer, status='pagado') for _ in range(3)]
+        self.cancelled = create_order(self.customer, status='cancelado')
+        self.url = reverse('dashboard:order_bulk_action')
+
+    def test_parse_tracking_list(self):
+        tracking = parse_tracking_list('#12, DHL, 123\n\n13\tABC\n14 XYZ', default_carrier='Estafeta')
+        self.assertEqual(tracking, {12: ('DHL', '123'), 13: ('Estafeta', 'ABC'), 14: ('Estafeta', 'XYZ')})
+        with self.assertRaises(ValueError):
+            parse_tracking_list('pedido, guía')
+
+    def test_ship_selected_orders_with_tracking_list(self):
+        first, second, third = self.orders
+        tracking_list = f'{first.id}, DHL, 111\n{second.id}, 222'
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(self.url, {
+                'new_status': 'enviado', 'carrier': 'Estafeta', 'tracking_list': tracking_list,
+                'order_ids': [third.id, self.cancelled.id],
+            })
+        shipping_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "orders_shippinginfo"')]
+        self.assertEqual(len(shipping_updates), 2)
+
+        shipments = {s.order_id: s for s in ShippingInfo.objects.all()}
+        self.assertEqual((shipments[first.id].carrier, shipments[first.id].tracking_number), ('DHL', '111'))
+        self.assertEqual((shipments[second.id].carrier, shipments[second.id].tracking_number), ('Estafeta', '222'))
+        self.assertEqual((shipments[third.id].carrier, shipments[third.id].tracking_number), ('Estafeta', ''))
+        for order in self.orders:
+            order.refresh_from_db()
+            self.assertEqual(order.status, 'enviado')
+            self.assertEqual(shipments[order.id].status, 'enviado')
+            self.assertIsNotNone(shipments[order.id].shipped_date)
+
+        self.cancelled.refresh_from_db()
+        self.assertEqual(self.cancelled.status, 'cancelado')
+        self.assertIsNone(shipments[self.cancelled.id].shipped_date)
+
+    def test_delivery_keeps_existing_shipped_date(self):
+        order = self.orders[0]
+        apply_fulfillment([order.id], 'enviado')
+        shipped_date = ShippingInfo.objects.get(order=order).shipped_date
+
+        apply_fulfillment([order.id], 'entregado')
+        shipping = ShippingInfo.objects.get(order=order)
+        self.assertEqual(shipping.shipped_date, shipped_date)
+        self.assertIsNotNone(shipping.delivered_date)
+
+    def test_mark_paid_completes_payment(self):
+        order = create_order(self.customer)
+        self.assertEqual(apply_fulfillment([order.id], 'pagado'), (1, []))
+        payment = PaymentInfo.objects.get(order=order)
+        self.assertEqual(payment.status, 'completado')
+        self.assertIsNotNone(payment.payment_date)
+
+    def test_orders_are_not_moved_backwards(self):
+        shipped, delivered = self.orders[:2]
+        apply_fulfillment([shipped.id], 'enviado')
+        apply_fulfillment([delivered.id], 'entregado')
+
+        self.assertEqual(apply_fulfillment([shipped.id, delivered.id], 'pagado'), (0, sorted([shipped.id, delivered.id])))
+        updated, skipped = apply_fulfillment([shipped.id, delivered.id, self.orders[2].id], 'enviado')
+        self.assertEqual((updated, skipped), (2, [delivered.id]))
+        delivered.refresh_from_db()
+        self.assertEqual(delivered.status, 'entregado')
+
+        response = self.client.post(self.url, {'new_status': 'pagado', 'order_ids': [delivered.id, self.cancelled.id]}, follow=True)
+        self.assertContains(response, 'Se omitieron 2 pedidos')
+
+    def test_status_changes_notify_customers(self):
+        shipped = self.orders[0]
+        apply_fulfillment([shipped.id], 'enviado')
+        OrderEvent.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'new_status': 'enviado', 'order_ids': [order.id for order in self.orders]})
+
+        # El pedido que ya estaba enviado no se vuelve a notificar
+        events = OrderEvent.objects.order_by('order_id')
+        self.assertEqual(
+            [(event.order_id, event.kind, event.status) for event in events],
+            [(order.id, 'estado', 'enviado') for order in self.orders[1:]],
+        )
+
+    def test_unknown_status_is_rejected(self):
+        response = self.client.post(self.url, {'new_status': 'cancelado', 'order_ids': [self.orders[0].id]}, follow=True)
+        self.assertContains(response, 'Estado no permitido')
+        self.orders[0].refresh_from_db()
+        self.assertEqual(self.orders[0].status, 'pagado')
+
+
+class ProductDetailStockTest(DashboardTestCase):
+
+    def test_stock_edit_is_recorded_as_adjustment(self):
+        self.client.post(reverse('dashboard:product_detail', args=[self.product.id]), {
+            'name': 'Crema', 'category': self.category.id, 'description': '', 'price': '50', 'stock': '7',
+        })
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+        movement = StockMovement.objects.filter(inventory__product=self.product).latest('id')
+        self.assertEqual((movement.kind, movement.quantity, movement.user), ('ajuste', -3, self.admin))
+
+
+class ReorderWidgetTest(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        ProductInventory.objects.filter(product=self.product).update(reorder_level=12)
+
+    def test_low_stock_filter_uses_reorder_level(self):
+        response = self.client.get(reverse('dashboard:product_list'), {'status': 'low_stock'})
+        self.assertContains(response, f'name="product_ids" value="{self.product.id}"')
+
+    def test_product_list_highlights_stock_at_reorder_level(self):
+        soap = Product.objects.create(
+            category=self.category, name='Jabón', slug='jabon', description='', price=20, stock=3
+        )
+        ProductInventory.objects.filter(product=soap).update(reorder_level=2)
+        response = self.client.get(reverse('dashboard:product_list'))
+        # Crema: 10 <= 12 se resalta; Jabón: 3 > 2 no, aunque esté por debajo del antiguo umbral fijo de 5
+        self.assertContains(response, '<span class="text-danger fw-bold">10</span>', html=True)
+        self.assertNotContains(response, '<span class="text-danger fw-bold">3</span>', html=True)
+
+    def test_bulk_availability_change_updates_report(self):
+        self.client.get(reverse('dashboard:dashboard_home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('dashboard:product_bulk_action'), {
+                'action': 'make_unavailable', 'product_ids': [self.product.id],
+            })
+        response = self.client.get(reverse('dashboard:dashboard_home'))
+        self.assertEqual(response.context['reorder_rows'], [])
 
-# Create your tests here.
+    def test_home_lists_products_to_reorder(self):
+        response = self.client.get(reverse('dashboard:dashboard_home'))
+        self.assertEqual([row['id'] for row in response.context['reorder_rows']], [self.product.id])
+        self.assertContains(response, 'Productos por Reabastecer')
@@ -10,6 +10,8 @@ urlpatterns = [
     # Productos
     path('productos/', views.product_list, name='product_list'),
     path('productos/nuevo/', views.product_create, name='product_create'),
+    path('productos/importar/', views.product_import, name='product_import'),
+    path('productos/acciones/', views.product_bulk_action, name='product_bulk_action'),
     path('productos/<int:product_id>/', views.product_detail, name='product_detail'),
     path('productos/imagen/<int:image_id>/actualizar/', views.update_product_image, name='update_product_image'),
     
@@ -19,6 +21,8 @@ urlpatterns = [
     
     # Pedidos
     path('pedidos/', views.order_list, name='order_list'),
+    path('pedidos/acciones/', views.order_bulk_action, name='order_bulk_action'),
+    path('pedidos/exportar/<str:export_format>/', views.order_export, name='order_export'),
     path('pedidos/<int:order_id>/', views.order_detail, name='order_detail'),
     
     # Usuarios
@@ -1,27 +1,70 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Count, Sum, Q, F
 from django.utils import timezone
+from django.urls import reverse
+from django.utils.http import urlencode
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, Http404
+import io
 import json
+import os
 from datetime import timedelta
 
 from products.models import Product, Category, ProductImage
+from products.importers import import_products
+from products.batches import EXPIRY_WARNING_DAYS, expiring_batches
+from products.inventory import InsufficientStock, set_stock
+from products.reorder import VELOCITY_DAYS, get_reorder_report, with_reorder_level
 from orders.models import Order, OrderItem
 from users.models import CustomUser
+from users.roles import FULL, admin_required, get_admin_role
+from core.cache import cache_get_or_set
+from core.routers import read_replica
+from .bulk import (
+    FULFILLMENT_STATUSES, PRODUCT_ACTIONS, apply_fulfillment, apply_product_action,
+    filter_products, parse_tracking_list,
+)
+from .exports import EXPORT_FORMATS, filter_orders
 
-# Verificar si el usuario es administrador
-def is_admin(user):
-    """Verifica si el usuario es administrador"""
-    return user.is_staff or user.is_superuser or user.groups.filter(name__in=['Administradores', 'Administradores Limitados']).exists()
+# Filas del reporte de reabastecimiento y de lotes por caducar que se muestran en el inicio del panel
+REORDER_WIDGET_ROWS = 10
+EXPIRING_WIDGET_ROWS = 10
 
-@login_required
-@user_passes_test(is_admin)
+
+@admin_required
+@read_replica
 def dashboard_home(request):
     """Vista principal del panel de control"""
-    # Obtener estadísticas generales
+    # Estadísticas cacheadas; se invalidan al cambiar productos o pedidos
+    stats = cache_get_or_set('dashboard', 'home_stats', default=get_dashboard_stats, timeout=60)
+    
+    # Pedidos recientes
+    recent_orders = Order.objects.order_by('-created_at')[:5]
+    
+    # Reporte de reabastecimiento (en caché, se corrige con cada movimiento de inventario)
+    reorder_rows = get_reorder_report()
+    
+    # Lotes por caducar (consulta sobre el índice parcial de lotes con existencias)
+    expiring = list(expiring_batches()[:EXPIRING_WIDGET_ROWS])
+    
+    context = {
+        **stats,
+        'recent_orders': recent_orders,
+        'reorder_rows': reorder_rows[:REORDER_WIDGET_ROWS],
+        'reorder_more': max(len(reorder_rows) - REORDER_WIDGET_ROWS, 0),
+        'reorder_velocity_days': VELOCITY_DAYS,
+        'expiring_batches': expiring,
+        'expiry_warning_days': EXPIRY_WARNING_DAYS,
+        'today': timezone.localdate(),
+        'section': 'home'
+    }
+    
+    return render(request, 'dashboard/dashboard_home.html', context)
+
+def get_dashboard_stats():
+    """Calcula las estadísticas generales del panel"""
     total_products = Product.objects.count()
     total_categories = Category.objects.count()
     total_users = CustomUser.objects.filter(is_staff=False, is_superuser=False).count()
@@ -30,14 +73,11 @@ def dashboard_home(request):
     total_orders = Order.objects.count()
     total_sales = Order.objects.filter(status__in=['pagado', 'enviado', 'entregado']).aggregate(Sum('total'))['total__sum'] or 0
     
-    # Pedidos recientes
-    recent_orders = Order.objects.order_by('-created_at')[:5]
-    
     # Productos más vendidos
-    top_products = OrderItem.objects.values('product__name', 'product__id').annotate(
+    top_products = list(OrderItem.objects.values('product_name', 'product_id').annotate(
         units_sold=Sum('quantity'),
         revenue=Sum(F('price') * F('quantity'))
-    ).order_by('-units_sold')[:5]
+    ).order_by('-units_sold')[:5])
     
     # Ventas por día (últimos 7 días)
     last_week = timezone.now() - timedelta(days=7)
@@ -55,51 +95,26 @@ def dashboard_home(request):
         chart_labels.append(day['created_at__date'].strftime('%d/%m'))
         chart_data.append(float(day['total_sales']))
     
-    context = {
+    return {
         'total_products': total_products,
         'total_categories': total_categories,
         'total_users': total_users,
         'total_orders': total_orders,
         'total_sales': total_sales,
-        'recent_orders': recent_orders,
         'top_products': top_products,
         'chart_labels': json.dumps(chart_labels),
         'chart_data': json.dumps(chart_data),
-        'section': 'home'
     }
-    
-    return render(request, 'dashboard/dashboard_home.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@admin_required
 def product_list(request):
     """Lista de productos para administración"""
-    products = Product.objects.all().order_by('-created_at')
+    products = filter_products(with_reorder_level(Product.objects.all()).order_by('-created_at'), request.GET)
     
-    # Filtros
     category_id = request.GET.get('category')
     search_query = request.GET.get('search')
     status = request.GET.get('status')
     
-    if category_id:
-        products = products.filter(category_id=category_id)
-    
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query)
-        )
-    
-    if status:
-        if status == 'available':
-            products = products.filter(available=True)
-        elif status == 'unavailable':
-            products = products.filter(available=False)
-        elif status == 'featured':
-            products = products.filter(featured=True)
-        elif status == 'low_stock':
-            products = products.filter(stock__lt=5)
-    
     # Paginación
     paginator = Paginator(products, 10)  # 10 productos por página
     page_number = request.GET.get('page')
@@ -114,13 +129,43 @@ def product_list(request):
         'section': 'products',
         'category_id': category_id,
         'search_query': search_query,
-        'status': status
+        'status': status,
+        'bulk_actions': [(key, label) for key, (label, _) in PRODUCT_ACTIONS.items()],
+        'can_import': get_admin_role(request) == FULL,
     }
     
     return render(request, 'dashboard/product_list.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@admin_required
+def product_bulk_action(request):
+    """Aplica una acción masiva a los productos seleccionados o a todo el listado filtrado"""
+    filters = {key: request.POST.get(key) for key in ('category', 'status', 'search') if request.POST.get(key)}
+    redirect_url = reverse('dashboard:product_list')
+    if filters:
+        redirect_url = f'{redirect_url}?{urlencode(filters)}'
+    
+    if request.method != 'POST':
+        return redirect(redirect_url)
+    
+    if request.POST.get('scope') == 'filtered':
+        products = filter_products(Product.objects.all(), filters)
+    else:
+        product_ids = [pk for pk in request.POST.getlist('product_ids') if pk.isdigit()]
+        if not product_ids:
+            messages.error(request, 'Selecciona al menos un producto.')
+            return redirect(redirect_url)
+        products = Product.objects.filter(id__in=product_ids)
+    
+    try:
+        updated = apply_product_action(products, request.POST.get('action'), request.POST.get('value'))
+    except ValueError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, f'{updated} productos actualizados.')
+    
+    return redirect(redirect_url)
+
+@admin_required
 def product_detail(request, product_id):
     """Detalle y edición de producto"""
     product = get_object_or_404(Product, id=product_id)
@@ -132,11 +177,17 @@ def product_detail(request, product_id):
         product.category_id = request.POST.get('category')
         product.description = request.POST.get('description')
         product.price = request.POST.get('price')
-        product.stock = request.POST.get('stock')
         product.available = 'available' in request.POST
         product.featured = 'featured' in request.POST
         
-        product.save()
+        with transaction.atomic():
+            product.save(update_fields=[
+                'name', 'category', 'description', 'price', 'available', 'featured', 'slug', 'updated_at',
+            ])
+            # El inventario se cambia con un ajuste en el kardex, no sobrescribiendo el saldo
+            stock = request.POST.get('stock', '')
+            if stock.isdigit() and int(stock) != product.stock:
+                set_stock(product, stock, user=request.user, note='Edición desde el panel')
         
         # Manejar imágenes
         if 'image' in request.FILES:
@@ -158,8 +209,7 @@ def product_detail(request, product_id):
     
     return render(request, 'dashboard/product_detail.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@admin_required
 def product_create(request):
     """Crear nuevo producto"""
     categories = Category.objects.all()
@@ -203,34 +253,51 @@ def product_create(request):
     
     return render(request, 'dashboard/product_create.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@admin_required(role=FULL)
+def product_import(request):
+    """Importación masiva de productos desde CSV, JSON o JSONL"""
+    result = None
+    
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        file_format = os.path.splitext(upload.name)[1].lstrip('.').lower() if upload else ''
+        
+        if not upload:
+            messages.error(request, 'Selecciona un archivo para importar.')
+        elif file_format not in ('csv', 'json', 'jsonl'):
+            messages.error(request, 'Formato no soportado. Usa CSV, JSON o JSONL.')
+        else:
+            try:
+                result = import_products(
+                    io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''),
+                    file_format,
+                    dry_run='dry_run' in request.POST
+                )
+            except (ValueError, UnicodeDecodeError) as e:
+                messages.error(request, f'No se pudo leer el archivo: {e}')
+            else:
+                messages.success(
+                    request,
+                    f'{result.created} productos creados y {result.updated} actualizados.'
+                )
+    
+    context = {
+        'result': result,
+        'section': 'products'
+    }
+    
+    return render(request, 'dashboard/product_import.html', context)
+
+@admin_required
 def order_list(request):
     """Lista de pedidos para administración"""
-    orders = Order.objects.all().order_by('-created_at')
-    
     # Filtros
+    orders = filter_orders(Order.objects.all().order_by('-created_at'), request.GET)
     status = request.GET.get('status')
     search_query = request.GET.get('search')
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
     
-    if status:
-        orders = orders.filter(status=status)
-    
-    if search_query:
-        orders = orders.filter(
-            Q(id__icontains=search_query) | 
-            Q(full_name__icontains=search_query) | 
-            Q(email__icontains=search_query)
-        )
-    
-    if date_from:
-        orders = orders.filter(created_at__date__gte=date_from)
-    
-    if date_to:
-        orders = orders.filter(created_at__date__lte=date_to)
-    
     # Paginación
     paginator = Paginator(orders, 10)  # 10 pedidos por página
     page_number = request.GET.get('page')
@@ -242,16 +309,61 @@ def order_list(request):
         'status': status,
         'search_query': search_query,
         'date_from': date_from,
-        'date_to': date_to
+        'date_to': date_to,
+        'fulfillment_statuses': FULFILLMENT_STATUSES.items(),
     }
     
     return render(request, 'dashboard/order_list.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@admin_required
+def order_bulk_action(request):
+    """Cambia el estado de varios pedidos a la vez y asigna guías desde una lista pegada"""
+    filters = {key: request.POST.get(key) for key in ('status', 'search', 'date_from', 'date_to') if request.POST.get(key)}
+    redirect_url = reverse('dashboard:order_list')
+    if filters:
+        redirect_url = f'{redirect_url}?{urlencode(filters)}'
+    
+    if request.method != 'POST':
+        return redirect(redirect_url)
+    
+    carrier = request.POST.get('carrier', '').strip()
+    order_ids = [int(pk) for pk in request.POST.getlist('order_ids') if pk.isdigit()]
+    try:
+        tracking = parse_tracking_list(request.POST.get('tracking_list'), default_carrier=carrier)
+        if not order_ids and not tracking:
+            raise ValueError('Selecciona al menos un pedido o pega una lista de guías.')
+        updated, skipped = apply_fulfillment(order_ids, request.POST.get('new_status'), carrier=carrier, tracking=tracking)
+    except ValueError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, f'{updated} pedidos actualizados.')
+        if skipped:
+            messages.warning(
+                request,
+                f'Se omitieron {len(skipped)} pedidos cancelados, inexistentes o en un estado más avanzado: '
+                + ', '.join(f'#{order_id}' for order_id in skipped)
+            )
+    
+    return redirect(redirect_url)
+
+@admin_required
+def order_export(request, export_format):
+    """Exporta los pedidos filtrados como CSV o JSONL en streaming"""
+    if export_format not in EXPORT_FORMATS:
+        raise Http404('Formato de exportación no soportado')
+    
+    generator, content_type = EXPORT_FORMATS[export_format]
+    orders = filter_orders(Order.objects.all().order_by('-created_at'), request.GET)
+    
+    response = StreamingHttpResponse(generator(orders), content_type=content_type)
+    filename = f"pedidos-{timezone.now():%Y%m%d-%H%M}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@admin_required
 def order_detail(request, order_id):
     """Detalle y gestión de pedido"""
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(Order.objects.with_details(), id=order_id)
     
     if request.method == 'POST':
         updated = False
@@ -259,9 +371,13 @@ def order_detail(request, order_id):
         # Actualizar estado del pedido
         status = request.POST.get('status')
         if status and status != order.status:
-            order.status = status
-            order.save()
-            updated = True
+            # Cancelar devuelve el inventario; reactivar lo vuelve a descontar
+            try:
+                order.set_status(status, user=request.user)
+                updated = True
+            except InsufficientStock as e:
+                messages.error(request, f'No se pudo reactivar el pedido. {e}')
+                return redirect('dashboard:order_detail', order_id=order.id)
         
         # Actualizar información de envío
         shipping_status = request.POST.get('shipping_status')
@@ -293,7 +409,9 @@ def order_detail(request, order_id):
                 order.shipping.notes = shipping_notes
                 updated = True
             
-            order.shipping.save()
+            order.shipping.save(update_fields=[
+                'status', 'shipped_date', 'delivered_date', 'tracking_number', 'carrier', 'notes',
+            ])
             updated = True
         
         # Actualizar información de pago
@@ -317,7 +435,7 @@ def order_detail(request, order_id):
                 order.payment.notes = payment_notes
                 updated = True
             
-            order.payment.save()
+            order.payment.save(update_fields=['status', 'payment_date', 'transaction_id', 'notes'])
             updated = True
         
         if updated:
@@ -334,8 +452,7 @@ def order_detail(request, order_id):
     
     return render(request, 'dashboard/order_detail.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@admin_required
 def category_list(request):
     """Lista de categorías para administración"""
     categories = Category.objects.all()
@@ -371,8 +488,7 @@ def category_list(request):
     
     return render(request, 'dashboard/category_list.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@admin_required
 def category_detail(request, category_id):
     """Detalle y edición de categoría"""
     category = get_object_or_404(Category, id=category_id)
@@ -403,8 +519,7 @@ def category_detail(request, category_id):
     
     return render(request, 'dashboard/category_detail.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@admin_required
 def user_list(request):
     """Lista de usuarios para administración"""
     users = CustomUser.objects.filter(is_staff=False, is_superuser=False).order_by('-date_joined')
@@ -433,8 +548,7 @@ def user_list(request):
     
     return render(request, 'dashboard/user_list.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@admin_required
 def user_detail(request, user_id):
     """Detalle de usuario y sus pedidos"""
     user = get_object_or_404(CustomUser, id=user_id)
@@ -450,8 +564,7 @@ def user_detail(request, user_id):
     
     return render(request, 'dashboard/user_detail.html', context)
 
-@login_required
-@user_passes_test(is_admin)
+@admin_required
 def update_product_image(request, image_id):
     """AJAX: Actualizar imagen de producto"""
     if request.method == 'POST':
@@ -487,8 +600,7 @@ def update_product_image(request, image_id):
     
     return JsonResponse({'success': False, 'error': 'Método no permitido.'})
 
-@login_required
-@user_passes_test(is_admin)
+@admin_required(role=FULL)
 def dashboard_settings(request):
     """Configuración general del panel"""
     return render(request, 'dashboard/settings.html', {'section': 'settings'})
\ No newline at end of file
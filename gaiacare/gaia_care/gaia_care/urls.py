@@ -4,8 +4,9 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 urlpatterns = [
+    # URLs personalizadas para admin; van antes de admin.site.urls, que atrapa todo lo que empieza con admin/
+    path('admin/products/', include('products.admin_urls')),
     path('admin/', admin.site.urls),
-    path('admin/products/', include('products.admin_urls')),  # URLs personalizadas para admin
     path('accounts/', include('allauth.urls')),
     path('productos/', include('products.urls')),
     path('pedidos/', include('orders.urls')),
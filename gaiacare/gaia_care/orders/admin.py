@@ -1,11 +1,14 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.translation import gettext_lazy as _
+from products.inventory import InsufficientStock
 from .models import Order, OrderItem, ShippingInfo, PaymentInfo, PaymentConfig
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ('get_total',)
+    fields = ('product', 'product_name', 'product_sku', 'price', 'quantity', 'get_total')
+    readonly_fields = ('product_name', 'product_sku', 'get_total')
+    raw_id_fields = ('product',)
     
     def get_total(self, obj):
         return obj.get_total()
@@ -55,7 +58,16 @@ class OrderAdmin(admin.ModelAdmin):
                 defaults={'amount': obj.total}
             )
         else:
+            # El cambio de estado pasa por set_status para devolver o descontar inventario
+            new_status = obj.status
+            if 'status' in form.changed_data:
+                obj.status = form.initial['status']
             super().save_model(request, obj, form, change)
+            if new_status != obj.status:
+                try:
+                    obj.set_status(new_status, user=request.user)
+                except InsufficientStock as e:
+                    messages.error(request, f'No se pudo reactivar el pedido. {e}')
             # Actualizar monto de pago si cambia el total
             payment, created = PaymentInfo.objects.get_or_create(
                 order=obj,
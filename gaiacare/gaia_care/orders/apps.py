@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
+
+    def ready(self):
+        from core.cache import invalidate_on_change
+        from .models import Order, OrderItem, PaymentConfig
+        invalidate_on_change('dashboard', Order, OrderItem)
+        invalidate_on_change('orders', PaymentConfig, key=lambda config: ('payment_config',))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.mail import send_queued
+from orders.notifications import BATCH_SIZE, process_order_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Convierte en correos los eventos de pedidos pendientes (creación y cambios '
+        'de estado) y entrega la bandeja de salida en lotes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'Eventos y correos por lote (por defecto {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Sigue revisando los eventos en lugar de terminar cuando no quedan',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Segundos de espera entre revisiones con --loop (por defecto 5)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_events = total_sent = 0
+
+        while True:
+            events = process_order_events(batch_size=batch_size)
+            sent, failed = send_queued(batch_size=batch_size)
+            total_events += events
+            total_sent += sent
+            if failed:
+                self.stdout.write(self.style.WARNING(f'{failed} correos fallaron; se reintentarán más tarde.'))
+            if events < batch_size and sent + failed < batch_size:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total_events} eventos procesados, {total_sent} correos enviados.'))
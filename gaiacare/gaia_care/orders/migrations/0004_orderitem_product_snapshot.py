@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:44
+
+import django.db.models.deletion
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def backfill_snapshots(apps, schema_editor):
+    """Copia nombre, SKU e imagen del producto en los items existentes"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    ProductInventory = apps.get_model('products', 'ProductInventory')
+    ProductImage = apps.get_model('products', 'ProductImage')
+    db_alias = schema_editor.connection.alias
+
+    items = list(OrderItem.objects.using(db_alias).filter(product__isnull=False).select_related('product'))
+    product_ids = {item.product_id for item in items}
+    skus = dict(
+        ProductInventory.objects.using(db_alias).filter(product_id__in=product_ids).values_list('product_id', 'sku')
+    )
+    images = {}
+    for image in ProductImage.objects.using(db_alias).filter(product_id__in=product_ids).order_by('-is_main', 'created_at'):
+        images.setdefault(image.product_id, image.image.name)
+
+    for item in items:
+        item.product_name = item.product.name
+        item.product_sku = skus.get(item.product_id, '')
+        image_name = images.get(item.product_id)
+        item.image_url = default_storage.url(image_name) if image_name else ''
+    OrderItem.objects.using(db_alias).bulk_update(items, ['product_name', 'product_sku', 'image_url'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_paymentconfig'),
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='image_url',
+            field=models.CharField(blank=True, max_length=255, verbose_name='URL de la imagen'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=200, verbose_name='nombre del producto'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_sku',
+            field=models.CharField(blank=True, max_length=100, verbose_name='SKU'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.product', verbose_name='producto'),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:02
+
+from django.db import migrations, models
+
+
+def mark_cancelled_orders(apps, schema_editor):
+    """Los pedidos ya cancelados no devuelven inventario si se vuelven a cancelar"""
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.using(schema_editor.connection.alias).filter(status='cancelado').update(stock_restored=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_orderitem_product_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_restored',
+            field=models.BooleanField(default=False, editable=False, verbose_name='inventario devuelto'),
+        ),
+        migrations.RunPython(mark_cancelled_orders, migrations.RunPython.noop),
+    ]
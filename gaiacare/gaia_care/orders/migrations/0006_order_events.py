@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_stock_restored'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('creado', 'Pedido creado'), ('estado', 'Cambio de estado')], max_length=10, verbose_name='tipo')),
+                ('status', models.CharField(choices=[('pendiente', 'Pendiente'), ('pagado', 'Pagado'), ('enviado', 'Enviado'), ('entregado', 'Entregado'), ('cancelado', 'Cancelado')], max_length=20, verbose_name='estado')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='creado')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='procesado')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='orders.order', verbose_name='pedido')),
+            ],
+            options={
+                'verbose_name': 'evento de pedido',
+                'verbose_name_plural': 'eventos de pedidos',
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='orderevent_pending_idx')],
+            },
+        ),
+    ]
@@ -1,7 +1,25 @@
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, transaction
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from products.models import Product
+from core.cache import cache_get_or_set
+from core.db import immediate_atomic
+from products.batches import release_batches
+from products.inventory import apply_movements
+from products.models import Product, ProductInventory
+
+class OrderQuerySet(models.QuerySet):
+    """Consultas comunes de pedidos"""
+    
+    def for_user(self, user):
+        """Pedidos que pertenecen al usuario"""
+        return self.filter(user=user)
+    
+    def with_details(self):
+        """Precarga envío, pago, items, productos e imágenes en un número fijo de consultas"""
+        # Los items guardan una copia del producto, no hace falta unir con el catálogo
+        return self.select_related('shipping', 'payment').prefetch_related('items')
+
 
 class Order(models.Model):
     """Modelo para los pedidos"""
@@ -34,9 +52,12 @@ class Order(models.Model):
     total = models.DecimalField(_('total'), max_digits=10, decimal_places=2)
     payment_reference = models.CharField(_('referencia de pago'), max_length=100, blank=True)
     notes = models.TextField(_('notas'), blank=True)
+    stock_restored = models.BooleanField(_('inventario devuelto'), default=False, editable=False)
     created_at = models.DateTimeField(_('creado'), auto_now_add=True)
     updated_at = models.DateTimeField(_('actualizado'), auto_now=True)
     
+    objects = OrderQuerySet.as_manager()
+    
     def __str__(self):
         return f"Pedido #{self.id} - {self.user.email}"
     
@@ -46,21 +67,127 @@ class Order(models.Model):
         self.total = self.subtotal + self.shipping_cost
         self.save()
     
+    def set_status(self, status, user=None):
+        """
+        Cambia el estado del pedido. Al cancelar devuelve al inventario (y a
+        sus lotes) las cantidades de todas sus líneas y al reactivar un pedido
+        cancelado las vuelve a descontar; stock_restored se cambia con un UPDATE condicional
+        en la misma transacción, así que repetir el cambio (o hacerlo en
+        paralelo) no mueve el inventario dos veces.
+        """
+        now = timezone.now()
+        using = self._state.db or DEFAULT_DB_ALIAS
+        orders = Order.objects.using(using).filter(pk=self.pk)
+        
+        with immediate_atomic(using=using):
+            if status != self.status:
+                OrderEvent.enqueue(self.pk, 'estado', status, using=using)
+            restore = status == 'cancelado'
+            flipped = orders.filter(stock_restored=not restore).update(
+                status=status, stock_restored=restore, updated_at=now
+            )
+            if flipped:
+                if restore:
+                    # Las unidades vuelven a los lotes de los que salieron
+                    release_batches(f'Pedido #{self.pk}', using=using)
+                items = OrderItem.objects.using(using).filter(order_id=self.pk, product__isnull=False).select_related('product')
+                sign = 1 if restore else -1
+                apply_movements(
+                    [(item.product, sign * item.quantity) for item in items],
+                    'cancelacion' if restore else 'venta',
+                    reference=f'Pedido #{self.pk}',
+                    note='' if restore else 'Reactivación del pedido',
+                    user=user,
+                    using=using,
+                )
+            else:
+                orders.update(status=status, updated_at=now)
+        
+        self.status = status
+        self.stock_restored = restore
+        self.updated_at = now
+    
     class Meta:
         verbose_name = _('pedido')
         verbose_name_plural = _('pedidos')
         ordering = ['-created_at']
 
 
+class OrderEvent(models.Model):
+    """Evento de un pedido por notificar al cliente; orders.notifications lo convierte en correo"""
+    KIND_CHOICES = (
+        ('creado', _('Pedido creado')),
+        ('estado', _('Cambio de estado')),
+    )
+    # Estados que se notifican al cliente (reactivar un pedido cancelado no se avisa)
+    NOTIFY_STATUSES = ('pagado', 'enviado', 'entregado', 'cancelado')
+    
+    order = models.ForeignKey(Order, verbose_name=_('pedido'), related_name='events', on_delete=models.CASCADE)
+    kind = models.CharField(_('tipo'), max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(_('estado'), max_length=20, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField(_('creado'), auto_now_add=True)
+    processed_at = models.DateTimeField(_('procesado'), null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} ({self.status}) del pedido #{self.order_id}"
+    
+    @classmethod
+    def enqueue(cls, order_id, kind, status, using=None):
+        """Registra el evento cuando se confirme la transacción; si se revierte no hay aviso"""
+        cls.enqueue_many([order_id], kind, status, using=using)
+    
+    @classmethod
+    def enqueue_many(cls, order_ids, kind, status, using=None):
+        """Como enqueue para varios pedidos, con un solo bulk_create al confirmar"""
+        order_ids = list(order_ids)
+        if not order_ids or (kind == 'estado' and status not in cls.NOTIFY_STATUSES):
+            return
+        transaction.on_commit(
+            lambda: cls.objects.db_manager(using).bulk_create(
+                [cls(order_id=order_id, kind=kind, status=status) for order_id in order_ids]
+            ),
+            using=using,
+        )
+    
+    class Meta:
+        verbose_name = _('evento de pedido')
+        verbose_name_plural = _('eventos de pedidos')
+        indexes = [
+            # Cola del worker: solo los que faltan por procesar
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='orderevent_pending_idx'),
+        ]
+
+
 class OrderItem(models.Model):
     """Elementos individuales en un pedido"""
     order = models.ForeignKey(Order, verbose_name=_('pedido'), related_name='items', on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, verbose_name=_('producto'), on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, verbose_name=_('producto'), on_delete=models.SET_NULL, null=True, blank=True)
     price = models.DecimalField(_('precio'), max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(_('cantidad'), default=1)
     
+    # Copia del producto al momento de la compra
+    product_name = models.CharField(_('nombre del producto'), max_length=200, blank=True)
+    product_sku = models.CharField(_('SKU'), max_length=100, blank=True)
+    image_url = models.CharField(_('URL de la imagen'), max_length=255, blank=True)
+    
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
+        return f"{self.quantity} x {self.product_name}"
+    
+    def save(self, *args, **kwargs):
+        if self.product_id and not self.product_name:
+            self.snapshot_product()
+        super().save(*args, **kwargs)
+    
+    def snapshot_product(self):
+        """Copia nombre, SKU e imagen principal del producto en el item"""
+        product = self.product
+        self.product_name = product.name
+        try:
+            self.product_sku = product.inventory_detail.sku
+        except ProductInventory.DoesNotExist:
+            self.product_sku = ''
+        image = product.get_main_image()
+        self.image_url = image.image.url if image else ''
     
     def get_total(self):
         """Calcula el total del item"""
@@ -133,22 +260,15 @@ class PaymentConfig(models.Model):
     def __str__(self):
         return f"Configuración de pago: {self.bank_name}"
     
-    class Meta:
-        verbose_name = _('configuración de pago')
-        verbose_name_plural = _('configuraciones de pago')
-
-class PaymentConfig(models.Model):
-    """Configuración para los datos de pago"""
-    bank_name = models.CharField(_('nombre del banco'), max_length=100)
-    account_name = models.CharField(_('nombre del beneficiario'), max_length=100)
-    account_number = models.CharField(_('número de cuenta'), max_length=20)
-    clabe = models.CharField(_('CLABE'), max_length=20)
-    payment_instructions = models.TextField(_('instrucciones adicionales'), blank=True)
-    is_active = models.BooleanField(_('activo'), default=True)
-    
-    def __str__(self):
-        return f"Configuración de pago: {self.bank_name}"
+    @classmethod
+    def get_active(cls):
+        """Configuración activa, cacheada hasta que se modifique alguna configuración"""
+        return cache_get_or_set(
+            'orders', 'payment_config',
+            default=lambda: cls.objects.filter(is_active=True).first(),
+            timeout=None
+        )
     
     class Meta:
         verbose_name = _('configuración de pago')
-        verbose_name_plural = _('configuraciones de pago')
\ No newline at end of file
+        verbose_name_plural = _('configuraciones de pago')
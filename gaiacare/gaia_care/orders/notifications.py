@@ -0,0 +1,66 @@
+from django.contrib.sites.models import Site
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from core.db import immediate_atomic
+from .models import OrderEvent, OrderItem, PaymentConfig
+
+# Eventos que se convierten en correo por lote
+BATCH_SIZE = 50
+
+SUBJECTS = {
+    'creado': 'Recibimos tu pedido #{order_id}',
+    'pagado': 'Confirmamos el pago de tu pedido #{order_id}',
+    'enviado': 'Tu pedido #{order_id} va en camino',
+    'entregado': 'Tu pedido #{order_id} fue entregado',
+    'cancelado': 'Tu pedido #{order_id} fue cancelado',
+}
+
+
+def _message(event, site):
+    """Correo del evento: asunto, texto y HTML se renderizan una sola vez aquí"""
+    order = event.order
+    template = 'order_created' if event.kind == 'creado' else 'order_status'
+    context = {
+        'order': order,
+        'event': event,
+        'status_display': dict(order.STATUS_CHOICES)[event.status],
+        'site_name': site.name,
+        'order_url': f'https://{site.domain}{reverse("orders:order_detail", args=[order.id])}',
+    }
+    if event.kind == 'creado':
+        context['bank_details'] = PaymentConfig.get_active()
+    message = EmailMultiAlternatives(
+        subject=SUBJECTS['creado' if event.kind == 'creado' else event.status].format(order_id=order.id),
+        body=render_to_string(f'orders/emails/{template}.txt', context),
+        to=[order.email],
+    )
+    message.attach_alternative(render_to_string(f'orders/emails/{template}.html', context), 'text/html')
+    return message
+
+
+def process_order_events(batch_size=BATCH_SIZE, using=DEFAULT_DB_ALIAS):
+    """
+    Convierte un lote de eventos pendientes en correos de la bandeja de salida
+    y los marca como procesados, todo en una transacción (un evento no se
+    notifica dos veces). Devuelve el número de eventos procesados.
+    """
+    site = Site.objects.db_manager(using).get_current()
+    with immediate_atomic(using=using):
+        events = list(
+            OrderEvent.objects.using(using)
+            .filter(processed_at__isnull=True)
+            .select_related('order', 'order__shipping')
+            .prefetch_related(Prefetch('order__items', queryset=OrderItem.objects.using(using)))
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+        # Siempre a la bandeja de salida, sin importar EMAIL_BACKEND
+        get_connection('core.mail.OutboxBackend').send_messages([_message(event, site) for event in events])
+        OrderEvent.objects.using(using).filter(id__in=[event.id for event in events]).update(processed_at=timezone.now())
+    return len(events)
@@ -1,3 +1,392 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from carts.models import Cart, CartItem
+from core.models import OutgoingEmail
+from core.testing import FileSQLiteTestCase
+from products.inventory import receive_batch
+from products.models import Category, InventoryBatch, Product, ProductImage, ProductInventory, StockMovement
+from users.models import CustomUser
+from .models import Order, OrderEvent, OrderItem, PaymentConfig, PaymentInfo, ShippingInfo
+from .notifications import process_order_events
+
+def create_order(user, **kwargs):
+    """Crea un pedido con su información de envío y pago"""
+    fields = {
+        'full_name': 'Ana Pérez', 'email': user.email, 'phone': '5555555555',
+        'address': 'Calle 1', 'city': 'CDMX', 'state': 'CDMX', 'postal_code': '01000',
+        'subtotal': 100, 'shipping_cost': 100, 'total': 200,
+    }
+    fields.update(kwargs)
+    order = Order.objects.create(user=user, **fields)
+    ShippingInfo.objects.create(order=order)
+    PaymentInfo.objects.create(order=order, amount=order.total)
+    return order
+
+
+class OrderCompleteViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='x')
+        self.other = CustomUser.objects.create_user(username='luis', email='luis@example.com', password='x')
+        self.order = create_order(self.user)
+        self.url = reverse('orders:order_complete', kwargs={'order_id': self.order.id})
+        self.client.force_login(self.user)
+
+    def _order_and_config_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        sqls = [q['sql'] for q in ctx.captured_queries]
+        return (
+            [sql for sql in sqls if 'FROM "orders_order"' in sql],
+            [sql for sql in sqls if 'orders_paymentconfig' in sql],
+        )
+
+    def test_order_is_fetched_once_and_config_is_cached(self):
+        PaymentConfig.objects.create(bank_name='Banco', account_name='Gaia', account_number='1', clabe='2')
+
+        order_queries, config_queries = self._order_and_config_queries()
+        self.assertEqual(len(order_queries), 1)
+        self.assertEqual(len(config_queries), 1)
+
+        order_queries, config_queries = self._order_and_config_queries()
+        self.assertEqual(len(order_queries), 1)
+        self.assertEqual(config_queries, [])
+
+    def test_saving_config_invalidates_cache(self):
+        config = PaymentConfig.objects.create(bank_name='Banco', account_name='Gaia', account_number='1', clabe='2')
+        self.assertEqual(self.client.get(self.url).context['bank_details']['bank_name'], 'Banco')
+
+        config.bank_name = 'Otro Banco'
+        with self.captureOnCommitCallbacks(execute=True):
+            config.save()
+
+        self.assertEqual(self.client.get(self.url).context['bank_details']['bank_name'], 'Otro Banco')
+
+    def test_default_bank_details_without_config(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['bank_details']['bank_name'], 'Tu Banco')
+
+    def test_other_users_are_redirected(self):
+        self.client.force_login(self.other)
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('orders:order_list'))
+
+
+class OrderListViewTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='x')
+        self.category = Category.objects.create(name='Cremas', slug='cremas')
+        self.client.force_login(self.user)
+
+    def _create_orders(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                category=self.category, name=f'Crema {i}', slug=f'crema-{self.category.products.count()}',
+                description='', price=10
+            )
+            ProductImage.objects.create(product=product, image=f'products/crema-{i}.png', is_main=True)
+            order = create_order(self.user)
+            OrderItem.objects.create(order=order, product=product, price=10, quantity=2)
+
+    def _list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('orders:order_list'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_orders(self):
+        self._create_orders(2)
+        few = self._list_queries()
+        self._create_orders(6)
+        many = self._list_queries()
+        self.assertEqual(few, many)
+
+    def test_history_is_paginated(self):
+        self._create_orders(12)
+        response = self.client.get(reverse('orders:order_list'))
+        self.assertTrue(response.context['is_paginated'])
+        self.assertEqual(len(response.context['orders']), 10)
+        self.assertContains(response, 'crema-11.png')
+
+
+class OrderDetailViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='x')
+        self.category = Category.objects.create(name='Cremas', slug='cremas')
+        self.order = create_order(self.user)
+        self.url = reverse('orders:order_detail', kwargs={'order_id': self.order.id})
+        self.client.force_login(self.user)
+
+    def _add_items(self, count):
+        start = OrderItem.objects.count()
+        for i in range(start, start + count):
+            product = Product.objects.create(
+                category=self.category, name=f'Crema {i}', slug=f'crema-{i}', description='', price=10
+            )
+            ProductImage.objects.create(product=product, image=f'products/crema-{i}.png')
+            OrderItem.objects.create(order=self.order, product=product, price=10, quantity=1)
+
+    def _order_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        tables = ('orders_', 'products_')
+        return [q['sql'] for q in ctx.captured_queries if any(t in q['sql'] for t in tables)]
+
+    def test_renders_in_constant_queries(self):
+        self._add_items(1)
+        few = self._order_queries()
+        self._add_items(5)
+        many = self._order_queries()
+        self.assertEqual(len(few), len(many))
+        self.assertLessEqual(len(many), 4)
+
+    def test_other_users_order_is_not_fetched(self):
+        other = CustomUser.objects.create_user(username='luis', email='luis@example.com', password='x')
+        self.client.force_login(other)
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('orders:order_list'))
+
+
+class OrderItemSnapshotTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='x')
+        category = Category.objects.create(name='Cremas', slug='cremas')
+        self.product = Product.objects.create(
+            category=category, name='Crema de rosas', slug='crema-de-rosas', description='', price=10
+        )
+        ProductInventory.objects.filter(product=self.product).update(sku='GC-001')
+        ProductImage.objects.create(product=self.product, image='products/rosas.png', is_main=True)
+        self.order = create_order(self.user)
+
+    def test_item_copies_product_data(self):
+        item = OrderItem.objects.create(order=self.order, product=self.product, price=10, quantity=1)
+        self.assertEqual(item.product_name, 'Crema de rosas')
+        self.assertEqual(item.product_sku, 'GC-001')
+        self.assertEqual(item.image_url, '/media/products/rosas.png')
+
+    def test_deleting_product_keeps_order_lines(self):
+        item = OrderItem.objects.create(order=self.order, product=self.product, price=10, quantity=1)
+        self.product.delete()
+        item.refresh_from_db()
+        self.assertIsNone(item.product)
+        self.assertEqual(item.product_name, 'Crema de rosas')
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('orders:order_detail', kwargs={'order_id': self.order.id}))
+        self.assertContains(response, 'Crema de rosas')
+
+
+class CheckoutStockTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='x')
+        category = Category.objects.create(name='Cremas', slug='cremas')
+        self.product = Product.objects.create(category=category, name='Crema', description='', price=10, stock=3)
+        self.cart = Cart.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def _checkout(self, quantity):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=quantity)
+        return self.client.post(reverse('orders:checkout'), {
+            'full_name': 'Ana Pérez', 'email': 'ana@example.com', 'phone': '5555555555',
+            'address': 'Calle 1', 'city': 'CDMX', 'state': 'CDMX', 'postal_code': '01000',
+            'payment_method': 'transferencia',
+        })
+
+    def test_checkout_records_sale_in_ledger(self):
+        response = self._checkout(2)
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse('orders:order_complete', kwargs={'order_id': order.id}))
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        movement = StockMovement.objects.get(kind='venta')
+        self.assertEqual((movement.quantity, movement.reference), (-2, f'Pedido #{order.id}'))
+
+    def test_checkout_takes_stock_from_earliest_batch_and_cancel_returns_it(self):
+        today = timezone.localdate()
+        later = receive_batch(self.product, 4, batch_number='B', expiry_date=today + timedelta(days=90))
+        sooner = receive_batch(self.product, 1, batch_number='A', expiry_date=today + timedelta(days=30))
+        self._checkout(3)
+        quantities = lambda: [b.quantity for b in InventoryBatch.objects.filter(id__in=[sooner.id, later.id])]
+        self.assertEqual(quantities(), [0, 2])
+
+        Order.objects.get().set_status('cancelado')
+        self.assertEqual(quantities(), [1, 4])
+
+    def test_insufficient_stock_rolls_back_the_order(self):
+        response = self._checkout(5)
+        self.assertRedirects(response, reverse('carts:cart'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+        self.assertEqual(self.cart.items.count(), 1)
+
+
+class OrderCancellationTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='x')
+        category = Category.objects.create(name='Cremas', slug='cremas')
+        self.cream = Product.objects.create(category=category, name='Crema', description='', price=10, stock=5)
+        self.soap = Product.objects.create(category=category, name='Jabón', description='', price=5, stock=5)
+        self.order = create_order(self.user)
+        OrderItem.objects.create(order=self.order, product=self.cream, price=10, quantity=2)
+        OrderItem.objects.create(order=self.order, product=self.soap, price=5, quantity=1)
+        OrderItem.objects.create(order=self.order, product=self.cream, price=10, quantity=1)
+
+    def _stock(self):
+        return list(Product.objects.order_by('id').values_list('stock', flat=True))
+
+    def test_cancelling_restores_all_lines_in_one_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.order.set_status('cancelado')
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self._stock(), [8, 6])
+        self.assertEqual(StockMovement.objects.filter(kind='cancelacion').count(), 2)
+
+    def test_cancelling_twice_restores_once(self):
+        self.order.set_status('cancelado')
+        Order.objects.get(id=self.order.id).set_status('cancelado')
+        self.assertEqual(self._stock(), [8, 6])
+
+    def test_reactivating_takes_stock_again(self):
+        self.order.set_status('cancelado')
+        self.order.set_status('pendiente')
+        self.assertEqual(self._stock(), [5, 5])
+        self.order.set_status('cancelado')
+        self.assertEqual(self._stock(), [8, 6])
+
+    def test_other_transitions_do_not_touch_stock(self):
+        self.order.set_status('pagado')
+        self.order.set_status('enviado')
+        self.assertEqual(self._stock(), [5, 5])
+        self.assertFalse(StockMovement.objects.exclude(kind='ajuste').exists())
+
+    def test_dashboard_cancellation_restores_stock(self):
+        admin = CustomUser.objects.create_user(username='admin', email='admin@example.com', password='x', is_staff=True)
+        self.client.force_login(admin)
+        self.client.post(reverse('dashboard:order_detail', args=[self.order.id]), {'status': 'cancelado'})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cancelado')
+        self.assertEqual(self._stock(), [8, 6])
+        self.assertEqual(StockMovement.objects.filter(kind='cancelacion').first().user, admin)
+
+
+
+@override_settings(OUTBOX_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OrderNotificationTest(TestCase):
+    """Avisos al cliente: se encolan al confirmar y el worker los envía por lotes"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='x')
+        category = Category.objects.create(name='Cremas', slug='cremas')
+        self.product = Product.objects.create(category=category, name='Crema', description='', price=10, stock=3)
+        self.cart = Cart.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def _checkout_on_commit(self, quantity):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=quantity)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('orders:checkout'), {
+                'full_name': 'Ana Pérez', 'email': 'ana@example.com', 'phone': '5555555555',
+                'address': 'Calle 1', 'city': 'CDMX', 'state': 'CDMX', 'postal_code': '01000',
+                'payment_method': 'transferencia',
+            })
+
+    def test_checkout_only_enqueues_an_event(self):
+        self._checkout_on_commit(2)
+        order = Order.objects.get()
+        event = OrderEvent.objects.get()
+        self.assertEqual((event.order, event.kind, event.processed_at), (order, 'creado', None))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    def test_rolled_back_checkout_enqueues_nothing(self):
+        self._checkout_on_commit(5)
+        self.assertFalse(OrderEvent.objects.exists())
+
+    def test_worker_sends_confirmation_and_status_changes(self):
+        self._checkout_on_commit(2)
+        order = Order.objects.get()
+        for status in ('pagado', 'cancelado', 'pendiente'):
+            with self.captureOnCommitCallbacks(execute=True):
+                order.set_status(status)
+        # Reactivar un pedido cancelado no se notifica
+        self.assertEqual(OrderEvent.objects.count(), 3)
+
+        out = StringIO()
+        call_command('send_order_notifications', stdout=out)
+
+        self.assertIn('3 eventos procesados, 3 correos enviados', out.getvalue())
+        self.assertEqual([message.subject for message in mail.outbox], [
+            f'Recibimos tu pedido #{order.id}',
+            f'Confirmamos el pago de tu pedido #{order.id}',
+            f'Tu pedido #{order.id} fue cancelado',
+        ])
+        self.assertEqual(mail.outbox[0].to, ['ana@example.com'])
+        self.assertIn('2 x Crema', mail.outbox[0].body)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(OrderEvent.objects.filter(processed_at__isnull=True).exists())
+
+        # Los eventos ya procesados no se vuelven a enviar
+        self.assertEqual(process_order_events(), 0)
+
+    def test_batch_renders_in_constant_queries(self):
+        def batch_queries(count):
+            for _ in range(count):
+                order = create_order(self.user)
+                OrderItem.objects.create(order=order, product=self.product, price=10, quantity=1)
+                OrderEvent.objects.create(order=order, kind='creado', status='pendiente')
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(process_order_events(), count)
+            return len(ctx.captured_queries)
+
+        # El primer lote lee el sitio y la configuración de pago, que quedan en caché
+        batch_queries(1)
+        self.assertEqual(batch_queries(2), batch_queries(6))
+
+
+class ConcurrentCancellationTest(FileSQLiteTestCase):
+    """Varias peticiones cancelando el mismo pedido a la vez"""
+    ALIAS = 'cancel_stress'
+    THREADS = 6
+
+    def test_parallel_cancellations_restore_stock_once(self):
+        db = self.ALIAS
+        # bulk_create evita las señales de usuario, que escriben en la base por defecto
+        user, = CustomUser.objects.using(db).bulk_create([CustomUser(username='ana', email='ana@example.com')])
+        category = Category.objects.using(db).create(name='Cremas')
+        product = Product.objects.using(db).create(category_id=category.id, name='Crema', description='', price=10, stock=5)
+        order = Order.objects.using(db).create(
+            user_id=user.id, full_name='Ana', email='ana@example.com', phone='1', address='Calle 1',
+            city='CDMX', state='CDMX', postal_code='01000', subtotal=30, total=30,
+        )
+        OrderItem.objects.using(db).create(
+            order_id=order.id, product_id=product.id, product_name='Crema', price=10, quantity=3
+        )
+
+        def cancel():
+            Order.objects.using(db).get(id=order.id).set_status('cancelado')
+
+        self.assertEqual(self.run_in_threads(cancel, self.THREADS), [])
+        self.assertEqual(Product.objects.using(db).get(id=product.id).stock, 8)
+        self.assertEqual(StockMovement.objects.using(db).filter(kind='cancelacion').count(), 1)
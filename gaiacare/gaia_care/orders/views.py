@@ -3,16 +3,25 @@ from django.views.generic import ListView, DetailView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.utils import timezone
-from django.db import transaction
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from django.urls import reverse
 
-from .models import Order, OrderItem, ShippingInfo, PaymentInfo, PaymentConfig
+from .models import Order, OrderEvent, OrderItem, ShippingInfo, PaymentInfo, PaymentConfig
 from .forms import CheckoutForm, PaymentReferenceForm
 from carts.views import get_or_create_cart
+from core.db import immediate_atomic
+from products.inventory import InsufficientStock, apply_movements
 from products.models import Product
 import decimal
 
+# Datos bancarios por defecto si no hay configuración de pago activa
+DEFAULT_BANK_DETAILS = {
+    'bank_name': 'Tu Banco',
+    'account_name': 'Tu Nombre o Empresa',
+    'account_number': '0123456789',
+    'clabe': '012345678901234567',
+}
+
 class CheckoutView(LoginRequiredMixin, View):
     """Vista para el proceso de checkout"""
     template_name = 'orders/checkout.html'
@@ -63,42 +72,55 @@ class CheckoutView(LoginRequiredMixin, View):
             subtotal = cart.get_subtotal()
             total = subtotal + shipping_cost
             
-            with transaction.atomic():
-                # Crear orden
-                order = form.save(commit=False)
-                order.user = request.user
-                order.subtotal = subtotal
-                order.shipping_cost = shipping_cost
-                order.total = total
-                order.save()
-                
-                # Crear items de la orden
-                for cart_item in cart.items.all():
-                    OrderItem.objects.create(
+            try:
+                with immediate_atomic():
+                    # Crear orden
+                    order = form.save(commit=False)
+                    order.user = request.user
+                    order.subtotal = subtotal
+                    order.shipping_cost = shipping_cost
+                    order.total = total
+                    order.save()
+                    
+                    # Crear items de la orden (con copia de nombre, SKU e imagen del producto)
+                    cart_items = list(cart.items.select_related(
+                        'product', 'product__inventory_detail'
+                    ).prefetch_related('product__images'))
+                    for cart_item in cart_items:
+                        OrderItem.objects.create(
+                            order=order,
+                            product=cart_item.product,
+                            price=cart_item.product.price,
+                            quantity=cart_item.quantity
+                        )
+                    
+                    # Descontar inventario en un solo UPDATE y registrar la venta en el kardex
+                    apply_movements(
+                        [(cart_item.product, -cart_item.quantity) for cart_item in cart_items],
+                        'venta',
+                        reference=f'Pedido #{order.id}',
+                        user=request.user,
+                    )
+                    
+                    # Crear info de envío y pago
+                    ShippingInfo.objects.create(order=order)
+                    PaymentInfo.objects.create(
                         order=order,
-                        product=cart_item.product,
-                        price=cart_item.product.price,
-                        quantity=cart_item.quantity
+                        amount=total,
+                        status='pendiente'
                     )
                     
-                    # Actualizar inventario
-                    product = cart_item.product
-                    product.stock -= cart_item.quantity
-                    product.save()
-                
-                # Crear info de envío y pago
-                ShippingInfo.objects.create(order=order)
-                PaymentInfo.objects.create(
-                    order=order,
-                    amount=total,
-                    status='pendiente'
-                )
-                
-                # Vaciar carrito
-                cart.clear()
-                
-                messages.success(request, f'¡Pedido #{order.id} creado correctamente!')
-                return redirect('orders:order_complete', order_id=order.id)
+                    # Vaciar carrito
+                    cart.clear()
+                    
+                    # La confirmación por correo la envía el worker de notificaciones
+                    OrderEvent.enqueue(order.id, 'creado', order.status)
+            except InsufficientStock as e:
+                messages.error(request, f'{e}. Ajusta las cantidades de tu carrito.')
+                return redirect('carts:cart')
+            
+            messages.success(request, f'¡Pedido #{order.id} creado correctamente!')
+            return redirect('orders:order_complete', order_id=order.id)
         
         # Si el formulario no es válido
         context = {
@@ -110,53 +132,46 @@ class CheckoutView(LoginRequiredMixin, View):
         }
         return render(request, self.template_name, context)
 
-class OrderCompleteView(LoginRequiredMixin, DetailView):
-    """Vista para mostrar confirmación de pedido"""
+class UserOrderMixin:
+    """Obtiene un pedido del usuario con sus datos relacionados en una sola pasada"""
     model = Order
-    template_name = 'orders/order_complete.html'
     context_object_name = 'order'
     pk_url_kwarg = 'order_id'
     
+    def get_queryset(self):
+        # La propiedad del pedido se verifica en la propia consulta
+        return Order.objects.for_user(self.request.user).with_details()
+    
     def get(self, request, *args, **kwargs):
-        # Verificar que el pedido pertenezca al usuario
-        order = self.get_object()
-        if order.user != request.user:
+        try:
+            self.object = self.get_object()
+        except Http404:
             messages.error(request, 'No tienes permiso para ver este pedido.')
             return redirect('orders:order_list')
         
-        return super().get(request, *args, **kwargs)
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
+
+class OrderCompleteView(LoginRequiredMixin, UserOrderMixin, DetailView):
+    """Vista para mostrar confirmación de pedido"""
+    template_name = 'orders/order_complete.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['payment_form'] = PaymentReferenceForm()
         
-        # Obtener la configuración de pago activa de la base de datos
-        try:
-            payment_config = PaymentConfig.objects.filter(is_active=True).first()
-            if payment_config:
-                context['bank_details'] = {
-                    'bank_name': payment_config.bank_name,
-                    'account_name': payment_config.account_name,
-                    'account_number': payment_config.account_number,
-                    'clabe': payment_config.clabe,
-                }
-                context['payment_instructions'] = payment_config.payment_instructions
-            else:
-                # Usar valores por defecto si no hay configuración
-                context['bank_details'] = {
-                    'bank_name': 'Tu Banco',
-                    'account_name': 'Tu Nombre o Empresa',
-                    'account_number': '0123456789',
-                    'clabe': '012345678901234567',
-                }
-        except:
-            # En caso de error, usar valores por defecto
+        # Configuración de pago activa (cacheada); valores por defecto si no hay
+        payment_config = PaymentConfig.get_active()
+        if payment_config:
             context['bank_details'] = {
-                'bank_name': 'Tu Banco',
-                'account_name': 'Tu Nombre o Empresa',
-                'account_number': '0123456789',
-                'clabe': '012345678901234567',
+                'bank_name': payment_config.bank_name,
+                'account_name': payment_config.account_name,
+                'account_number': payment_config.account_number,
+                'clabe': payment_config.clabe,
             }
+            context['payment_instructions'] = payment_config.payment_instructions
+        else:
+            context['bank_details'] = DEFAULT_BANK_DETAILS
         
         return context
     
@@ -165,9 +180,10 @@ class OrderListView(LoginRequiredMixin, ListView):
     model = Order
     template_name = 'orders/order_list.html'
     context_object_name = 'orders'
+    paginate_by = 10
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        return Order.objects.for_user(self.request.user).with_details().order_by('-created_at')
 
 class PaymentReferenceView(LoginRequiredMixin, View):
     """Vista para añadir referencia de pago"""
@@ -192,18 +208,6 @@ class PaymentReferenceView(LoginRequiredMixin, View):
         messages.error(request, 'Por favor verifica la información.')
         return redirect('orders:order_complete', order_id=order.id)
 
-class OrderDetailView(LoginRequiredMixin, DetailView):
+class OrderDetailView(LoginRequiredMixin, UserOrderMixin, DetailView):
     """Vista para mostrar detalles de un pedido"""
-    model = Order
-    template_name = 'orders/order_detail.html'
-    context_object_name = 'order'
-    pk_url_kwarg = 'order_id'
-    
-    def get(self, request, *args, **kwargs):
-        # Verificar que el pedido pertenezca al usuario
-        order = self.get_object()
-        if order.user != request.user:
-            messages.error(request, 'No tienes permiso para ver este pedido.')
-            return redirect('orders:order_list')
-        
-        return super().get(request, *args, **kwargs)
\ No newline at end of file
+    template_name = 'orders/order_detail.html'
\ No newline at end of file
@@ -1,19 +1,23 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from django.utils.translation import gettext_lazy as _
 from django.utils.html import format_html
+from .inventory import InsufficientStock, adjust_stock
 from .models import (
     Category, 
     Product, 
     ProductImage, 
     ProductInventory,
+    InventoryBatch,
     ProductAttribute,
-    ProductAttributeValue
+    ProductAttributeValue,
+    StockMovement
 )
 
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 1
-    fields = ('image', 'is_main', 'alt_text', 'image_preview')
+    fields = ('image', 'is_main', 'alt_text', 'position', 'image_preview')
     readonly_fields = ('image_preview',)
     
     def image_preview(self, obj):
@@ -55,8 +59,26 @@ class CategoryAdmin(admin.ModelAdmin):
     )
     readonly_fields = ('image_preview',)
 
+class ProductAdminForm(forms.ModelForm):
+    """El inventario de un producto existente se mueve con un ajuste, no sobrescribiendo el saldo"""
+    stock_adjustment = forms.IntegerField(
+        label=_('Ajuste de inventario'), required=False,
+        help_text=_('Unidades a sumar al inventario (negativas para restar); se registra en el kardex'),
+    )
+
+    class Meta:
+        model = Product
+        fields = '__all__'
+
+    def clean_stock_adjustment(self):
+        adjustment = self.cleaned_data.get('stock_adjustment')
+        if adjustment and self.instance.pk and self.instance.stock + adjustment < 0:
+            raise forms.ValidationError(_('El inventario no puede quedar en negativo'))
+        return adjustment
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
+    form = ProductAdminForm
     list_display = ('name', 'category', 'price', 'stock', 'available', 'featured', 'created_at', 'updated_at')
     list_filter = ('available', 'featured', 'category')
     search_fields = ('name', 'description')
@@ -68,19 +90,68 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('category', 'name', 'slug', 'description')
         }),
         (_('Precios e inventario'), {
-            'fields': ('price', 'stock', 'available')
+            'fields': ('price', 'stock', 'stock_adjustment', 'available')
         }),
         (_('Opciones adicionales'), {
             'fields': ('featured',)
         }),
     )
     
+    def get_readonly_fields(self, request, obj=None):
+        # Al editar, guardar el saldo leído al abrir el formulario pisaría las ventas hechas mientras tanto
+        return ('stock',) if obj else ()
+    
+    def get_fieldsets(self, request, obj=None):
+        if obj:
+            return self.fieldsets
+        # Al crear, el inventario inicial se captura directamente
+        return tuple(
+            (name, {**options, 'fields': tuple(f for f in options['fields'] if f != 'stock_adjustment')})
+            for name, options in self.fieldsets
+        )
+    
     def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
+        if change:
+            # Se guardan todos los campos menos el saldo, que solo cambia con movimientos
+            obj.save(update_fields=[
+                field.name for field in obj._meta.concrete_fields if not field.primary_key and field.name != 'stock'
+            ])
+        else:
+            super().save_model(request, obj, form, change)
         # Crear inventario si no existe
-        ProductInventory.objects.get_or_create(product=obj, defaults={'sku': f'SKU-{obj.id}'})
+        ProductInventory.for_product(obj)
+        
+        adjustment = form.cleaned_data.get('stock_adjustment')
+        if change and adjustment:
+            try:
+                adjust_stock(obj, adjustment, user=request.user, note='Ajuste desde el admin')
+            except InsufficientStock as e:
+                self.message_user(request, str(e), messages.ERROR)
 
 @admin.register(ProductAttribute)
 class ProductAttributeAdmin(admin.ModelAdmin):
-    list_display = ('name',)
-    search_fields = ('name',)
\ No newline at end of file
+    list_display = ('name', 'default_values')
+    search_fields = ('name',)
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Kardex de solo lectura; los cambios de inventario se registran como nuevos movimientos"""
+    list_display = ('inventory', 'kind', 'quantity', 'reference', 'user', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('inventory__sku', 'inventory__product__name', 'reference')
+    list_select_related = ('inventory', 'user')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(InventoryBatch)
+class InventoryBatchAdmin(admin.ModelAdmin):
+    """Lotes por SKU; la cantidad disponible la mueven las ventas y cancelaciones"""
+    list_display = ('inventory', 'batch_number', 'production_date', 'expiry_date', 'quantity')
+    list_filter = ('expiry_date',)
+    search_fields = ('inventory__sku', 'inventory__product__name', 'batch_number')
+    list_select_related = ('inventory',)
+    readonly_fields = ('quantity',)
@@ -2,9 +2,13 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 import json
 
-from .models import ProductImage, Product, ProductAttribute, ProductAttributeValue
+from core.cache import invalidate_namespace
+
+from .attributes import get_attribute_catalog
+from .models import ProductImage, Product
 
 @staff_member_required
 @require_POST
@@ -30,10 +34,16 @@ def make_main_image(request, image_id):
 def reorder_images(request):
     """Vista para reordenar imágenes de producto"""
     try:
-        image_ids = json.loads(request.POST.get('image_ids', '[]'))
+        image_ids = [int(image_id) for image_id in json.loads(request.POST.get('image_ids', '[]'))]
+        
+        # Todas las imágenes deben ser del mismo producto
+        product_ids = set(ProductImage.objects.filter(id__in=image_ids).values_list('product_id', flat=True))
+        if len(product_ids) != 1:
+            return JsonResponse({'success': False, 'error': 'Las imágenes deben pertenecer a un mismo producto'})
         
-        for order, image_id in enumerate(image_ids):
-            ProductImage.objects.filter(id=image_id).update(order=order)
+        with transaction.atomic():
+            ProductImage.reorder(product_ids.pop(), image_ids)
+            transaction.on_commit(lambda: invalidate_namespace('products'))
         
         return JsonResponse({'success': True})
     except Exception as e:
@@ -43,39 +53,6 @@ def reorder_images(request):
 def get_attributes_for_category(request, category_id):
     """Vista para obtener atributos basados en una categoría"""
     try:
-        # Obtener todos los atributos disponibles
-        attributes = ProductAttribute.objects.all()
-        
-        # Formato para respuesta JSON
-        attributes_data = []
-        for attr in attributes:
-            # Obtener valores utilizados para este atributo
-            values_used = ProductAttributeValue.objects.filter(
-                attribute=attr,
-                product__category_id=category_id
-            ).values_list('value', flat=True).distinct()
-            
-            # Si no hay valores usados, proporcionar algunos predeterminados según el atributo
-            if not values_used:
-                if attr.name == 'Aroma':
-                    default_values = ['Floral', 'Cítrico', 'Dulce', 'Herbal', 'Amaderado']
-                elif attr.name == 'Tamaño':
-                    default_values = ['30g', '50g', '100g']
-                elif attr.name == 'Duración':
-                    default_values = ['2-3 horas', '4-6 horas', '8+ horas']
-                elif attr.name == 'Intensidad':
-                    default_values = ['Suave', 'Media', 'Fuerte']
-                else:
-                    default_values = []
-                
-                values_used = default_values
-            
-            attributes_data.append({
-                'id': attr.id,
-                'name': attr.name,
-                'values': list(values_used)
-            })
-        
-        return JsonResponse({'success': True, 'attributes': attributes_data})
+        return JsonResponse({'success': True, 'attributes': get_attribute_catalog(category_id)})
     except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})
\ No newline at end of file
+        return JsonResponse({'success': False, 'error': str(e)})
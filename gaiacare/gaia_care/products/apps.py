@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from core.cache import invalidate_on_change
+        from .models import (
+            Category, Product, ProductImage, ProductInventory,
+            ProductAttribute, ProductAttributeValue,
+        )
+        invalidate_on_change(
+            'products', Category, Product, ProductImage, ProductInventory,
+            ProductAttribute, ProductAttributeValue,
+        )
+        invalidate_on_change('dashboard', Category, Product)
+        invalidate_on_change('attributes', Product, ProductAttribute, ProductAttributeValue)
+
+        from .facets import track_facet_changes
+        from .reorder import track_reorder_changes
+        track_facet_changes()
+        track_reorder_changes()
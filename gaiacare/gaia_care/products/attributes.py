@@ -0,0 +1,39 @@
+from django.db.models import CharField, Value
+
+from core.cache import cache_get_or_set
+from .models import ProductAttribute, ProductAttributeValue
+
+# El catálogo se invalida con cada cambio de atributos, valores o productos
+CATALOG_TIMEOUT = 60 * 60 * 24
+
+
+def _build_catalog(category_id):
+    """Atributos con los valores usados en la categoría, en una sola consulta (UNION)"""
+    attributes = ProductAttribute.objects.values_list('id', 'name', 'default_values', Value(None, output_field=CharField()))
+    used = (
+        ProductAttributeValue.objects
+        .filter(product__category_id=category_id)
+        .values_list('attribute_id', 'attribute__name', 'attribute__default_values', 'value')
+    )
+    # UNION descarta los repetidos: una fila por atributo más una por valor distinto usado
+    rows = sorted(attributes.union(used), key=lambda row: (row[0], row[3] is not None, row[3] or ''))
+
+    catalog = {}
+    for attribute_id, name, default_values, value in rows:
+        entry = catalog.setdefault(attribute_id, {'id': attribute_id, 'name': name, 'values': [], 'defaults': default_values})
+        if value is not None:
+            entry['values'].append(value)
+
+    # Sin valores usados en la categoría se ofrecen los sugeridos del atributo
+    return [
+        {'id': entry['id'], 'name': entry['name'], 'values': entry['values'] or list(entry['defaults'] or [])}
+        for entry in catalog.values()
+    ]
+
+
+def get_attribute_catalog(category_id):
+    """Catálogo de atributos y valores de una categoría (en caché por categoría)"""
+    return cache_get_or_set(
+        'attributes', 'category', category_id,
+        default=lambda: _build_catalog(category_id), timeout=CATALOG_TIMEOUT,
+    )
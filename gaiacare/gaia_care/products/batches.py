@@ -0,0 +1,111 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When, Window
+from django.db.models.expressions import RowRange
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BatchAllocation, InventoryBatch
+
+# Días de anticipación con los que un lote se considera por caducar
+EXPIRY_WARNING_DAYS = 60
+
+# Primero caduca, primero sale; los lotes sin fecha de caducidad van al final
+FEFO_ORDER = [F('expiry_date').asc(nulls_last=True), F('id').asc()]
+
+
+def _by_id(values):
+    """CASE id WHEN ... para restar o sumar una cantidad distinta por lote en un solo UPDATE"""
+    return Case(
+        *[When(id=batch_id, then=Value(quantity)) for batch_id, quantity in values.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def expired_units():
+    """
+    Expresión con las unidades en lotes caducados del producto de la fila
+    (OuterRef('id')). Siguen en Product.stock pero no se pueden vender.
+    """
+    expired = (
+        InventoryBatch.objects
+        .filter(inventory__product_id=OuterRef('id'), quantity__gt=0, expiry_date__lt=timezone.localdate())
+        .values('inventory__product_id')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Coalesce(Subquery(expired, output_field=IntegerField()), 0)
+
+
+def allocate_fefo(demand, reference='', using=DEFAULT_DB_ALIAS, include_expired=False):
+    """
+    Descuenta de los lotes las unidades de `demand` ({id de producto: cantidad})
+    en orden FEFO. Una consulta con total acumulado por SKU trae solo los lotes
+    necesarios y un UPDATE los descuenta, sin importar cuántos lotes haya. Los
+    lotes caducados no se surten salvo con `include_expired` (bajas y
+    ajustes, que los vacían primero); lo que no cubran los lotes sale del
+    inventario sin lote. Con `reference` se registran las asignaciones para
+    poder devolverlas con release_batches.
+    """
+    demand = {product_id: quantity for product_id, quantity in demand.items() if quantity > 0}
+    if not demand:
+        return {}
+
+    batches = InventoryBatch.objects.using(using).filter(inventory__product_id__in=demand, quantity__gt=0)
+    if not include_expired:
+        batches = batches.filter(Q(expiry_date__isnull=True) | Q(expiry_date__gte=timezone.localdate()))
+    batches = (
+        batches
+        .annotate(
+            consumed_before=Coalesce(
+                Window(Sum('quantity'), partition_by=F('inventory_id'), order_by=FEFO_ORDER, frame=RowRange(end=-1)),
+                0,
+            ),
+            needed=Case(
+                *[When(inventory__product_id=product_id, then=Value(quantity)) for product_id, quantity in demand.items()],
+                output_field=IntegerField(),
+            ),
+        )
+        .filter(consumed_before__lt=F('needed'))
+        .values_list('id', 'quantity', 'consumed_before', 'needed')
+    )
+    taken = {
+        batch_id: min(quantity, needed - consumed_before)
+        for batch_id, quantity, consumed_before, needed in batches
+    }
+    if not taken:
+        return {}
+
+    InventoryBatch.objects.using(using).filter(id__in=taken).update(quantity=F('quantity') - _by_id(taken))
+    if reference:
+        BatchAllocation.objects.using(using).bulk_create([
+            BatchAllocation(batch_id=batch_id, reference=reference, quantity=quantity)
+            for batch_id, quantity in taken.items()
+        ])
+    return taken
+
+
+def release_batches(reference, using=DEFAULT_DB_ALIAS):
+    """Devuelve a sus lotes las unidades asignadas con `reference` (ej. al cancelar un pedido)"""
+    allocations = BatchAllocation.objects.using(using).filter(reference=reference)
+    returned = defaultdict(int)
+    for batch_id, quantity in allocations.values_list('batch_id', 'quantity'):
+        returned[batch_id] += quantity
+    if returned:
+        InventoryBatch.objects.using(using).filter(id__in=returned).update(quantity=F('quantity') + _by_id(returned))
+        allocations.delete()
+    return dict(returned)
+
+
+def expiring_batches(days=EXPIRY_WARNING_DAYS):
+    """Lotes con existencias que caducan en los próximos `days` días (o ya caducaron)"""
+    limit = timezone.localdate() + timedelta(days=days)
+    return (
+        InventoryBatch.objects
+        .filter(quantity__gt=0, expiry_date__lte=limit)
+        .select_related('inventory__product')
+        .order_by('expiry_date', 'id')
+    )
@@ -0,0 +1,172 @@
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.utils.functional import cached_property
+
+from .models import Category, Product, ProductAttribute, ProductAttributeValue, ProductFacet
+
+# Rangos de precio: (clave, mínimo incluido, máximo excluido)
+PRICE_BUCKETS = (
+    ('0-100', 0, 100),
+    ('100-250', 100, 250),
+    ('250-500', 250, 500),
+    ('500+', 500, None),
+)
+PRICE_LABELS = {
+    '0-100': 'Hasta $100',
+    '100-250': '$100 a $250',
+    '250-500': '$250 a $500',
+    '500+': 'Más de $500',
+}
+# Productos por lote al reconstruir el índice
+FACET_BATCH_SIZE = 500
+# Prefijo de las facetas de atributos ('attr_<id de atributo>')
+ATTRIBUTE_PREFIX = 'attr_'
+
+
+def price_bucket(price):
+    for key, low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return key
+    return PRICE_BUCKETS[0][0]
+
+
+def _facet_rows(product, attribute_values):
+    """Renglones del índice para un producto; attribute_values son pares (id de atributo, valor)"""
+    rows = [
+        ('category', str(product.category_id)),
+        ('price', price_bucket(product.price)),
+    ]
+    if product.stock > 0:
+        rows.append(('stock', '1'))
+    rows.extend((f'{ATTRIBUTE_PREFIX}{attribute_id}', value[:100]) for attribute_id, value in attribute_values)
+    return [ProductFacet(product_id=product.id, facet=facet, value=value) for facet, value in rows]
+
+
+def refresh_facets(product_ids, using=DEFAULT_DB_ALIAS):
+    """Reescribe los renglones del índice de los productos indicados (las borradas caen en cascada)"""
+    product_ids = list(product_ids)
+    attribute_values = defaultdict(list)
+    for product_id, attribute_id, value in ProductAttributeValue.objects.using(using).filter(
+        product_id__in=product_ids
+    ).values_list('product_id', 'attribute_id', 'value'):
+        attribute_values[product_id].append((attribute_id, value))
+
+    products = Product.objects.using(using).filter(id__in=product_ids).only('id', 'category_id', 'price', 'stock')
+    with transaction.atomic(using=using):
+        ProductFacet.objects.using(using).filter(product_id__in=product_ids).delete()
+        ProductFacet.objects.using(using).bulk_create(
+            [row for product in products for row in _facet_rows(product, attribute_values[product.id])],
+            batch_size=FACET_BATCH_SIZE,
+        )
+
+
+def refresh_on_commit(product_ids, using=None):
+    """Programa refresh_facets para cuando se confirme la transacción actual"""
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: refresh_facets(product_ids, using=using or DEFAULT_DB_ALIAS), using=using)
+
+
+def rebuild_facet_index(batch_size=FACET_BATCH_SIZE):
+    """Reconstruye el índice completo por lotes; devuelve el número de productos indexados"""
+    ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(ids), batch_size):
+        refresh_facets(ids[start:start + batch_size])
+    return len(ids)
+
+
+def _product_changed(sender, instance, using=None, **kwargs):
+    refresh_on_commit([instance.id], using=using)
+
+
+def _attribute_value_changed(sender, instance, using=None, **kwargs):
+    refresh_on_commit([instance.product_id], using=using)
+
+
+def track_facet_changes():
+    """Conecta las señales que mantienen el índice al día"""
+    post_save.connect(_product_changed, sender=Product, dispatch_uid='facets:product:save')
+    for name, signal in (('save', post_save), ('delete', post_delete)):
+        signal.connect(_attribute_value_changed, sender=ProductAttributeValue, dispatch_uid=f'facets:value:{name}')
+
+
+def selected_facets(params):
+    """{faceta: valores} a partir de la query string (category, price, stock y attr_<id>)"""
+    selected = {}
+    for key in params:
+        if key in ('category', 'price', 'stock') or (key.startswith(ATTRIBUTE_PREFIX) and key[len(ATTRIBUTE_PREFIX):].isdigit()):
+            values = {value for value in params.getlist(key) if value}
+            if values:
+                selected[key] = values
+    return selected
+
+
+class FacetedSearch:
+    """
+    Filtra un queryset de productos con el índice de facetas y cuenta los
+    valores de cada faceta. Los valores de una misma faceta se combinan con
+    OR y las facetas entre sí con AND. Los conteos de una faceta elegida se
+    calculan sin su propio filtro (para poder ampliar la selección), así que
+    se hace una consulta agrupada por faceta elegida más una para el resto.
+    """
+
+    def __init__(self, queryset, params):
+        self.queryset = queryset
+        self.selected = selected_facets(params)
+
+    def _filter(self, queryset, exclude=None):
+        for facet, values in self.selected.items():
+            if facet != exclude:
+                matching = ProductFacet.objects.filter(facet=facet, value__in=values).values('product_id')
+                queryset = queryset.filter(id__in=matching)
+        return queryset
+
+    @cached_property
+    def results(self):
+        return self._filter(self.queryset)
+
+    @cached_property
+    def counts(self):
+        """{faceta: {valor: número de productos}}"""
+        counts = defaultdict(dict)
+        groups = [(None, self.results)] + [(facet, self._filter(self.queryset, exclude=facet)) for facet in self.selected]
+        for facet, queryset in groups:
+            rows = ProductFacet.objects.filter(product_id__in=queryset.values('id'))
+            rows = rows.filter(facet=facet) if facet else rows.exclude(facet__in=self.selected)
+            for row_facet, value, total in rows.values_list('facet', 'value').annotate(total=Count('product_id')).order_by():
+                counts[row_facet][value] = total
+        return counts
+
+    def _options(self, facet, labels):
+        counts = self.counts.get(facet, {})
+        selected = self.selected.get(facet, set())
+        return [
+            {'value': value, 'label': label, 'count': counts.get(value, 0), 'selected': value in selected}
+            for value, label in labels
+            if counts.get(value) or value in selected
+        ]
+
+    def groups(self, categories=None):
+        """Facetas listas para la plantilla: [{'param', 'label', 'options'}], omitiendo las vacías"""
+        if categories is None:
+            categories = Category.objects.filter(is_active=True)
+        attribute_ids = [int(facet[len(ATTRIBUTE_PREFIX):]) for facet in self.counts if facet.startswith(ATTRIBUTE_PREFIX)]
+        attribute_ids += [int(facet[len(ATTRIBUTE_PREFIX):]) for facet in self.selected if facet.startswith(ATTRIBUTE_PREFIX)]
+
+        groups = [
+            ('category', 'Categoría', [(str(category.id), category.name) for category in categories]),
+            ('price', 'Precio', [(key, PRICE_LABELS[key]) for key, _, _ in PRICE_BUCKETS]),
+            ('stock', 'Disponibilidad', [('1', 'En existencia')]),
+        ]
+        for attribute in ProductAttribute.objects.filter(id__in=set(attribute_ids)).order_by('name'):
+            facet = f'{ATTRIBUTE_PREFIX}{attribute.id}'
+            values = set(self.counts.get(facet, {})) | self.selected.get(facet, set())
+            groups.append((facet, attribute.name, [(value, value) for value in sorted(values)]))
+
+        return [
+            {'param': facet, 'label': label, 'options': options}
+            for facet, label, labels in groups
+            if (options := self._options(facet, labels))
+        ]
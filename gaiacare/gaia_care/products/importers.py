@@ -0,0 +1,340 @@
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from core.cache import invalidate_namespace
+from .batches import allocate_fefo
+from .facets import refresh_facets
+from .models import (
+    Category, InventoryBatch, Product, ProductInventory, ProductAttribute, ProductAttributeValue, StockMovement,
+)
+from .slugs import SlugAllocator
+from . import reorder
+
+IMPORT_BATCH_SIZE = 1000
+ATTRIBUTE_PREFIX = 'attr:'
+TRUE_VALUES = {'1', 'true', 'si', 'sí', 'yes', 'y', 'x'}
+CENTS = Decimal('0.01')
+# Límites de los campos del modelo: una fila que no cabe es un error de la fila, no del lote
+NAME_MAX_LENGTH = Product._meta.get_field('name').max_length
+SKU_MAX_LENGTH = ProductInventory._meta.get_field('sku').max_length
+_price_field = Product._meta.get_field('price')
+MAX_PRICE = Decimal(10) ** (_price_field.max_digits - _price_field.decimal_places)
+DEFAULT_REORDER_LEVEL = ProductInventory._meta.get_field('reorder_level').default
+
+
+class MalformedLine:
+    """Línea JSONL que no se pudo leer; se reporta como error de su fila"""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def read_rows(file, file_format):
+    """Lee filas de un archivo CSV, JSON (lista de objetos) o JSONL"""
+    if isinstance(file, (bytes, bytearray)):
+        file = io.StringIO(file.decode('utf-8-sig'))
+
+    if file_format == 'csv':
+        for row in csv.DictReader(file):
+            attributes = {
+                key[len(ATTRIBUTE_PREFIX):].strip(): value
+                for key, value in row.items()
+                if key and key.startswith(ATTRIBUTE_PREFIX) and value
+            }
+            row = {key: value for key, value in row.items() if key and not key.startswith(ATTRIBUTE_PREFIX)}
+            row['attributes'] = attributes
+            yield row
+    elif file_format == 'json':
+        rows = json.load(file)
+        if not isinstance(rows, list):
+            raise ValueError('El archivo JSON debe contener una lista de objetos')
+        yield from rows
+    elif file_format == 'jsonl':
+        # Una línea rota no detiene el archivo: los lotes anteriores ya se guardaron
+        for line in file:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield MalformedLine(f'JSON inválido: {e.msg} (columna {e.colno})')
+    else:
+        raise ValueError(f'Formato no soportado: {file_format}')
+
+
+def _parse_bool(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+@dataclass
+class ImportResult:
+    """Resumen de una importación"""
+    created: int = 0
+    updated: int = 0
+    errors: list = field(default_factory=list)  # [(número de fila, mensaje)]
+
+
+class ProductImporter:
+    """
+    Importa productos por lotes: valida filas, resuelve categorías con una
+    consulta, genera slugs únicos en memoria y guarda con bulk_create /
+    bulk_update, incluyendo inventario y valores de atributos. Las filas se
+    emparejan con productos existentes por SKU.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+    def run(self, rows):
+        result = ImportResult()
+        categories = {}
+        for category in Category.objects.all():
+            categories[category.slug] = category
+            categories[category.name.strip().lower()] = category
+        self.categories = categories
+        self.attributes = {attr.name.lower(): attr for attr in ProductAttribute.objects.all()}
+        self.slugs = SlugAllocator(Product.objects.values_list('slug', flat=True))
+        self.seen_skus = set()
+
+        batch = []
+        for row_number, row in enumerate(rows, start=1):
+            batch.append((row_number, row))
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch, result)
+                batch = []
+        if batch:
+            self._import_batch(batch, result)
+
+        if not self.dry_run and (result.created or result.updated):
+            invalidate_namespace('products')
+            invalidate_namespace('dashboard')
+            invalidate_namespace('attributes')
+        return result
+
+    def _clean_row(self, row):
+        """Valida y normaliza una fila; lanza ValueError con el mensaje del problema"""
+        if isinstance(row, MalformedLine):
+            raise ValueError(row.message)
+        if not isinstance(row, dict):
+            raise ValueError('La fila debe ser un objeto con los campos del producto')
+        name = row.get('name') or ''
+        if not isinstance(name, str):
+            raise ValueError(f'Nombre inválido: {name!r}')
+        name = name.strip()
+        if not name:
+            raise ValueError('El nombre es obligatorio')
+        if len(name) > NAME_MAX_LENGTH:
+            raise ValueError(f'El nombre excede {NAME_MAX_LENGTH} caracteres')
+
+        category_key = str(row.get('category') or '').strip()
+        category = self.categories.get(category_key) or self.categories.get(category_key.lower())
+        if category is None:
+            raise ValueError(f'Categoría desconocida: {category_key!r}')
+
+        try:
+            price = Decimal(str(row.get('price')))
+        except (InvalidOperation, TypeError):
+            raise ValueError(f'Precio inválido: {row.get("price")!r}')
+        # is_finite primero: comparar NaN lanza InvalidOperation
+        if not price.is_finite() or price < 0 or price >= MAX_PRICE:
+            raise ValueError(f'Precio inválido: {row.get("price")!r}')
+        price = price.quantize(CENTS, rounding=ROUND_HALF_UP)
+        if price >= MAX_PRICE:
+            raise ValueError(f'Precio inválido: {row.get("price")!r}')
+
+        try:
+            stock = int(row.get('stock') or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f'Inventario inválido: {row.get("stock")!r}')
+        if stock < 0:
+            raise ValueError(f'Inventario inválido: {stock}')
+
+        sku = str(row.get('sku') or '').strip()
+        if len(sku) > SKU_MAX_LENGTH:
+            raise ValueError(f'El SKU excede {SKU_MAX_LENGTH} caracteres')
+        if sku:
+            if sku in self.seen_skus:
+                raise ValueError(f'SKU duplicado en el archivo: {sku}')
+            self.seen_skus.add(sku)
+
+        dates = {}
+        for date_field in ('production_date', 'expiry_date'):
+            value = row.get(date_field)
+            if value:
+                parsed = parse_date(str(value))
+                if parsed is None:
+                    raise ValueError(f'Fecha inválida en {date_field}: {value!r}')
+                dates[date_field] = parsed
+
+        reorder_level = row.get('reorder_level')
+        try:
+            reorder_level = DEFAULT_REORDER_LEVEL if reorder_level in (None, '') else int(reorder_level)
+        except (TypeError, ValueError):
+            raise ValueError(f'Nivel de reorden inválido: {row.get("reorder_level")!r}')
+        if reorder_level < 0:
+            raise ValueError(f'Nivel de reorden inválido: {reorder_level}')
+
+        attributes = row.get('attributes') or {}
+        if not isinstance(attributes, dict):
+            raise ValueError(f'Atributos inválidos: {attributes!r}')
+
+        return {
+            'name': name,
+            'category': category,
+            'description': row.get('description') or '',
+            'price': price,
+            'stock': stock,
+            'available': _parse_bool(row.get('available'), True),
+            'featured': _parse_bool(row.get('featured'), False),
+            'sku': sku,
+            'batch_number': row.get('batch_number') or '',
+            'reorder_level': reorder_level,
+            'attributes': attributes,
+            **dates,
+        }
+
+    def _import_batch(self, batch, result):
+        cleaned = []
+        for row_number, row in batch:
+            try:
+                cleaned.append(self._clean_row(row))
+            except ValueError as e:
+                result.errors.append((row_number, str(e)))
+
+        skus = [data['sku'] for data in cleaned if data['sku']]
+        existing = {
+            inventory.sku: inventory
+            for inventory in ProductInventory.objects.filter(sku__in=skus).select_related('product')
+        }
+        to_create = [data for data in cleaned if data['sku'] not in existing]
+        to_update = [data for data in cleaned if data['sku'] in existing]
+
+        if self.dry_run:
+            result.created += len(to_create)
+            result.updated += len(to_update)
+            return
+
+        with transaction.atomic():
+            new_products = [
+                Product(
+                    category=data['category'],
+                    name=data['name'],
+                    slug=self.slugs.allocate(data['name']),
+                    description=data['description'],
+                    price=data['price'],
+                    stock=data['stock'],
+                    available=data['available'],
+                    featured=data['featured'],
+                )
+                for data in to_create
+            ]
+            Product.objects.bulk_create(new_products, batch_size=self.batch_size)
+            new_inventories = ProductInventory.objects.bulk_create([
+                self._build_inventory(ProductInventory(product=product), data)
+                for product, data in zip(new_products, to_create)
+            ], batch_size=self.batch_size)
+            # bulk_create no pasa por Product.save(): el kardex se registra aquí
+            movements = [
+                StockMovement(inventory=inventory, kind='ajuste', quantity=data['stock'], note='Importación')
+                for inventory, data in zip(new_inventories, to_create) if data['stock']
+            ]
+
+            batches = [
+                self._build_batch(inventory, data, data['stock'])
+                for inventory, data in zip(new_inventories, to_create) if data['stock'] and self._has_batch(data)
+            ]
+
+            updated_products, updated_inventories, shortfall = [], [], {}
+            for data in to_update:
+                inventory = existing[data['sku']]
+                product = inventory.product
+                difference = data['stock'] - product.stock
+                if difference:
+                    movements.append(StockMovement(
+                        inventory=inventory, kind='ajuste', quantity=difference, note='Importación'
+                    ))
+                # Las entradas con lote crean un lote nuevo; las salidas se descuentan en orden FEFO
+                if difference > 0 and self._has_batch(data):
+                    batches.append(self._build_batch(inventory, data, difference))
+                elif difference < 0:
+                    shortfall[product.id] = -difference
+                for attr in ('category', 'name', 'description', 'price', 'stock', 'available', 'featured'):
+                    setattr(product, attr, data[attr])
+                updated_products.append(product)
+                updated_inventories.append(self._build_inventory(inventory, data))
+            Product.objects.bulk_update(
+                updated_products,
+                ['category', 'name', 'description', 'price', 'stock', 'available', 'featured'],
+                batch_size=self.batch_size,
+            )
+            ProductInventory.objects.bulk_update(updated_inventories, ['reorder_level'], batch_size=self.batch_size)
+            StockMovement.objects.bulk_create(movements, batch_size=self.batch_size)
+            InventoryBatch.objects.bulk_create(batches, batch_size=self.batch_size)
+            # Las bajas por importación son ajustes: vacían primero los lotes caducados
+            allocate_fefo(shortfall, include_expired=True)
+
+            pairs = list(zip(new_products, to_create)) + list(zip(updated_products, to_update))
+            self._save_attributes(pairs)
+            # bulk_create/bulk_update no emiten señales: el índice de facetas y las
+            # filas del reporte de reabastecimiento se corrigen aquí
+            refresh_facets([product.id for product, _ in pairs])
+            reorder.invalidate_on_commit([product.id for product, _ in pairs])
+
+        result.created += len(to_create)
+        result.updated += len(to_update)
+
+    def _build_inventory(self, inventory, data):
+        inventory.sku = data['sku'] or inventory.sku or f'SKU-{inventory.product.id}'
+        inventory.reorder_level = data['reorder_level']
+        return inventory
+
+    def _has_batch(self, data):
+        return bool(data['batch_number'] or data.get('expiry_date'))
+
+    def _build_batch(self, inventory, data, quantity):
+        return InventoryBatch(
+            inventory=inventory, batch_number=data['batch_number'], quantity=quantity,
+            production_date=data.get('production_date'), expiry_date=data.get('expiry_date'),
+        )
+
+    def _save_attributes(self, pairs):
+        """Crea los atributos que falten y guarda los valores con un upsert por lote"""
+        names = {name.strip() for _, data in pairs for name in data['attributes']}
+        missing = [ProductAttribute(name=name) for name in names if name.lower() not in self.attributes]
+        if missing:
+            ProductAttribute.objects.bulk_create(missing)
+            self.attributes.update(
+                (attr.name.lower(), attr)
+                for attr in ProductAttribute.objects.filter(name__in=[attr.name for attr in missing])
+            )
+
+        # Un solo valor por (producto, atributo) para que el upsert no choque consigo mismo
+        values = {}
+        for product, data in pairs:
+            for name, value in data['attributes'].items():
+                attribute = self.attributes[name.strip().lower()]
+                values[(product.id, attribute.id)] = ProductAttributeValue(
+                    product=product, attribute=attribute, value=str(value)
+                )
+        ProductAttributeValue.objects.bulk_create(
+            list(values.values()),
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['product', 'attribute'],
+            update_fields=['value'],
+        )
+
+
+def import_products(file, file_format, **kwargs):
+    """Atajo: lee el archivo y ejecuta el importador"""
+    return ProductImporter(**kwargs).run(read_rows(file, file_format))
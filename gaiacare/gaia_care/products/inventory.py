@@ -0,0 +1,164 @@
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from core.cache import invalidate_namespace
+from core.db import immediate_atomic
+from .batches import allocate_fefo, expired_units
+from .models import InventoryBatch, Product, ProductInventory, StockMovement
+from . import facets, reorder
+
+RECONCILE_BATCH_SIZE = 500
+
+
+class InsufficientStock(Exception):
+    """No hay inventario suficiente para uno o más productos"""
+
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(product.name for product in products)
+        super().__init__(f'Inventario insuficiente para: {names}')
+
+
+def _inventories(products, using=DEFAULT_DB_ALIAS):
+    """Inventarios de los productos con una consulta; crea en lote los que falten"""
+    inventories = {
+        inventory.product_id: inventory
+        for inventory in ProductInventory.objects.using(using).filter(product_id__in=[p.id for p in products])
+    }
+    missing = [
+        ProductInventory(product_id=product.id, sku=f'SKU-{product.id}')
+        for product in products if product.id not in inventories
+    ]
+    if missing:
+        ProductInventory.objects.using(using).bulk_create(missing)
+        inventories.update((inventory.product_id, inventory) for inventory in missing)
+    return inventories
+
+
+def apply_movements(lines, kind, reference='', note='', user=None, using=DEFAULT_DB_ALIAS):
+    """
+    Registra movimientos de inventario y actualiza el saldo materializado
+    (Product.stock) con un único UPDATE basado en F(). `lines` es una lista
+    de (producto, cantidad) con cantidad negativa para salidas; las salidas
+    se descuentan además de los lotes en orden FEFO. Si algún producto se
+    quedaría en negativo no se aplica nada y se lanza InsufficientStock; en
+    las ventas las unidades de lotes caducados no cuentan como disponibles.
+    """
+    deltas = defaultdict(int)
+    products = {}
+    for product, quantity in lines:
+        deltas[product.id] += quantity
+        products[product.id] = product
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return []
+
+    # Las salidas solo se aplican si el saldo alcanza; así no hace falta leerlo
+    # antes. Una venta no cuenta las unidades de lotes caducados, que
+    # allocate_fefo no le surte; un ajuste sí las toma (para darlas de baja).
+    sale = kind == 'venta'
+    reserved = expired_units() if sale else Value(0)
+    condition = Q()
+    for product_id, delta in deltas.items():
+        condition |= Q(id=product_id, stock__gte=reserved - delta) if delta < 0 else Q(id=product_id)
+
+    with transaction.atomic(using=using):
+        updated = Product.objects.using(using).filter(condition).update(
+            stock=F('stock') + Case(
+                *[When(id=product_id, then=Value(delta)) for product_id, delta in deltas.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+        if updated != len(deltas):
+            short = Product.objects.using(using).filter(id__in=deltas).filter(
+                Q(*[Q(id=pid, stock__lt=reserved - delta) for pid, delta in deltas.items() if delta < 0], _connector=Q.OR)
+            )
+            raise InsufficientStock(list(short) or [products[pid] for pid in deltas])
+
+        inventories = _inventories([products[product_id] for product_id in deltas], using)
+        movements = StockMovement.objects.using(using).bulk_create([
+            StockMovement(
+                inventory_id=inventories[product_id].id, kind=kind, quantity=delta,
+                reference=reference, note=note, user_id=user.id if user else None,
+            )
+            for product_id, delta in deltas.items()
+        ])
+        allocate_fefo(
+            {product_id: -delta for product_id, delta in deltas.items() if delta < 0},
+            reference=reference, using=using, include_expired=not sale,
+        )
+        transaction.on_commit(lambda: invalidate_namespace('products'), using=using)
+        # update() no emite señales: las filas del reporte de reabastecimiento y el índice de facetas se corrigen aquí
+        reorder.invalidate_on_commit(deltas, using=using)
+        facets.refresh_on_commit(deltas, using=using)
+
+    # Mantener coherentes las instancias en memoria
+    for product_id, delta in deltas.items():
+        product = products[product_id]
+        product.stock = product.stock + delta
+        product._loaded_stock = product.stock
+    return movements
+
+
+def adjust_stock(product, quantity, kind='ajuste', **kwargs):
+    """Suma (o resta, si es negativa) `quantity` al inventario del producto"""
+    return apply_movements([(product, quantity)], kind, **kwargs)
+
+
+def receive_batch(product, quantity, batch_number='', expiry_date=None, production_date=None, **kwargs):
+    """Da entrada a un lote nuevo y registra el reabastecimiento en el kardex"""
+    with immediate_atomic():
+        batch = InventoryBatch.objects.create(
+            inventory=ProductInventory.for_product(product), batch_number=batch_number,
+            expiry_date=expiry_date, production_date=production_date, quantity=quantity,
+        )
+        kwargs.setdefault('reference', f'Lote {batch_number or batch.id}')
+        apply_movements([(product, quantity)], 'reabastecimiento', **kwargs)
+    return batch
+
+
+def set_stock(product, level, **kwargs):
+    """Lleva el inventario a `level` registrando la diferencia como ajuste"""
+    with immediate_atomic():
+        current = Product.objects.select_for_update().values_list('stock', flat=True).get(id=product.id)
+        product.stock = current
+        return adjust_stock(product, int(level) - current, **kwargs)
+
+
+def stock_drift():
+    """Productos cuyo saldo materializado no coincide con la suma de su kardex"""
+    return (
+        Product.objects
+        .annotate(ledger=Coalesce(Sum('inventory_detail__movements__quantity'), 0))
+        .exclude(stock=F('ledger'))
+        .order_by('id')
+        .values('id', 'name', 'stock', 'ledger')
+    )
+
+
+def reconcile_stock(fix=False, batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Detecta desviaciones entre Product.stock y el kardex. Con `fix` el kardex
+    manda: el saldo se corrige por lotes con un UPDATE por bloque.
+    Devuelve la lista de desviaciones encontradas.
+    """
+    drift = list(stock_drift())
+    if fix:
+        for start in range(0, len(drift), batch_size):
+            chunk = drift[start:start + batch_size]
+            with transaction.atomic():
+                Product.objects.filter(id__in=[row['id'] for row in chunk]).update(
+                    stock=Case(
+                        *[When(id=row['id'], then=Value(row['ledger'])) for row in chunk],
+                        output_field=IntegerField(),
+                    )
+                )
+        if drift:
+            invalidate_namespace('products')
+            reorder.invalidate_rows([row['id'] for row in drift])
+            facets.refresh_facets([row['id'] for row in drift])
+    return drift
@@ -0,0 +1,40 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import IMPORT_BATCH_SIZE, import_products
+
+
+class Command(BaseCommand):
+    help = 'Importa productos por lotes desde un archivo CSV, JSON o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Ruta del archivo a importar')
+        parser.add_argument('--format', choices=['csv', 'json', 'jsonl'], help='Formato (por defecto según la extensión)')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Filas por lote')
+        parser.add_argument('--dry-run', action='store_true', help='Solo validar, sin guardar cambios')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in ('csv', 'json', 'jsonl'):
+            raise CommandError(f'No se pudo determinar el formato de {path}; usa --format')
+
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as file:
+                result = import_products(
+                    file, file_format,
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                )
+        except (ValueError, UnicodeDecodeError) as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+
+        for row_number, message in result.errors:
+            self.stderr.write(f'Fila {row_number}: {message}')
+
+        prefix = '[simulación] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{result.created} productos creados, {result.updated} actualizados, '
+            f'{len(result.errors)} filas con errores.'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products.facets import FACET_BATCH_SIZE, rebuild_facet_index
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de facetas del catálogo (categoría, precio, existencia y atributos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=FACET_BATCH_SIZE,
+            help=f'Productos reindexados por lote (por defecto {FACET_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_facet_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{total} productos indexados.'))
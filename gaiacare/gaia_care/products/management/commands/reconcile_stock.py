@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from products.inventory import RECONCILE_BATCH_SIZE, reconcile_stock
+
+
+class Command(BaseCommand):
+    help = 'Compara el inventario de cada producto con la suma de su kardex y opcionalmente lo corrige'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Corrige el inventario para que coincida con el kardex',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=RECONCILE_BATCH_SIZE,
+            help=f'Productos corregidos por sentencia (por defecto {RECONCILE_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_stock(fix=options['fix'], batch_size=options['batch_size'])
+
+        for row in drift:
+            self.stdout.write(
+                f"#{row['id']} {row['name']}: inventario {row['stock']}, kardex {row['ledger']}"
+            )
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('El inventario coincide con el kardex.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'{len(drift)} productos corregidos.'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} productos con diferencias. Usa --fix para corregirlos.'))
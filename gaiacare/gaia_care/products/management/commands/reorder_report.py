@@ -0,0 +1,33 @@
+from django.core.mail import mail_admins
+from django.core.management.base import BaseCommand
+
+from products.reorder import get_reorder_report
+
+
+class Command(BaseCommand):
+    help = 'Lista los productos en o por debajo de su nivel de reorden o con pocos días de cobertura'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--notify', action='store_true',
+            help='Envía el reporte por correo a ADMINS si hay productos por reabastecer',
+        )
+
+    def handle(self, *args, **options):
+        rows = get_reorder_report()
+        lines = [
+            f"#{row['id']} {row['name']} ({row['sku'] or 'sin SKU'}): stock {row['stock']}, "
+            f"nivel {row['reorder_level']}, cobertura {row['days_of_cover'] if row['days_of_cover'] is not None else '-'} días, "
+            f"pedir {row['suggested_quantity']}"
+            for row in rows
+        ]
+        for line in lines:
+            self.stdout.write(line)
+
+        if not rows:
+            self.stdout.write(self.style.SUCCESS('Ningún producto necesita reabastecerse.'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'{len(rows)} productos por reabastecer.'))
+        if options['notify']:
+            mail_admins(f'{len(rows)} productos por reabastecer', '\n'.join(lines))
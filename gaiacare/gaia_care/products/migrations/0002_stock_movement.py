@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def opening_balances(apps, schema_editor):
+    """Registra el inventario actual de cada producto como saldo inicial del kardex"""
+    Product = apps.get_model('products', 'Product')
+    ProductInventory = apps.get_model('products', 'ProductInventory')
+    StockMovement = apps.get_model('products', 'StockMovement')
+    db_alias = schema_editor.connection.alias
+
+    with_inventory = set(ProductInventory.objects.using(db_alias).values_list('product_id', flat=True))
+    ProductInventory.objects.using(db_alias).bulk_create([
+        ProductInventory(product_id=product_id, sku=f'SKU-{product_id}')
+        for product_id in Product.objects.using(db_alias).exclude(id__in=with_inventory).values_list('id', flat=True)
+    ], batch_size=500)
+
+    StockMovement.objects.using(db_alias).bulk_create([
+        StockMovement(inventory_id=inventory_id, kind='ajuste', quantity=stock, note='Saldo inicial')
+        for inventory_id, stock in ProductInventory.objects.using(db_alias).filter(product__stock__gt=0).values_list('id', 'product__stock')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('venta', 'Venta'), ('reabastecimiento', 'Reabastecimiento'), ('ajuste', 'Ajuste'), ('cancelacion', 'Cancelación')], max_length=20, verbose_name='tipo')),
+                ('quantity', models.IntegerField(help_text='Positiva si entra inventario, negativa si sale', verbose_name='cantidad')),
+                ('reference', models.CharField(blank=True, max_length=100, verbose_name='referencia')),
+                ('note', models.CharField(blank=True, max_length=255, verbose_name='nota')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='creado')),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='products.productinventory', verbose_name='inventario')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='usuario')),
+            ],
+            options={
+                'verbose_name': 'movimiento de inventario',
+                'verbose_name_plural': 'movimientos de inventario',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['inventory', 'created_at'], name='products_st_invento_d7585a_idx')],
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_single_batches(apps, schema_editor):
+    """Convierte el lote único de cada inventario en un InventoryBatch con el stock actual"""
+    ProductInventory = apps.get_model('products', 'ProductInventory')
+    InventoryBatch = apps.get_model('products', 'InventoryBatch')
+    db_alias = schema_editor.connection.alias
+
+    inventories = (
+        ProductInventory.objects.using(db_alias)
+        .filter(product__stock__gt=0)
+        .exclude(batch_number='', expiry_date__isnull=True)
+        .values_list('id', 'batch_number', 'production_date', 'expiry_date', 'product__stock')
+    )
+    InventoryBatch.objects.using(db_alias).bulk_create([
+        InventoryBatch(
+            inventory_id=inventory_id, batch_number=batch_number, production_date=production_date,
+            expiry_date=expiry_date, quantity=stock,
+        )
+        for inventory_id, batch_number, production_date, expiry_date, stock in inventories
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_stock_movement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_number', models.CharField(blank=True, max_length=100, verbose_name='número de lote')),
+                ('production_date', models.DateField(blank=True, null=True, verbose_name='fecha de producción')),
+                ('expiry_date', models.DateField(blank=True, null=True, verbose_name='fecha de caducidad')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='cantidad disponible')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='creado')),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='products.productinventory', verbose_name='inventario')),
+            ],
+            options={
+                'verbose_name': 'lote',
+                'verbose_name_plural': 'lotes',
+                'ordering': [models.OrderBy(models.F('expiry_date'), nulls_last=True), 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BatchAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(db_index=True, max_length=100, verbose_name='referencia')),
+                ('quantity', models.PositiveIntegerField(verbose_name='cantidad')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='creado')),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='products.inventorybatch', verbose_name='lote')),
+            ],
+            options={
+                'verbose_name': 'asignación de lote',
+                'verbose_name_plural': 'asignaciones de lotes',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='inventorybatch',
+            index=models.Index(fields=['inventory', 'expiry_date', 'id'], name='batch_fefo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorybatch',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['expiry_date'], name='batch_expiring_idx'),
+        ),
+        migrations.RunPython(copy_single_batches, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='productinventory',
+            name='batch_number',
+        ),
+        migrations.RemoveField(
+            model_name='productinventory',
+            name='expiry_date',
+        ),
+        migrations.RemoveField(
+            model_name='productinventory',
+            name='production_date',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:15
+
+from django.db import migrations, models
+
+# Valores que antes estaban fijos en get_attributes_for_category
+DEFAULT_VALUES = {
+    'Aroma': ['Floral', 'Cítrico', 'Dulce', 'Herbal', 'Amaderado'],
+    'Tamaño': ['30g', '50g', '100g'],
+    'Duración': ['2-3 horas', '4-6 horas', '8+ horas'],
+    'Intensidad': ['Suave', 'Media', 'Fuerte'],
+}
+
+
+def seed_default_values(apps, schema_editor):
+    """Guarda como datos los valores sugeridos de los atributos conocidos"""
+    ProductAttribute = apps.get_model('products', 'ProductAttribute')
+    db_alias = schema_editor.connection.alias
+
+    for name, values in DEFAULT_VALUES.items():
+        if not ProductAttribute.objects.using(db_alias).filter(name=name).update(default_values=values):
+            ProductAttribute.objects.using(db_alias).create(name=name, default_values=values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_inventory_batches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productattribute',
+            name='default_values',
+            field=models.JSONField(blank=True, default=list, help_text='Valores que se ofrecen cuando ningún producto de la categoría usa el atributo', verbose_name='valores sugeridos'),
+        ),
+        migrations.RunPython(seed_default_values, migrations.RunPython.noop),
+    ]
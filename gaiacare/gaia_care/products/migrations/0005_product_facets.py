@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copia de products.facets.PRICE_BUCKETS al crear el índice
+PRICE_BUCKETS = (('0-100', 0, 100), ('100-250', 100, 250), ('250-500', 250, 500), ('500+', 500, None))
+
+
+def build_index(apps, schema_editor):
+    """Indexa los productos existentes (categoría, rango de precio, existencia y atributos)"""
+    Product = apps.get_model('products', 'Product')
+    ProductAttributeValue = apps.get_model('products', 'ProductAttributeValue')
+    ProductFacet = apps.get_model('products', 'ProductFacet')
+    db_alias = schema_editor.connection.alias
+
+    def bucket(price):
+        return next(key for key, low, high in PRICE_BUCKETS if price >= low and (high is None or price < high))
+
+    rows = []
+    for product_id, category_id, price, stock in Product.objects.using(db_alias).values_list('id', 'category_id', 'price', 'stock'):
+        rows.append(ProductFacet(product_id=product_id, facet='category', value=str(category_id)))
+        rows.append(ProductFacet(product_id=product_id, facet='price', value=bucket(max(price, 0))))
+        if stock > 0:
+            rows.append(ProductFacet(product_id=product_id, facet='stock', value='1'))
+    for product_id, attribute_id, value in ProductAttributeValue.objects.using(db_alias).values_list('product_id', 'attribute_id', 'value'):
+        rows.append(ProductFacet(product_id=product_id, facet=f'attr_{attribute_id}', value=value[:100]))
+    ProductFacet.objects.using(db_alias).bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_attribute_default_values'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=50, verbose_name='faceta')),
+                ('value', models.CharField(max_length=100, verbose_name='valor')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='products.product', verbose_name='producto')),
+            ],
+            options={
+                'verbose_name': 'faceta de producto',
+                'verbose_name_plural': 'facetas de productos',
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value', 'product'), name='unique_product_facet')],
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
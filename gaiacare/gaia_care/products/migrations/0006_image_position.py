@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:22
+
+from django.db import migrations, models
+
+
+def number_images(apps, schema_editor):
+    """Fija como posición el orden que se mostraba hasta ahora (principal primero, luego por fecha)"""
+    ProductImage = apps.get_model('products', 'ProductImage')
+    db_alias = schema_editor.connection.alias
+
+    images = list(ProductImage.objects.using(db_alias).order_by('product_id', '-is_main', 'created_at', 'id'))
+    position, product_id = 0, None
+    for image in images:
+        position = 0 if image.product_id != product_id else position + 1
+        product_id = image.product_id
+        image.position = position
+    ProductImage.objects.using(db_alias).bulk_update(images, ['position'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_facets'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='productimage',
+            options={'ordering': ['position', 'id'], 'verbose_name': 'imagen de producto', 'verbose_name_plural': 'imágenes de productos'},
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='position',
+            field=models.PositiveIntegerField(default=0, verbose_name='posición'),
+        ),
+        migrations.RunPython(number_images, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(fields=['product', 'position'], name='productimage_position_idx'),
+        ),
+    ]
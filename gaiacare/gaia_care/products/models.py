@@ -1,8 +1,11 @@
-from django.db import models
-from django.utils.text import slugify
+from django.conf import settings
+from django.db import models, router
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
+from core.db import immediate_atomic
+from .slugs import save_with_unique_slug
+
 class Category(models.Model):
     """Categoría de productos"""
     name = models.CharField(_('nombre'), max_length=100)
@@ -20,9 +23,10 @@ class Category(models.Model):
         return reverse('products:category_detail', kwargs={'slug': self.slug})
     
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        parent_save = super().save
+        save_with_unique_slug(
+            self, lambda: parent_save(*args, **kwargs), self.name, using=kwargs.get('using')
+        )
     
     class Meta:
         verbose_name = _('categoría')
@@ -49,10 +53,35 @@ class Product(models.Model):
     def get_absolute_url(self):
         return reverse('products:product_detail', kwargs={'slug': self.slug})
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Inventario tal como se leyó, para registrar en el kardex lo que cambie save()
+        instance._loaded_stock = instance.__dict__.get('stock')
+        return instance
+    
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        parent_save = super().save
+        
+        # BEGIN IMMEDIATE en SQLite: slug, fila y kardex se escriben sin carreras
+        with immediate_atomic(using=using):
+            save_with_unique_slug(self, lambda: parent_save(*args, **kwargs), self.name, using=using)
+            
+            # Los cambios de inventario hechos con save() (alta, admin) quedan como ajuste
+            previous = 0 if adding else getattr(self, '_loaded_stock', None)
+            if previous is not None and (update_fields is None or 'stock' in update_fields):
+                self.stock = int(self.stock)
+                if self.stock != previous:
+                    StockMovement.objects.using(using).create(
+                        inventory_id=ProductInventory.for_product(self, using=using).id,
+                        kind='ajuste',
+                        quantity=self.stock - previous,
+                        note='Inventario inicial' if adding else 'Edición del producto',
+                    )
+        self._loaded_stock = self.stock
     
     class Meta:
         verbose_name = _('producto')
@@ -61,6 +90,10 @@ class Product(models.Model):
     
     def get_main_image(self):
         """Retorna la imagen principal del producto"""
+        # Usar las imágenes precargadas (prefetch_related) si existen
+        if 'images' in getattr(self, '_prefetched_objects_cache', {}):
+            images = self.images.all()
+            return next((image for image in images if image.is_main), None) or next(iter(images), None)
         return self.images.filter(is_main=True).first() or self.images.first()
 
 
@@ -70,37 +103,142 @@ class ProductImage(models.Model):
     image = models.ImageField(_('imagen'), upload_to='products')
     is_main = models.BooleanField(_('es principal'), default=False)
     alt_text = models.CharField(_('texto alternativo'), max_length=200, blank=True)
+    position = models.PositiveIntegerField(_('posición'), default=0)
     created_at = models.DateTimeField(_('creado'), auto_now_add=True)
     
     def __str__(self):
         return f"Imagen para {self.product.name}"
     
+    def save(self, *args, **kwargs):
+        # Las imágenes nuevas sin posición van al final de la galería
+        if self._state.adding and not self.position:
+            using = kwargs.get('using') or router.db_for_write(ProductImage, instance=self)
+            images = ProductImage.objects.using(using).filter(product_id=self.product_id)
+            last = images.aggregate(last=models.Max('position'))['last']
+            self.position = 0 if last is None else last + 1
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def reorder(cls, product_id, image_ids):
+        """
+        Asigna las posiciones 0..n-1 a `image_ids` en un solo UPDATE con CASE;
+        las imágenes del producto que no vienen en la lista quedan después,
+        en su orden actual. Devuelve el número de imágenes actualizadas.
+        """
+        image_ids = [int(image_id) for image_id in image_ids]
+        return cls.objects.filter(product_id=product_id).update(position=models.Case(
+            *[models.When(id=image_id, then=models.Value(index)) for index, image_id in enumerate(image_ids)],
+            default=models.F('position') + len(image_ids),
+            output_field=models.PositiveIntegerField(),
+        ))
+    
     class Meta:
         verbose_name = _('imagen de producto')
         verbose_name_plural = _('imágenes de productos')
-        ordering = ['-is_main', 'created_at']
+        ordering = ['position', 'id']
+        indexes = [models.Index(fields=['product', 'position'], name='productimage_position_idx')]
 
 
 class ProductInventory(models.Model):
     """Inventario detallado de productos"""
     product = models.OneToOneField(Product, verbose_name=_('producto'), related_name='inventory_detail', on_delete=models.CASCADE)
     sku = models.CharField(_('SKU'), max_length=100, unique=True)
-    batch_number = models.CharField(_('número de lote'), max_length=100, blank=True)
-    production_date = models.DateField(_('fecha de producción'), null=True, blank=True)
-    expiry_date = models.DateField(_('fecha de caducidad'), null=True, blank=True)
     reorder_level = models.PositiveIntegerField(_('nivel de reorden'), default=5)
     
     def __str__(self):
         return f"Inventario de {self.product.name}"
     
+    @classmethod
+    def for_product(cls, product, using=None):
+        """Inventario del producto; si no existe se crea con un SKU por defecto"""
+        inventory, _ = cls.objects.db_manager(using).get_or_create(
+            product_id=product.id, defaults={'sku': f'SKU-{product.id}'}
+        )
+        return inventory
+    
     class Meta:
         verbose_name = _('inventario de producto')
         verbose_name_plural = _('inventarios de productos')
 
 
+class InventoryBatch(models.Model):
+    """Lote de un SKU con su caducidad; quantity es lo que queda del lote"""
+    inventory = models.ForeignKey(ProductInventory, verbose_name=_('inventario'), related_name='batches', on_delete=models.CASCADE)
+    batch_number = models.CharField(_('número de lote'), max_length=100, blank=True)
+    production_date = models.DateField(_('fecha de producción'), null=True, blank=True)
+    expiry_date = models.DateField(_('fecha de caducidad'), null=True, blank=True)
+    quantity = models.PositiveIntegerField(_('cantidad disponible'), default=0)
+    created_at = models.DateTimeField(_('creado'), auto_now_add=True)
+    
+    def __str__(self):
+        return f"Lote {self.batch_number or self.id} ({self.inventory.sku})"
+    
+    class Meta:
+        verbose_name = _('lote')
+        verbose_name_plural = _('lotes')
+        ordering = [models.F('expiry_date').asc(nulls_last=True), 'id']
+        indexes = [
+            # Orden FEFO dentro de cada SKU
+            models.Index(fields=['inventory', 'expiry_date', 'id'], name='batch_fefo_idx'),
+            # Lotes por caducar: solo los que aún tienen existencias
+            models.Index(fields=['expiry_date'], condition=models.Q(quantity__gt=0), name='batch_expiring_idx'),
+        ]
+
+
+class BatchAllocation(models.Model):
+    """Unidades de un lote tomadas por una salida con referencia (ej. un pedido)"""
+    batch = models.ForeignKey(InventoryBatch, verbose_name=_('lote'), related_name='allocations', on_delete=models.CASCADE)
+    reference = models.CharField(_('referencia'), max_length=100, db_index=True)
+    quantity = models.PositiveIntegerField(_('cantidad'))
+    created_at = models.DateTimeField(_('creado'), auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.reference}: {self.quantity} de {self.batch}"
+    
+    class Meta:
+        verbose_name = _('asignación de lote')
+        verbose_name_plural = _('asignaciones de lotes')
+
+
+class StockMovement(models.Model):
+    """Movimiento de inventario (kardex). Solo se agregan registros; Product.stock es el saldo"""
+    KIND_CHOICES = (
+        ('venta', _('Venta')),
+        ('reabastecimiento', _('Reabastecimiento')),
+        ('ajuste', _('Ajuste')),
+        ('cancelacion', _('Cancelación')),
+    )
+    
+    inventory = models.ForeignKey(ProductInventory, verbose_name=_('inventario'), related_name='movements', on_delete=models.CASCADE)
+    kind = models.CharField(_('tipo'), max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField(_('cantidad'), help_text=_('Positiva si entra inventario, negativa si sale'))
+    reference = models.CharField(_('referencia'), max_length=100, blank=True)
+    note = models.CharField(_('nota'), max_length=255, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name=_('usuario'), related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(_('creado'), auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} ({self.inventory.sku})"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Los movimientos de inventario no se modifican; registra un ajuste')
+        super().save(*args, **kwargs)
+    
+    class Meta:
+        verbose_name = _('movimiento de inventario')
+        verbose_name_plural = _('movimientos de inventario')
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['inventory', 'created_at'])]
+
+
 class ProductAttribute(models.Model):
     """Atributos de los productos (ej: tamaño, aroma, etc.)"""
     name = models.CharField(_('nombre'), max_length=100)
+    default_values = models.JSONField(
+        _('valores sugeridos'), default=list, blank=True,
+        help_text=_('Valores que se ofrecen cuando ningún producto de la categoría usa el atributo'),
+    )
     
     def __str__(self):
         return self.name
@@ -122,4 +260,20 @@ class ProductAttributeValue(models.Model):
     class Meta:
         verbose_name = _('valor de atributo')
         verbose_name_plural = _('valores de atributos')
-        unique_together = ('product', 'attribute')
\ No newline at end of file
+        unique_together = ('product', 'attribute')
+
+class ProductFacet(models.Model):
+    """Índice de facetas: un renglón por (producto, faceta, valor) para filtrar y contar sin unir tablas"""
+    product = models.ForeignKey(Product, verbose_name=_('producto'), related_name='facets', on_delete=models.CASCADE)
+    facet = models.CharField(_('faceta'), max_length=50)
+    value = models.CharField(_('valor'), max_length=100)
+    
+    def __str__(self):
+        return f"{self.product_id} {self.facet}={self.value}"
+    
+    class Meta:
+        verbose_name = _('faceta de producto')
+        verbose_name_plural = _('facetas de productos')
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value', 'product'], name='unique_product_facet'),
+        ]
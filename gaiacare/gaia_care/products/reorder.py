@@ -0,0 +1,150 @@
+import math
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, IntegerField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from core.cache import make_keys
+from .models import Product, ProductInventory
+
+# Nivel de reorden para productos sin ProductInventory (el mismo default del modelo)
+DEFAULT_REORDER_LEVEL = 5
+# Días de ventas con los que se calcula la velocidad
+VELOCITY_DAYS = 30
+# Se alerta si el inventario cubre menos de estos días de venta
+ALERT_COVER_DAYS = 7
+# La cantidad sugerida cubre estos días de venta por encima del nivel de reorden
+TARGET_COVER_DAYS = 30
+# Las filas se invalidan en cada cambio de inventario; este tiempo solo acota la deriva de la velocidad
+REPORT_TIMEOUT = 60 * 60
+# Productos por consulta al recalcular filas (límite de variables de SQLite)
+REBUILD_BATCH_SIZE = 500
+
+# Estados de pedido que cuentan como venta
+SOLD_STATUSES = ('pendiente', 'pagado', 'enviado', 'entregado')
+
+
+def with_reorder_level(products):
+    """Anota el nivel de reorden de cada producto (por SKU, con valor por defecto)"""
+    return products.annotate(
+        reorder_level_value=Coalesce(
+            'inventory_detail__reorder_level', Value(DEFAULT_REORDER_LEVEL), output_field=IntegerField()
+        )
+    )
+
+
+def low_stock(products):
+    """Productos cuyo inventario está en o por debajo de su nivel de reorden"""
+    return with_reorder_level(products).filter(stock__lte=F('reorder_level_value'))
+
+
+def _build_rows(products):
+    """Calcula las filas del reporte con una sola consulta (inventario + ventas recientes)"""
+    since = timezone.now() - timedelta(days=VELOCITY_DAYS)
+    sold = Q(orderitem__order__created_at__gte=since, orderitem__order__status__in=SOLD_STATUSES)
+    queryset = (
+        with_reorder_level(products)
+        .annotate(units_sold=Coalesce(Sum('orderitem__quantity', filter=sold), 0))
+        .values('id', 'name', 'stock', 'reorder_level_value', 'units_sold', 'inventory_detail__sku')
+    )
+
+    rows = {}
+    for product in queryset:
+        velocity = product['units_sold'] / VELOCITY_DAYS
+        days_of_cover = product['stock'] / velocity if velocity else None
+        below_level = product['stock'] <= product['reorder_level_value']
+        if not below_level and (days_of_cover is None or days_of_cover >= ALERT_COVER_DAYS):
+            continue
+        target = product['reorder_level_value'] + math.ceil(velocity * TARGET_COVER_DAYS)
+        rows[product['id']] = {
+            'id': product['id'],
+            'name': product['name'],
+            'sku': product['inventory_detail__sku'] or '',
+            'stock': product['stock'],
+            'reorder_level': product['reorder_level_value'],
+            'units_sold': product['units_sold'],
+            'daily_velocity': round(velocity, 2),
+            'days_of_cover': round(days_of_cover, 1) if days_of_cover is not None else None,
+            'below_level': below_level,
+            'suggested_quantity': max(target - product['stock'], 0),
+        }
+    return rows
+
+
+def _sort_key(row):
+    # Primero los agotados y luego los que se acaban antes
+    cover = row['days_of_cover'] if row['days_of_cover'] is not None else math.inf
+    return (row['stock'] > 0, cover, row['stock'] - row['reorder_level'])
+
+
+def _generations(product_ids):
+    """
+    Generación de la fila de cada producto. Las que falten se crean antes de
+    calcular, así que una fila calculada antes de una invalidación queda
+    bajo una generación que ya nadie lee.
+    """
+    keys = dict(zip(make_keys('reorder', [('generation', pid) for pid in product_ids]), product_ids))
+    found = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {keys[key]: generation for key, generation in found.items()}
+
+
+def get_reorder_report():
+    """
+    Reporte de reabastecimiento ordenado por urgencia. Cada producto tiene su
+    fila en caché (False si no necesita reabastecerse) y solo se calculan las
+    que falten o se hayan invalidado. Todo se lee de la primaria: dentro de
+    read_replica una réplica atrasada dejaría en caché filas viejas.
+    """
+    product_ids = list(
+        Product.objects.using(DEFAULT_DB_ALIAS).filter(available=True).values_list('id', flat=True)
+    )
+    generations = _generations(product_ids)
+    keys = dict(zip(product_ids, make_keys('reorder', [('row', pid, generations[pid]) for pid in product_ids])))
+    found = cache.get_many(keys.values())
+    rows = {pid: found[key] for pid, key in keys.items() if key in found}
+
+    missing = [pid for pid in product_ids if pid not in rows]
+    for start in range(0, len(missing), REBUILD_BATCH_SIZE):
+        chunk = missing[start:start + REBUILD_BATCH_SIZE]
+        built = _build_rows(Product.objects.using(DEFAULT_DB_ALIAS).filter(id__in=chunk))
+        fresh = {pid: built.get(pid, False) for pid in chunk}
+        cache.set_many({keys[pid]: row for pid, row in fresh.items()}, timeout=REPORT_TIMEOUT)
+        rows.update(fresh)
+    return sorted((row for row in rows.values() if row), key=_sort_key)
+
+
+def invalidate_rows(product_ids):
+    """Da una generación nueva a los productos; su fila se recalcula en la próxima lectura"""
+    keys = make_keys('reorder', [('generation', pid) for pid in product_ids])
+    if keys:
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def invalidate_on_commit(product_ids, using=None):
+    """Programa invalidate_rows para cuando se confirme la transacción actual"""
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: invalidate_rows(product_ids), using=using)
+
+
+def _product_changed(sender, instance, using=None, **kwargs):
+    invalidate_on_commit([instance.id], using=using)
+
+
+def _inventory_changed(sender, instance, using=None, **kwargs):
+    invalidate_on_commit([instance.product_id], using=using)
+
+
+def track_reorder_changes():
+    """Conecta las señales que mantienen las filas al día (altas, ediciones y bajas)"""
+    for name, signal in (('save', post_save), ('delete', post_delete)):
+        signal.connect(_product_changed, sender=Product, dispatch_uid=f'reorder:product:{name}')
+        signal.connect(_inventory_changed, sender=ProductInventory, dispatch_uid=f'reorder:inventory:{name}')
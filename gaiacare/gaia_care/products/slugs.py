@@ -0,0 +1,89 @@
+from django.db import IntegrityError, router, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from core.db import immediate_atomic
+
+# Espacio reservado para el sufijo numérico ('-99999')
+SUFFIX_RESERVE = 6
+# Intentos de guardado si otra conexión toma el mismo slug entre la consulta y el INSERT
+SAVE_ATTEMPTS = 3
+
+
+def _with_suffix(base, suffix, max_length):
+    suffix = f'-{suffix}'
+    return f'{base[:max_length - len(suffix)]}{suffix}'
+
+
+class SlugAllocator:
+    """
+    Asigna slugs únicos en memoria ('crema', 'crema-2', 'crema-3'...) a partir
+    de un conjunto de slugs ya ocupados. Pensado para importaciones por lotes.
+    """
+
+    def __init__(self, taken=(), max_length=200):
+        self.taken = set(taken)
+        self.max_length = max_length
+        self._next_suffix = {}
+
+    def allocate(self, value):
+        base = slugify(value)[:self.max_length] or 'item'
+        slug = base
+        suffix = self._next_suffix.get(base, 2)
+        while slug in self.taken:
+            slug = _with_suffix(base, suffix, self.max_length)
+            suffix += 1
+        self._next_suffix[base] = suffix
+        self.taken.add(slug)
+        return slug
+
+
+def taken_slugs(queryset, base, max_length, field='slug'):
+    """
+    Slugs ocupados que pueden chocar con `base` o con sus variantes numeradas.
+    Se consultan como rango sobre el campo ('base-' <= slug < 'base.') para
+    que use su índice único en lugar de un LIKE.
+    """
+    if len(base) + SUFFIX_RESERVE <= max_length:
+        prefix = Q(**{f'{field}__gte': f'{base}-', f'{field}__lt': f'{base}.'})  # '.' sigue a '-'
+        condition = Q(**{field: base}) | prefix
+    else:
+        # El sufijo recorta el base; basta con el tramo que nunca se recorta
+        stem = base[:max_length - SUFFIX_RESERVE]
+        condition = Q(**{f'{field}__gte': stem, f'{field}__lt': f'{stem}\x7f'})
+    return set(queryset.filter(condition).values_list(field, flat=True))
+
+
+def allocate_slug(instance, value, field='slug', using=None):
+    """Primer slug libre para `instance` a partir de `value`, con una sola consulta"""
+    model = type(instance)
+    using = using or router.db_for_write(model, instance=instance)
+    max_length = instance._meta.get_field(field).max_length
+    base = slugify(value)[:max_length] or 'item'
+    # Se consulta la base de escritura: una réplica atrasada daría slugs ya ocupados
+    queryset = model._default_manager.db_manager(using).all()
+    if instance.pk:
+        queryset = queryset.exclude(pk=instance.pk)
+    return SlugAllocator(taken_slugs(queryset, base, max_length, field), max_length).allocate(base)
+
+
+def save_with_unique_slug(instance, save, value, field='slug', using=None):
+    """
+    Llama a `save` asignando antes un slug único si la instancia no tiene uno.
+    En SQLite la consulta y el INSERT van dentro de BEGIN IMMEDIATE, así que
+    no hay carrera; en otros motores se reintenta si el INSERT choca.
+    """
+    if getattr(instance, field):
+        return save()
+
+    using = using or router.db_for_write(type(instance), instance=instance)
+    for attempt in range(SAVE_ATTEMPTS):
+        with immediate_atomic(using=using):
+            setattr(instance, field, allocate_slug(instance, value, field, using=using))
+            try:
+                with transaction.atomic(using=using):
+                    return save()
+            except IntegrityError:
+                setattr(instance, field, '')
+                if attempt == SAVE_ATTEMPTS - 1:
+                    raise
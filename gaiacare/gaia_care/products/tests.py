@@ -1,3 +1,650 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.testing import FileSQLiteTestCase
+from orders.models import OrderItem
+from orders.tests import create_order
+from users.models import CustomUser
+from .importers import import_products
+from .attributes import get_attribute_catalog
+from .batches import allocate_fefo, expiring_batches
+from .facets import FacetedSearch, rebuild_facet_index
+from .inventory import InsufficientStock, apply_movements, receive_batch, reconcile_stock, set_stock
+from .models import (
+    BatchAllocation, Category, InventoryBatch, Product, ProductAttribute, ProductAttributeValue, ProductFacet,
+    ProductImage, ProductInventory, StockMovement,
+)
+from .reorder import get_reorder_report, low_stock
+from . import reorder, slugs
+
+
+class ProductImportTest(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Cremas', slug='cremas')
+        Product.objects.create(category=self.category, name='Crema', slug='crema', description='', price=10)
+
+    def _csv(self, rows):
+        header = 'name,category,price,stock,sku,attr:Aroma\n'
+        return io.StringIO(header + ''.join(f'{row}\n' for row in rows))
+
+    def test_creates_products_with_unique_slugs_inventory_and_attributes(self):
+        result = import_products(self._csv([
+            'Crema,cremas,120.50,4,GC-1,Floral',
+            'Crema,Cremas,99,2,GC-2,Cítrico',
+        ]), 'csv')
+
+        self.assertEqual((result.created, result.updated, result.errors), (2, 0, []))
+        slugs = set(Product.objects.values_list('slug', flat=True))
+        self.assertEqual(slugs, {'crema', 'crema-2', 'crema-3'})
+        inventory = ProductInventory.objects.get(sku='GC-1')
+        self.assertEqual(inventory.product.stock, 4)
+        self.assertEqual(
+            ProductAttributeValue.objects.get(product=inventory.product).value, 'Floral'
+        )
+
+    def test_existing_sku_is_updated(self):
+        import_products(self._csv(['Crema,cremas,120,4,GC-1,Floral']), 'csv')
+        result = import_products(self._csv(['Crema rosa,cremas,150,9,GC-1,Dulce']), 'csv')
+
+        self.assertEqual((result.created, result.updated), (0, 1))
+        product = ProductInventory.objects.get(sku='GC-1').product
+        self.assertEqual((product.name, product.price, product.stock), ('Crema rosa', 150, 9))
+        self.assertEqual(product.attribute_values.get().value, 'Dulce')
+
+    def test_reports_errors_per_row(self):
+        result = import_products(self._csv([
+            ',cremas,10,1,A,',
+            'Jabón,jabones,10,1,B,',
+            'Jabón,cremas,abc,1,C,',
+            'Jabón,cremas,10,-1,D,',
+            'Jabón,cremas,10,1,E,',
+            'Jabón,cremas,10,1,E,',
+        ]), 'csv')
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([row for row, _ in result.errors], [1, 2, 3, 4, 6])
+
+    def test_json_and_dry_run(self):
+        data = json.dumps([{'name': 'Aceite', 'category': 'cremas', 'price': 80, 'attributes': {'Tamaño': '30g'}}])
+        result = import_products(io.StringIO(data), 'json', dry_run=True)
+        self.assertEqual(result.created, 1)
+        self.assertFalse(Product.objects.filter(name='Aceite').exists())
+
+    def test_non_finite_price_is_a_row_error(self):
+        result = import_products(self._csv(['Jabón,cremas,NaN,1,A,', 'Jabón,cremas,Infinity,1,B,', 'Jabón,cremas,10,1,C,']), 'csv')
+        self.assertEqual(result.created, 1)
+        self.assertEqual([row for row, _ in result.errors], [1, 2])
+
+    def test_malformed_json_rows(self):
+        with self.assertRaisesMessage(ValueError, 'lista de objetos'):
+            import_products(io.StringIO(json.dumps({'name': 'Aceite'})), 'json')
+
+        data = json.dumps(['Aceite', 3, [], {'name': 'Aceite', 'category': 'cremas', 'price': 80, 'attributes': ['x']},
+                           {'name': 'Aceite', 'category': 'cremas', 'price': 80}])
+        result = import_products(io.StringIO(data), 'json')
+        self.assertEqual(result.created, 1)
+        self.assertEqual([row for row, _ in result.errors], [1, 2, 3, 4])
+
+        lines = '"Aceite"\n{"name": "Jabón", "category": "cremas", "price": 5}\n'
+        result = import_products(io.StringIO(lines), 'jsonl')
+        self.assertEqual((result.created, [row for row, _ in result.errors]), (1, [1]))
+
+    def test_values_that_do_not_fit_the_model_are_row_errors(self):
+        valid = {'category': 'cremas', 'price': 10}
+        rows = [
+            {**valid, 'name': 123},
+            {**valid, 'name': 'a' * 201},
+            {**valid, 'name': 'Jabón', 'reorder_level': -1},
+            {**valid, 'name': 'Jabón', 'price': 123456789012},
+            {**valid, 'name': 'Jabón', 'price': '1e30'},
+            {**valid, 'name': 'Jabón', 'price': '99999999.999'},
+            {**valid, 'name': 'Jabón', 'sku': 'S' * 101},
+            {**valid, 'name': 'Aceite', 'price': '12.345', 'reorder_level': 0, 'sku': 'AC-1'},
+        ]
+        result = import_products(io.StringIO(json.dumps(rows)), 'json', batch_size=100)
+        self.assertEqual(result.created, 1)
+        self.assertEqual([row for row, _ in result.errors], [1, 2, 3, 4, 5, 6, 7])
+        inventory = ProductInventory.objects.get(sku='AC-1')
+        self.assertEqual((inventory.product.price, inventory.reorder_level), (Decimal('12.35'), 0))
+
+    def test_malformed_jsonl_line_is_a_row_error(self):
+        row = json.dumps({'name': 'Aceite', 'category': 'cremas', 'price': 80})
+        result = import_products(io.StringIO(f'{row}\n{{"name": \n{row}\n'), 'jsonl', batch_size=1)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.errors[0][0], 2)
+        self.assertIn('JSON inválido', result.errors[0][1])
+
+    def test_import_command_reports_unreadable_files(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as file:
+            json.dump({'name': 'Aceite'}, file)
+        self.addCleanup(os.remove, file.name)
+        with self.assertRaisesMessage(CommandError, 'lista de objetos'):
+            call_command('import_products', file.name, stdout=io.StringIO())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def queries_for(count, offset):
+            rows = [f'Producto {i},cremas,10,1,SKU-X{i},Floral' for i in range(offset, offset + count)]
+            with CaptureQueriesContext(connection) as ctx:
+                import_products(self._csv(rows), 'csv')
+            return len(ctx.captured_queries)
+
+        queries_for(1, 1000)  # crea el atributo Aroma
+        self.assertEqual(queries_for(5, 0), queries_for(50, 100))
+
+
+class UniqueSlugTest(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Cremas')
+
+    def _product(self, name, **kwargs):
+        return Product.objects.create(category=self.category, name=name, description='', price=10, **kwargs)
+
+    def test_same_name_gets_numbered_slugs(self):
+        allocated = [self._product('Crema de rosas').slug for _ in range(3)]
+        self.assertEqual(allocated, ['crema-de-rosas', 'crema-de-rosas-2', 'crema-de-rosas-3'])
+        self.assertEqual(Category.objects.create(name='Cremas').slug, 'cremas-2')
+
+    def test_similar_slugs_do_not_count_as_taken(self):
+        self._product('Crema corporal')
+        self._product('Cremas')
+        self.assertEqual(self._product('Crema').slug, 'crema')
+
+    def test_free_slug_is_found_with_one_query(self):
+        for i in range(5):
+            self._product('Crema', slug=f'crema-{i + 2}')
+        self._product('Crema')
+        with CaptureQueriesContext(connection) as ctx:
+            slug = slugs.allocate_slug(Product(name='Crema'), 'Crema')
+        self.assertEqual(slug, 'crema-7')
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_long_names_stay_within_max_length(self):
+        name = 'a' * 250
+        allocated = {self._product(name).slug for _ in range(3)}
+        self.assertEqual(len(allocated), 3)
+        self.assertTrue(all(len(slug) <= 200 for slug in allocated))
+
+    def test_slug_taken_after_query_is_retried(self):
+        self._product('Crema')
+        # Otra conexión toma el slug entre la consulta y el INSERT
+        allocate = slugs.allocate_slug
+        results = iter(['crema'])
+
+        def racing_allocate(*args, **kwargs):
+            return next(results, None) or allocate(*args, **kwargs)
+
+        with mock.patch.object(slugs, 'allocate_slug', side_effect=racing_allocate):
+            self.assertEqual(self._product('Crema').slug, 'crema-2')
+
+    def test_explicit_slug_is_kept(self):
+        self.assertEqual(self._product('Crema', slug='mi-crema').slug, 'mi-crema')
+
+
+class ConcurrentSlugTest(FileSQLiteTestCase):
+    """Varios hilos creando productos con el mismo nombre a la vez"""
+    ALIAS = 'slug_stress'
+    THREADS = 6
+
+    def test_concurrent_creation_gets_unique_slugs(self):
+        category = Category.objects.using(self.ALIAS).create(name='Cremas')
+
+        def create():
+            Product.objects.using(self.ALIAS).create(category_id=category.id, name='Crema', description='', price=10)
+
+        self.assertEqual(self.run_in_threads(create, self.THREADS), [])
+        allocated = set(Product.objects.using(self.ALIAS).values_list('slug', flat=True))
+        self.assertEqual(allocated, {'crema'} | {f'crema-{i}' for i in range(2, self.THREADS + 1)})
+
+
+class StockLedgerTest(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Cremas')
+        self.cream = Product.objects.create(category=self.category, name='Crema', description='', price=10, stock=10)
+        self.soap = Product.objects.create(category=self.category, name='Jabón', description='', price=5, stock=3)
+
+    def _ledger(self, product):
+        return list(
+            StockMovement.objects.filter(inventory__product=product)
+            .order_by('id').values_list('kind', 'quantity')
+        )
+
+    def test_creation_records_opening_balance(self):
+        self.assertEqual(self._ledger(self.cream), [('ajuste', 10)])
+        self.assertEqual(self.cream.inventory_detail.sku, f'SKU-{self.cream.id}')
+
+    def test_movements_update_all_counters_in_one_statement(self):
+        with CaptureQueriesContext(connection) as ctx:
+            apply_movements([(self.cream, -2), (self.soap, -3), (self.cream, -1)], 'venta', reference='Pedido #1')
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(updates), 1)
+
+        self.cream.refresh_from_db()
+        self.soap.refresh_from_db()
+        self.assertEqual((self.cream.stock, self.soap.stock), (7, 0))
+        self.assertEqual(self._ledger(self.cream), [('ajuste', 10), ('venta', -3)])
+
+    def test_insufficient_stock_applies_nothing(self):
+        with self.assertRaises(InsufficientStock) as ctx:
+            apply_movements([(self.cream, -2), (self.soap, -4)], 'venta')
+        self.assertEqual(ctx.exception.products, [self.soap])
+
+        self.cream.refresh_from_db()
+        self.assertEqual(self.cream.stock, 10)
+        self.assertEqual(self._ledger(self.cream), [('ajuste', 10)])
+
+    def test_set_stock_records_the_difference(self):
+        set_stock(self.cream, 4, note='Conteo físico')
+        self.cream.refresh_from_db()
+        self.assertEqual(self.cream.stock, 4)
+        self.assertEqual(self._ledger(self.cream), [('ajuste', 10), ('ajuste', -6)])
+
+    def test_editing_stock_with_save_is_audited(self):
+        product = Product.objects.get(id=self.cream.id)
+        product.stock = 15
+        product.save()
+        self.assertEqual(self._ledger(self.cream), [('ajuste', 10), ('ajuste', 5)])
+
+    def test_admin_edits_do_not_overwrite_stock(self):
+        model_admin = admin.site._registry[Product]
+        request = RequestFactory().post('/')
+        request.user = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        product = Product.objects.get(id=self.cream.id)
+        self.assertIn('stock', model_admin.get_readonly_fields(request, product))
+
+        # Una venta entra mientras el formulario está abierto
+        apply_movements([(self.cream, -3)], 'venta')
+        data = {
+            'category': self.category.id, 'name': 'Crema rosa', 'slug': product.slug,
+            'description': 'Hidratante', 'price': '10', 'available': 'on', 'stock_adjustment': '2',
+        }
+        form = model_admin.get_form(request, product, change=True)(data, instance=product)
+        self.assertTrue(form.is_valid(), form.errors)
+        model_admin.save_model(request, form.save(commit=False), form, change=True)
+
+        self.cream.refresh_from_db()
+        self.assertEqual((self.cream.name, self.cream.stock), ('Crema rosa', 9))
+        self.assertEqual(self._ledger(self.cream), [('ajuste', 10), ('venta', -3), ('ajuste', 2)])
+
+        # Al crear se captura el inventario inicial; al editar solo hay ajuste
+        self.client.force_login(request.user)
+        self.assertContains(self.client.get(reverse('admin:products_product_add')), 'name="stock"')
+        response = self.client.get(reverse('admin:products_product_change', args=[self.cream.id]))
+        self.assertContains(response, 'name="stock_adjustment"')
+        self.assertNotContains(response, 'name="stock"')
+
+    def test_movements_are_append_only(self):
+        movement = StockMovement.objects.filter(inventory__product=self.cream).get()
+        movement.quantity = 1
+        with self.assertRaises(ValueError):
+            movement.save()
+
+    def test_reconcile_fixes_drift_from_the_ledger(self):
+        # Escritura directa que se salta el kardex
+        Product.objects.filter(id=self.cream.id).update(stock=99)
+
+        out = io.StringIO()
+        call_command('reconcile_stock', stdout=out)
+        self.assertIn('kardex 10', out.getvalue())
+        self.assertEqual(Product.objects.get(id=self.cream.id).stock, 99)
+
+        call_command('reconcile_stock', fix=True, stdout=out)
+        self.assertEqual(Product.objects.get(id=self.cream.id).stock, 10)
+        self.assertEqual(reconcile_stock(), [])
+
+
+@override_settings(ADMINS=[('Inventario', 'inventario@example.com')])
+class ReorderReportTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Cremas', slug='cremas')
+        self.cream = Product.objects.create(category=category, name='Crema', slug='crema', description='', price=10, stock=8)
+        self.soap = Product.objects.create(category=category, name='Jabón', slug='jabon', description='', price=5, stock=4)
+        self.oil = Product.objects.create(category=category, name='Aceite', slug='aceite', description='', price=5, stock=40)
+        ProductInventory.objects.filter(product=self.cream).update(reorder_level=10)
+        ProductInventory.objects.filter(product=self.soap).delete()
+
+        # 30 unidades de aceite en 30 días: 1 por día, 40 días de cobertura
+        user = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='x')
+        order = create_order(user, status='pagado')
+        OrderItem.objects.create(order=order, product=self.oil, price=5, quantity=30)
+        cancelled = create_order(user, status='cancelado')
+        OrderItem.objects.create(order=cancelled, product=self.oil, price=5, quantity=300)
+
+    def _report(self):
+        return {row['id']: row for row in get_reorder_report()}
+
+    def test_low_stock_uses_each_reorder_level(self):
+        # Crema: 8 <= 10 (nivel propio); Jabón: 4 <= 5 (sin inventario, nivel por defecto)
+        self.assertEqual(set(low_stock(Product.objects.all())), {self.cream, self.soap})
+
+    def test_report_rows_and_days_of_cover(self):
+        report = self._report()
+        self.assertEqual(set(report), {self.cream.id, self.soap.id})
+        self.assertEqual(report[self.cream.id]['suggested_quantity'], 2)
+        self.assertIsNone(report[self.cream.id]['days_of_cover'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_movements([(self.oil, -35)], 'venta')
+        oil = self._report()[self.oil.id]
+        self.assertEqual((oil['units_sold'], oil['days_of_cover']), (30, 5.0))
+        # Nivel 5 + 30 días de venta - 5 en stock
+        self.assertEqual(oil['suggested_quantity'], 30)
+
+    def test_report_is_cached_and_invalidated_on_change(self):
+        self._report()
+        # Solo la lista de productos disponibles; las filas salen de la caché
+        with self.assertNumQueries(1):
+            self._report()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_movements([(self.cream, 20)], 'reabastecimiento')
+        self.assertNotIn(self.cream.id, self._report())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductInventory.objects.filter(product=self.oil).update(reorder_level=50)
+            ProductInventory.objects.get(product=self.oil).save()
+        self.assertIn(self.oil.id, self._report())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.soap.delete()
+        self.assertNotIn(self.soap.id, self._report())
+
+    def test_movement_rebuilds_only_the_products_it_touched(self):
+        self._report()
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_movements([(self.oil, -35)], 'venta')
+        with mock.patch.object(reorder, '_build_rows', wraps=reorder._build_rows) as build:
+            report = self._report()
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(list(build.call_args.args[0].values_list('id', flat=True)), [self.oil.id])
+        self.assertEqual(set(report), {self.cream.id, self.soap.id, self.oil.id})
+
+    def test_build_raced_by_invalidation_is_not_served(self):
+        # Un cálculo que empieza antes de un cambio guarda bajo la versión vieja
+        stale_build = reorder._build_rows
+
+        def build_then_change(products):
+            rows = stale_build(products)
+            with self.captureOnCommitCallbacks(execute=True):
+                apply_movements([(self.cream, 20)], 'reabastecimiento')
+            return rows
+
+        with mock.patch.object(reorder, '_build_rows', side_effect=build_then_change):
+            self.assertIn(self.cream.id, self._report())
+        self.assertNotIn(self.cream.id, self._report())
+
+    def test_concurrent_changes_are_not_lost(self):
+        self._report()
+        # Dos transacciones confirmadas seguidas: ninguna pisa la otra
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_movements([(self.cream, 20)], 'reabastecimiento')
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_movements([(self.oil, -35)], 'venta')
+        report = self._report()
+        self.assertNotIn(self.cream.id, report)
+        self.assertIn(self.oil.id, report)
+
+    def test_command_notifies_admins(self):
+        out = io.StringIO()
+        call_command('reorder_report', notify=True, stdout=out)
+        self.assertIn('Crema', out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Jabón', mail.outbox[0].body)
+
+
+class BatchExpiryTest(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Cremas', slug='cremas')
+        self.cream = Product.objects.create(category=category, name='Crema', slug='crema', description='', price=10, stock=0)
+        self.today = timezone.localdate()
+        self.late = receive_batch(self.cream, 5, batch_number='L3', expiry_date=self.today + timedelta(days=200))
+        self.undated = receive_batch(self.cream, 5, batch_number='L4')
+        self.early = receive_batch(self.cream, 5, batch_number='L1', expiry_date=self.today + timedelta(days=10))
+
+    def _remaining(self):
+        return {
+            batch.batch_number: batch.quantity
+            for batch in InventoryBatch.objects.filter(inventory__product=self.cream)
+        }
+
+    def test_receiving_a_batch_restocks(self):
+        self.cream.refresh_from_db()
+        self.assertEqual(self.cream.stock, 15)
+        self.assertEqual(StockMovement.objects.filter(kind='reabastecimiento').count(), 3)
+
+    def test_sales_consume_first_expired_first(self):
+        apply_movements([(self.cream, -7)], 'venta', reference='Pedido #1')
+        self.assertEqual(self._remaining(), {'L1': 0, 'L3': 3, 'L4': 5})
+        self.assertEqual(
+            sorted(BatchAllocation.objects.values_list('batch__batch_number', 'quantity')),
+            [('L1', 5), ('L3', 2)],
+        )
+
+        # Sin fecha de caducidad va al final
+        apply_movements([(self.cream, -4)], 'venta')
+        self.assertEqual(self._remaining(), {'L1': 0, 'L3': 0, 'L4': 4})
+
+    def test_allocation_queries_do_not_grow_with_batches(self):
+        inventory = ProductInventory.objects.get(product=self.cream)
+        InventoryBatch.objects.bulk_create([
+            InventoryBatch(inventory=inventory, quantity=1, expiry_date=self.today + timedelta(days=300 + i))
+            for i in range(50)
+        ])
+        with CaptureQueriesContext(connection) as ctx:
+            allocate_fefo({self.cream.id: 6})
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(self._remaining()['L1'], 0)
+        self.assertEqual(self._remaining()['L3'], 4)
+
+    def test_demand_beyond_batches_uses_untracked_stock(self):
+        apply_movements([(self.cream, 10)], 'ajuste')
+        apply_movements([(self.cream, -20)], 'venta')
+        self.assertEqual(set(self._remaining().values()), {0})
+        self.cream.refresh_from_db()
+        self.assertEqual(self.cream.stock, 5)
+
+    def test_expiring_batches(self):
+        InventoryBatch.objects.filter(id=self.late.id).update(expiry_date=self.today - timedelta(days=1))
+        self.assertEqual(list(expiring_batches()), [self.late, self.early])
+        # Agotado, el lote deja de aparecer
+        apply_movements([(self.cream, -5)], 'venta')
+        self.assertEqual(list(expiring_batches(days=365)), [self.late])
+
+    def test_expired_batches_are_never_shipped(self):
+        InventoryBatch.objects.filter(id=self.early.id).update(expiry_date=self.today - timedelta(days=1))
+        apply_movements([(self.cream, -7)], 'venta', reference='Pedido #1')
+        self.assertEqual(self._remaining(), {'L1': 5, 'L3': 0, 'L4': 3})
+        self.assertFalse(BatchAllocation.objects.filter(batch=self.early).exists())
+
+    def test_expired_units_are_not_sellable(self):
+        # 15 en inventario, 5 de ellas en un lote caducado: solo 10 se venden
+        InventoryBatch.objects.filter(id=self.early.id).update(expiry_date=self.today - timedelta(days=1))
+        with self.assertRaises(InsufficientStock):
+            apply_movements([(self.cream, -12)], 'venta')
+        self.cream.refresh_from_db()
+        self.assertEqual(self.cream.stock, 15)
+        self.assertEqual(self._remaining(), {'L1': 5, 'L3': 5, 'L4': 5})
+
+        apply_movements([(self.cream, -10)], 'venta')
+        self.assertEqual(self._remaining(), {'L1': 5, 'L3': 0, 'L4': 0})
+        with self.assertRaises(InsufficientStock):
+            apply_movements([(self.cream, -1)], 'venta')
+
+        # Un ajuste sí puede dar de baja las unidades caducadas, y las saca de su lote
+        apply_movements([(self.cream, -5)], 'ajuste')
+        self.cream.refresh_from_db()
+        self.assertEqual(self.cream.stock, 0)
+        self.assertEqual(self._remaining(), {'L1': 0, 'L3': 0, 'L4': 0})
+
+    def test_batch_expiring_today_is_still_shipped(self):
+        InventoryBatch.objects.filter(id=self.early.id).update(expiry_date=self.today)
+        apply_movements([(self.cream, -1)], 'venta')
+        self.assertEqual(self._remaining()['L1'], 4)
+
+    def test_import_registers_batches(self):
+        import_products(io.StringIO(
+            'name,category,price,stock,sku,batch_number,expiry_date\n'
+            f'Jabón,cremas,30,8,JB-1,A-7,{date(2030, 1, 31)}\n'
+        ), 'csv')
+        batch = InventoryBatch.objects.get(inventory__sku='JB-1')
+        self.assertEqual((batch.batch_number, batch.quantity, batch.expiry_date), ('A-7', 8, date(2030, 1, 31)))
+
+
+class AttributeCatalogTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.creams = Category.objects.create(name='Cremas', slug='cremas')
+        self.soaps = Category.objects.create(name='Jabones', slug='jabones')
+        self.aroma = ProductAttribute.objects.get(name='Aroma')
+        cream = Product.objects.create(category=self.creams, name='Crema', slug='crema', description='', price=10)
+        other = Product.objects.create(category=self.creams, name='Crema 2', slug='crema-2', description='', price=10)
+        soap = Product.objects.create(category=self.soaps, name='Jabón', slug='jabon', description='', price=10)
+        ProductAttributeValue.objects.create(product=cream, attribute=self.aroma, value='Lavanda')
+        ProductAttributeValue.objects.create(product=other, attribute=self.aroma, value='Lavanda')
+        ProductAttributeValue.objects.create(product=soap, attribute=self.aroma, value='Coco')
+
+    def _values(self, category):
+        return {entry['name']: entry['values'] for entry in get_attribute_catalog(category.id)}
+
+    def test_catalog_is_one_query_with_defaults_from_data(self):
+        with self.assertNumQueries(1):
+            catalog = self._values(self.creams)
+        self.assertEqual(catalog['Aroma'], ['Lavanda'])
+        self.assertEqual(catalog['Intensidad'], ['Suave', 'Media', 'Fuerte'])
+        self.assertEqual(self._values(self.soaps)['Aroma'], ['Coco'])
+
+    def test_catalog_is_cached_until_values_change(self):
+        self._values(self.creams)
+        with self.assertNumQueries(0):
+            self._values(self.creams)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductAttributeValue.objects.filter(value='Lavanda').first().delete()
+            ProductAttributeValue.objects.create(
+                product=Product.objects.get(slug='crema-2'), attribute=ProductAttribute.objects.get(name='Tamaño'), value='75g'
+            )
+        self.assertEqual(self._values(self.creams)['Tamaño'], ['75g'])
+        self.assertEqual(self._values(self.creams)['Aroma'], ['Lavanda'])
+
+
+class FacetedSearchTest(TestCase):
+
+    def setUp(self):
+        self.creams = Category.objects.create(name='Cremas', slug='cremas')
+        self.soaps = Category.objects.create(name='Jabones', slug='jabones')
+        self.aroma = ProductAttribute.objects.get(name='Aroma')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rose = self._product(self.creams, 'Crema rosa', 80, 5, 'Floral')
+            self.lemon = self._product(self.creams, 'Crema limón', 300, 0, 'Cítrico')
+            self.soap = self._product(self.soaps, 'Jabón rosa', 40, 2, 'Floral')
+
+    def _product(self, category, name, price, stock, aroma):
+        product = Product.objects.create(category=category, name=name, description='', price=price, stock=stock)
+        ProductAttributeValue.objects.create(product=product, attribute=self.aroma, value=aroma)
+        return product
+
+    def _search(self, query=''):
+        return FacetedSearch(Product.objects.all(), QueryDict(query))
+
+    def test_index_is_kept_up_to_date(self):
+        facets = set(ProductFacet.objects.filter(product=self.rose).values_list('facet', 'value'))
+        self.assertEqual(facets, {
+            ('category', str(self.creams.id)), ('price', '0-100'), ('stock', '1'), (f'attr_{self.aroma.id}', 'Floral'),
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_movements([(self.rose, -5)], 'venta')
+        self.assertFalse(ProductFacet.objects.filter(product=self.rose, facet='stock').exists())
+
+        ProductFacet.objects.all().delete()
+        self.assertEqual(rebuild_facet_index(), 3)
+        self.assertEqual(ProductFacet.objects.count(), 10)
+
+    def test_filters_combine_and_counts_stay_disjunctive(self):
+        search = self._search(f'attr_{self.aroma.id}=Floral&stock=1')
+        self.assertEqual(set(search.results), {self.rose, self.soap})
+        # Los conteos de una faceta elegida ignoran su propio filtro
+        self.assertEqual(search.counts[f'attr_{self.aroma.id}'], {'Floral': 2})
+        self.assertEqual(search.counts['category'], {str(self.creams.id): 1, str(self.soaps.id): 1})
+
+        search = self._search(f'category={self.creams.id}&category={self.soaps.id}&price=0-100')
+        self.assertEqual(set(search.results), {self.rose, self.soap})
+        self.assertEqual(search.counts['price'], {'0-100': 2, '250-500': 1})
+
+    def test_listing_queries_are_bounded(self):
+        url = reverse('products:product_list')
+        query = f'?attr_{self.aroma.id}=Floral&price=0-100'
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(url + query)
+        self.assertEqual(len(response.context['products']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(20):
+                self._product(self.creams, f'Crema {i}', 50 + i, 1, 'Floral')
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(url + query)
+        self.assertEqual(len(large), len(small))
+
+        groups = {group['param']: group for group in response.context['facet_groups']}
+        self.assertEqual(groups['price']['options'][0], {'value': '0-100', 'label': 'Hasta $100', 'count': 2, 'selected': True})
+
+
+class ProductImageOrderTest(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Cremas', slug='cremas')
+        self.product = Product.objects.create(category=category, name='Crema', slug='crema', description='', price=10)
+        self.images = [
+            ProductImage.objects.create(product=self.product, image=f'products/crema-{i}.png', is_main=(i == 0))
+            for i in range(4)
+        ]
+        self.admin = CustomUser.objects.create_user(username='admin', email='admin@example.com', password='x', is_staff=True)
+
+    def _gallery(self):
+        return list(self.product.images.values_list('id', flat=True))
+
+    def test_new_images_are_appended(self):
+        self.assertEqual(self._gallery(), [image.id for image in self.images])
+        self.assertEqual([image.position for image in self.images], [0, 1, 2, 3])
+
+    def test_reorder_is_a_single_update(self):
+        first, second, third, fourth = self.images
+        with self.assertNumQueries(1):
+            ProductImage.reorder(self.product.id, [third.id, first.id])
+        # Las que no se mandan quedan al final en su orden
+        self.assertEqual(self._gallery(), [third.id, first.id, second.id, fourth.id])
+
+    def test_admin_view_reorders_one_product(self):
+        self.client.force_login(self.admin)
+        ids = [image.id for image in reversed(self.images)]
+        response = self.client.post(reverse('reorder_images'), {'image_ids': json.dumps(ids)})
+        self.assertEqual(response.json(), {'success': True})
+        self.assertEqual(self._gallery(), ids)
+
+        other = Product.objects.create(category=self.product.category, name='Jabón', description='', price=5)
+        stray = ProductImage.objects.create(product=other, image='products/jabon.png')
+        response = self.client.post(reverse('reorder_images'), {'image_ids': json.dumps([stray.id, ids[0]])})
+        self.assertFalse(response.json()['success'])
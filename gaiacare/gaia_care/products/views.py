@@ -2,8 +2,13 @@ from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
 from django.views.generic import ListView, DetailView
 from django.db.models import Q
+from django.utils.decorators import method_decorator
+from core.cache import cache_get_or_set
+from core.routers import read_replica
+from .facets import FacetedSearch
 from .models import Product, Category
 import django_filters
+import hashlib
 
 class ProductFilter(django_filters.FilterSet):
     """Filtros para productos"""
@@ -13,8 +18,10 @@ class ProductFilter(django_filters.FilterSet):
     
     class Meta:
         model = Product
-        fields = ['category', 'name', 'min_price', 'max_price']
+        # La categoría se filtra como faceta (admite varias a la vez)
+        fields = ['name', 'min_price', 'max_price']
 
+@method_decorator(read_replica, name='dispatch')
 class ProductListView(ListView):
     """Vista para listar productos"""
     model = Product
@@ -39,14 +46,21 @@ class ProductListView(ListView):
                 Q(description__icontains=search_query)
             )
         
-        # Aplicar filtros
+        # Aplicar filtros y luego las facetas elegidas (con sus conteos)
         self.filterset = ProductFilter(self.request.GET, queryset=queryset)
-        return self.filterset.qs
+        self.facets = FacetedSearch(self.filterset.qs, self.request.GET)
+        return self.facets.results.prefetch_related('images')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categories'] = Category.objects.filter(is_active=True)
         context['filter'] = self.filterset
+        context['facet_groups'] = self.facets.groups(context['categories'])
+        
+        # Query string sin la página, para la paginación (conserva valores repetidos)
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        context['querystring'] = params.urlencode()
         
         # Obtener categoría actual si existe
         category_slug = self.kwargs.get('category_slug')
@@ -55,6 +69,7 @@ class ProductListView(ListView):
         
         return context
 
+@method_decorator(read_replica, name='dispatch')
 class ProductDetailView(DetailView):
     """Vista para detalles de un producto"""
     model = Product
@@ -73,6 +88,7 @@ class ProductDetailView(DetailView):
         
         return context
 
+@method_decorator(read_replica, name='dispatch')
 class CategoryListView(ListView):
     """Vista para listar categorías"""
     model = Category
@@ -82,16 +98,21 @@ class CategoryListView(ListView):
     def get_queryset(self):
         return Category.objects.filter(is_active=True)
 
+@read_replica
 def search_suggestions(request):
     """Vista para sugerencias de búsqueda (autocomplete)"""
     query = request.GET.get('q', '')
     if len(query) < 2:
         return JsonResponse([], safe=False)
     
-    products = Product.objects.filter(
-        Q(name__icontains=query) | Q(description__icontains=query),
-        available=True
-    ).values('name', 'slug', 'price')[:5]
+    def get_results():
+        products = Product.objects.filter(
+            Q(name__icontains=query) | Q(description__icontains=query),
+            available=True
+        ).values('name', 'slug', 'price')[:5]
+        return list(products)
     
-    results = list(products)
+    # Cachear por consulta; se invalida al cambiar el catálogo
+    query_hash = hashlib.md5(query.lower().encode()).hexdigest()
+    results = cache_get_or_set('products', 'suggestions', query_hash, default=get_results)
     return JsonResponse(results, safe=False)
\ No newline at end of file
@@ -3,7 +3,7 @@ from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
 from .models import CustomUser, UserProfile
 from django.contrib.auth.models import Group
-from django.conf import settings
+from .roles import FULL, LIMITED, get_group_role
 
 class UserProfileInline(admin.StackedInline):
     model = UserProfile
@@ -47,12 +47,14 @@ class CustomUserAdmin(UserAdmin):
         if request.user.is_superuser:
             return qs
         
+        role = get_group_role(request)
+        
         # Administrador normal puede ver todos excepto superusuarios
-        if request.user.groups.filter(name=settings.ADMIN_GROUP).exists():
+        if role == FULL:
             return qs.filter(is_superuser=False)
         
         # Administrador limitado solo ve usuarios regulares
-        if request.user.groups.filter(name=settings.ADMIN_LIMITED_GROUP).exists():
+        if role == LIMITED:
             return qs.filter(is_staff=False, is_superuser=False)
             
         return qs.none()
@@ -67,14 +69,16 @@ class CustomUserAdmin(UserAdmin):
         if request.user.is_superuser:
             return True
             
+        role = get_group_role(request)
+        
         # Administrador normal puede editar todos excepto superusuarios
-        if request.user.groups.filter(name=settings.ADMIN_GROUP).exists():
+        if role == FULL:
             if obj.is_superuser:
                 return False
             return True
             
         # Administrador limitado solo puede editar usuarios regulares
-        if request.user.groups.filter(name=settings.ADMIN_LIMITED_GROUP).exists():
+        if role == LIMITED:
             if obj.is_staff or obj.is_superuser:
                 return False
             return True
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .models import create_admin_groups
+        post_migrate.connect(create_admin_groups, sender=self, dispatch_uid='users:admin_groups')
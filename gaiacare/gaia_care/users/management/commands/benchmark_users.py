@@ -0,0 +1,59 @@
+import time
+
+from django.contrib.auth.models import update_last_login
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide registro, inicio de sesión y actualización de perfil (operaciones por '
+        'segundo y consultas por operación). Todo se revierte al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=200,
+            help='Operaciones de cada tipo a medir (por defecto 200)',
+        )
+
+    def _measure(self, label, operation, items):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            for item in items:
+                operation(item)
+            elapsed = time.perf_counter() - start
+        count = len(items)
+        self.stdout.write(
+            f'{label:<22} {count / elapsed:>10.1f} op/s  '
+            f'{len(ctx.captured_queries) / count:>5.1f} consultas/op'
+        )
+
+    def _signup(self, index):
+        CustomUser.objects.create_user(
+            username=f'bench-{index}', email=f'bench-{index}@example.com', password=None,
+        )
+
+    def _update_profile(self, user):
+        # Lo mismo que guarda ProfileView: el perfil y después los datos del usuario
+        user.profile.bio = f'Perfil de prueba {user.pk}'
+        user.profile.save()
+        user.city = 'Ciudad de México'
+        user.save()
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        with transaction.atomic():
+            self._measure('Registro', self._signup, range(iterations))
+            users = list(CustomUser.objects.filter(username__startswith='bench-'))
+            # Lo que hace django.contrib.auth.login al iniciar sesión
+            self._measure('Inicio de sesión', lambda user: update_last_login(None, user), users)
+            for user in users:
+                # Usuarios recién leídos, sin el perfil en caché
+                user.refresh_from_db()
+            self._measure('Actualización de perfil', self._update_profile, users)
+            transaction.set_rollback(True)
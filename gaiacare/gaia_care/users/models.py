@@ -1,7 +1,9 @@
-from django.db import models
+from django.apps import apps as global_apps
+from django.db import DEFAULT_DB_ALIAS, models
 from django.contrib.auth.models import AbstractUser, Group
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_save, pre_delete
 from django.dispatch import receiver
 from django.conf import settings
 
@@ -13,6 +15,8 @@ class CustomUser(AbstractUser):
     city = models.CharField(_('ciudad'), max_length=100, blank=True)
     state = models.CharField(_('estado'), max_length=100, blank=True)
     postal_code = models.CharField(_('código postal'), max_length=10, blank=True)
+    # Cambia con cada alta o baja en grupos; invalida el rol guardado en la sesión
+    role_version = models.PositiveIntegerField(_('versión de rol'), default=0, editable=False)
     
     # Campos requeridos por django-allauth
     USERNAME_FIELD = 'email'
@@ -35,6 +39,27 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"Perfil de {self.user.email}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_values = instance._field_values()
+        return instance
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_values = self._field_values()
+    
+    def _field_values(self):
+        # __dict__ y no getattr: los campos diferidos no se consultan
+        return {field.attname: self.__dict__.get(field.attname) for field in self._meta.concrete_fields}
+    
+    def has_changes(self):
+        """Indica si hay cambios sin guardar (o un archivo nuevo por subir)"""
+        if getattr(self, '_saved_values', None) != self._field_values():
+            return True
+        picture = self.__dict__.get('profile_picture')
+        return not getattr(picture, '_committed', True)
+    
     class Meta:
         verbose_name = _('perfil de usuario')
         verbose_name_plural = _('perfiles de usuario')
@@ -49,13 +74,41 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=CustomUser)
 def save_user_profile(sender, instance, **kwargs):
-    """Guarda el perfil de usuario cuando se guarda el usuario"""
-    instance.profile.save()
+    """Guarda el perfil junto con el usuario solo si se cargó y tiene cambios"""
+    # Inicios de sesión y ediciones del usuario no tocan el perfil: ni se consulta ni se reescribe
+    profile = instance._state.fields_cache.get('profile')
+    if profile is not None and profile.has_changes():
+        profile.save()
+
+
+def create_admin_groups(sender, apps=global_apps, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Crea los grupos de administradores si no existen (se conecta a post_migrate)"""
+    group_model = apps.get_model('auth', 'Group')
+    for name in (settings.ADMIN_GROUP, settings.ADMIN_LIMITED_GROUP):
+        group_model.objects.using(using).get_or_create(name=name)
+
+
+def bump_role_version(user_ids):
+    """Marca como obsoleto el rol de administración en caché de estos usuarios"""
+    CustomUser.objects.filter(pk__in=user_ids).update(role_version=F('role_version') + 1)
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalida el rol en caché al cambiar los grupos de un usuario (o los miembros de un grupo)"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        bump_role_version([instance.pk])
+    elif action == 'pre_clear':
+        bump_role_version(instance.user_set.values('pk'))
+    else:
+        bump_role_version(pk_set)
 
 
-# Crear grupos de administradores
-@receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def create_admin_groups(sender, **kwargs):
-    """Crea los grupos de administradores si no existen"""
-    admin_group, created = Group.objects.get_or_create(name=settings.ADMIN_GROUP)
-    admin_limited_group, created = Group.objects.get_or_create(name=settings.ADMIN_LIMITED_GROUP)
\ No newline at end of file
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    """Renombrar o borrar un grupo puede cambiar el rol de todos sus miembros"""
+    if not kwargs.get('created'):
+        bump_role_version(instance.user_set.values('pk'))
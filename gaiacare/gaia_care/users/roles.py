@@ -0,0 +1,84 @@
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+
+# Roles de administración
+FULL = 'full'
+LIMITED = 'limited'
+
+# En la sesión se guarda [role_version del usuario, rol de grupo]
+SESSION_KEY = '_admin_role'
+
+
+def _query_group_role(user):
+    """Rol según los grupos de administradores, con una sola consulta"""
+    names = set(
+        user.groups.filter(name__in=[settings.ADMIN_GROUP, settings.ADMIN_LIMITED_GROUP])
+        .values_list('name', flat=True)
+    )
+    if settings.ADMIN_GROUP in names:
+        return FULL
+    if settings.ADMIN_LIMITED_GROUP in names:
+        return LIMITED
+    return None
+
+
+def get_group_role(request):
+    """
+    Rol de administración que dan los grupos del usuario (FULL, LIMITED o
+    None). Se guarda en la sesión junto con CustomUser.role_version, que
+    cambia con cada alta o baja en grupos, así que solo se consulta la base
+    cuando la membresía cambió.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    if hasattr(request, '_group_role'):
+        return request._group_role
+
+    session = getattr(request, 'session', None)
+    stored = session.get(SESSION_KEY) if session is not None else None
+    if stored and stored[0] == user.role_version:
+        role = stored[1]
+    else:
+        role = _query_group_role(user)
+        if session is not None:
+            session[SESSION_KEY] = [user.role_version, role]
+    request._group_role = role
+    return role
+
+
+def get_admin_role(request):
+    """
+    Rol en el panel: los superusuarios y el grupo de administradores son
+    FULL; el grupo limitado es LIMITED; el personal (is_staff) sin grupo
+    conserva el acceso completo que tenía. None si no es administrador.
+    """
+    user = request.user
+    if not user.is_authenticated or not user.is_active:
+        return None
+    if user.is_superuser:
+        return FULL
+    role = get_group_role(request)
+    if role is None and user.is_staff:
+        return FULL
+    return role
+
+
+def admin_required(view_func=None, role=LIMITED):
+    """
+    Exige un rol de administración para la vista (LIMITED basta por defecto;
+    role=FULL la reserva a administradores completos). Sin el rol redirige al
+    inicio de sesión, como login_required/user_passes_test.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            current = get_admin_role(request)
+            if current == FULL or (current == LIMITED and role == LIMITED):
+                return view(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path())
+        return wrapper
+
+    return decorator(view_func) if view_func else decorator
@@ -1,3 +1,101 @@
+from django.conf import settings
+from django.contrib.auth.models import Group
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from .models import CustomUser, UserProfile
+from .roles import FULL, LIMITED, get_admin_role
+
+
+class AdminRoleTest(TestCase):
+
+    def setUp(self):
+        self.full_group, _ = Group.objects.get_or_create(name=settings.ADMIN_GROUP)
+        self.limited_group, _ = Group.objects.get_or_create(name=settings.ADMIN_LIMITED_GROUP)
+        self.user = CustomUser.objects.create_user(username='ana', email='ana@example.com', password='x')
+        self.client.force_login(self.user)
+        self.home = reverse('dashboard:dashboard_home')
+
+    def _role_queries(self):
+        """Consultas a auth_group hechas al resolver el rol en una petición al panel"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.home)
+        return response, [q for q in ctx.captured_queries if 'auth_group' in q['sql']]
+
+    def test_role_is_cached_in_the_session(self):
+        self.user.groups.add(self.limited_group)
+        response, queries = self._role_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self._role_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_group_changes_invalidate_the_cached_role(self):
+        self.user.groups.add(self.limited_group)
+        self.client.get(self.home)
+
+        self.user.groups.remove(self.limited_group)
+        self.assertEqual(self.client.get(self.home).status_code, 302)
+
+        # Alta desde el lado del grupo
+        self.full_group.user_set.add(self.user)
+        response, queries = self._role_queries()
+        self.assertEqual((response.status_code, len(queries)), (200, 1))
+
+        self.full_group.delete()
+        self.assertEqual(self.client.get(self.home).status_code, 302)
+
+    def test_full_and_limited_roles(self):
+        import_url = reverse('dashboard:product_import')
+        self.user.groups.add(self.limited_group)
+        self.assertEqual(self.client.get(import_url).status_code, 302)
+        self.assertNotContains(self.client.get(reverse('dashboard:product_list')), import_url)
+
+        self.user.groups.add(self.full_group)
+        self.assertEqual(self.client.get(import_url).status_code, 200)
+
+    def test_staff_and_superusers_keep_full_access(self):
+        request = self.client.get(self.home).wsgi_request
+        request.user = CustomUser(is_staff=True)
+        self.assertEqual(get_admin_role(request), FULL)
+        request.user = CustomUser(is_superuser=True)
+        self.assertEqual(get_admin_role(request), FULL)
+        self.assertNotEqual(LIMITED, FULL)
+
+
+class UserSaveSignalsTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='luis', email='luis@example.com', password='x')
+
+    def test_admin_groups_are_created_by_migrate(self):
+        names = set(Group.objects.values_list('name', flat=True))
+        self.assertIn(settings.ADMIN_GROUP, names)
+        self.assertIn(settings.ADMIN_LIMITED_GROUP, names)
+
+    def test_login_saves_only_the_user(self):
+        user = CustomUser.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            user.save(update_fields=['last_login'])
+
+    def test_profile_changes_are_saved_with_the_user(self):
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.profile.bio = 'Hola'
+        with self.assertNumQueries(2):
+            user.save()
+        self.assertEqual(UserProfile.objects.get(user=self.user).bio, 'Hola')
+        # Ya guardado, no se vuelve a escribir
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_profile_view_updates_user_and_profile(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('users:profile'), {'first_name': 'Luis', 'bio': 'Nueva bio'})
+        self.assertRedirects(response, reverse('users:profile'))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Luis')
+        self.assertEqual(self.user.profile.bio, 'Nueva bio')
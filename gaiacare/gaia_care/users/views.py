@@ -21,8 +21,9 @@ class ProfileView(LoginRequiredMixin, TemplateView):
         profile_form = ProfileUpdateForm(request.POST, request.FILES, instance=request.user.profile)
         
         if user_form.is_valid() and profile_form.is_valid():
-            user_form.save()
+            # El perfil primero: así el post_save del usuario ya no tiene nada que guardar
             profile_form.save()
+            user_form.save()
             messages.success(request, 'Tu perfil ha sido actualizado correctamente.')
             return redirect('users:profile')
         